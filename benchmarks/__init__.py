@@ -0,0 +1,12 @@
+"""
+Benchmarks do assistente virtual (executar da raiz: python -m benchmarks.<script>)
+Desenvolvido por Pedro Favoretti - Drope Dev
+"""
+
+import os
+import sys
+
+# Os módulos do backend são importados pelo nome, como em src/api.py
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
@@ -0,0 +1,82 @@
+"""
+Benchmark do catálogo colunar (ProductCatalog) contra a lista de dicionários.
+
+Reporta a memória ocupada por cada representação (tracemalloc) e o tempo
+por consulta de filtro de preço + categoria + disponibilidade seguido da
+ordenação por preço e materialização dos `k` primeiros.
+
+Uso: python -m benchmarks.bench_catalog [--sizes 10000 100000 1000000]
+"""
+
+import argparse
+import gc
+import json
+import random
+import statistics
+import time
+import tracemalloc
+
+from benchmarks.synthetic import make_products, CATEGORIAS
+from catalog import ProductCatalog
+
+
+def _memory_mb(build) -> tuple:
+    """Memória retida e pico (MB) ao construir uma estrutura"""
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, retained / 2**20, peak / 2**20
+
+
+def _list_query(products, max_price, category, k):
+    """Filtro e ordenação com laço Python (representação anterior)"""
+    matches = [
+        p for p in products
+        if p["preco"] <= max_price and p["categoria"].lower() == category.lower() and p.get("disponivel", True)
+    ]
+    return sorted(matches, key=lambda p: p["preco"])[:k]
+
+
+def _catalog_query(catalog, max_price, category, k):
+    """Filtro vetorizado e materialização apenas dos k primeiros"""
+    mask = catalog.filter_mask(max_price=max_price, category=category)
+    return catalog.records(catalog.sorted_rows(mask, by="preco", limit=k))
+
+
+def run(sizes, queries: int = 20, k: int = 10):
+    print(f"{'N':>9} | {'lista MB':>9} {'colunas MB':>11} {'pico col. MB':>13} | {'lista ms':>9} {'colunas ms':>11}")
+    rng = random.Random(0)
+    for n in sizes:
+        # Os registros passam por JSON para não compartilhar strings entre as duas estruturas
+        payload = json.dumps(make_products(n))
+        products, list_mb, _ = _memory_mb(lambda: json.loads(payload))
+        catalog, catalog_mb, catalog_peak = _memory_mb(lambda: ProductCatalog(json.loads(payload)))
+
+        filters = [(rng.uniform(100, 5000), rng.choice(CATEGORIAS)) for _ in range(queries)]
+        list_ms = statistics.median(
+            _timed(lambda: _list_query(products, max_price, category, k)) for max_price, category in filters
+        )
+        catalog_ms = statistics.median(
+            _timed(lambda: _catalog_query(catalog, max_price, category, k)) for max_price, category in filters
+        )
+        assert [p["id"] for p in _list_query(products, *filters[0], k)] == \
+            [p["id"] for p in _catalog_query(catalog, *filters[0], k)]
+        print(f"{n:>9} | {list_mb:>9.1f} {catalog_mb:>11.1f} {catalog_peak:>13.1f} | {list_ms:>9.2f} {catalog_ms:>11.2f}")
+        del products, catalog, payload
+
+
+def _timed(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return (time.perf_counter() - start) * 1000
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+    run(args.sizes, args.queries, args.k)
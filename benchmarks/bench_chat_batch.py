@@ -0,0 +1,98 @@
+"""
+/chat uma consulta por vez x /chat/batch, para jobs offline (replay de QA, análises, pré-aquecimento de caches).
+
+Sobe o servidor falso da OpenAI e envia as mesmas consultas pela API (transporte
+ASGI, sem porta): uma requisição /chat por vez, como os jobs fazem hoje, e lotes
+no /chat/batch (NDJSON). Os caches de embeddings e de respostas são zerados antes
+de cada modo. Reporta consultas/s, requisições de embeddings e de chat que
+chegaram ao provedor e se as respostas dos dois modos coincidem.
+
+Uso: python -m benchmarks.bench_chat_batch [--queries 400] [--batch-size 200] [--chat-latency-ms 200]
+"""
+
+import time
+import asyncio
+import logging
+import argparse
+from typing import List
+
+import httpx
+import orjson
+
+import api
+from benchmarks.fake_openai_server import FakeOpenAIServer
+from benchmarks.load_chat import QUERIES, build_assistant, unique_suffixes
+from embedding_cache import EmbeddingCache
+from response_cache import ResponseCache
+
+
+async def run_sequential(client: httpx.AsyncClient, queries: List[str]) -> List[str]:
+    responses = []
+    for query in queries:
+        response = await client.post("/chat", json={"query": query, "user_id": "bench"})
+        response.raise_for_status()
+        responses.append(response.json()["response"])
+    return responses
+
+
+async def run_batches(client: httpx.AsyncClient, queries: List[str], batch_size: int) -> List[str]:
+    responses = []
+    for start in range(0, len(queries), batch_size):
+        batch = queries[start:start + batch_size]
+        async with client.stream("POST", "/chat/batch", json={"queries": batch, "user_id": "bench"}) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if line:
+                    responses.append(orjson.loads(line).get("response"))
+    return responses
+
+
+async def run_all(server: FakeOpenAIServer, queries: List[str], batch_size: int):
+    assistant = api.assistente
+    transport = httpx.ASGITransport(app=api.app)
+    modes = [
+        ("/chat sequencial", lambda client: run_sequential(client, queries)),
+        (f"/chat/batch ({batch_size})", lambda client: run_batches(client, queries, batch_size)),
+    ]
+    print(f"{'modo':>20} | {'consultas/s':>11} | {'tempo s':>7} | {'req. embeddings':>15} | {'req. chat':>9}")
+    answers = []
+    async with httpx.AsyncClient(transport=transport, base_url="http://api", timeout=None) as client:
+        for label, run_mode in modes:
+            # Caches zerados: os dois modos pagam as mesmas chamadas ao provedor
+            assistant.response_cache = ResponseCache()
+            assistant.rag_system.embeddings.cache = EmbeddingCache()
+            requests, completions = server.stats["requests"], server.stats["completions"]
+
+            start = time.perf_counter()
+            answers.append(await run_mode(client))
+            elapsed = time.perf_counter() - start
+
+            chat = server.stats["completions"] - completions
+            embeddings = server.stats["requests"] - requests - chat
+            print(f"{label:>20} | {len(queries) / elapsed:>11.1f} | {elapsed:>7.2f} | {embeddings:>15} | {chat:>9}")
+
+    same = sum(a == b for a, b in zip(*answers))
+    print(f"respostas iguais nos dois modos: {same}/{len(queries)}")
+
+
+def run(n_queries: int, batch_size: int, latency_ms: float, chat_latency_ms: float, n_products: int):
+    with FakeOpenAIServer(latency_ms=latency_ms, chat_latency_ms=chat_latency_ms) as server:
+        api.assistente = build_assistant(server, n_products)
+        suffixes = unique_suffixes()
+        # Consultas inéditas: nenhuma resposta vem de cache de uma execução anterior
+        queries = [f"{QUERIES[i % len(QUERIES)]} {next(suffixes)}" for i in range(n_queries)]
+        print(f"{n_queries} consultas, embeddings {latency_ms:.0f} ms, chat {chat_latency_ms:.0f} ms")
+        asyncio.run(run_all(server, queries, batch_size))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--queries", type=int, default=400)
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--chat-latency-ms", type=float, default=200)
+    parser.add_argument("--products", type=int, default=2000)
+    args = parser.parse_args()
+    # A API configura o log em INFO ao ser importada; aqui só interessa a tabela
+    logging.getLogger().setLevel(logging.ERROR)
+    run(args.queries, args.batch_size, args.latency_ms, args.chat_latency_ms, args.products)
@@ -0,0 +1,246 @@
+"""
+Benchmark ponta a ponta do AssitenteVirtual, sem rede e sem chave da OpenAI.
+
+Embeddings e chat completion são substituídos por fakes determinísticos
+(com latência opcional). Gera catálogo, pedidos e uma mistura de consultas
+de todas as intenções, roda cada consulta pelas etapas de `process_query`
+e reporta latência p50/p95/p99 por etapa e por intenção, tempo de carga e
+de construção dos índices e o pico de memória (RSS). Cada consulta segue
+o modo de resposta da sua intenção (RESPONSE_MODES ou `--response-modes`),
+e a latência também é reportada por modo. O tamanho do prompt (tokens) é
+reportado por intenção; `--prefill-ms-per-1k-tokens` faz o chat falso
+demorar proporcionalmente a ele, como a leitura do prompt no modelo real.
+
+Com `--save` os resultados viram uma linha de base em JSON; com
+`--compare` a execução atual é comparada a uma linha de base salva
+(ex.: de outro commit), marcando regressões acima de `--tolerance`.
+
+Uso: python -m benchmarks.bench_e2e [--products 20000] [--queries 2000]
+     [--embedding-latency-ms 0] [--chat-latency-ms 0] [--prefill-ms-per-1k-tokens 0]
+     [--response-modes consulta_pedido=template,...]
+     [--save base.json] [--compare base.json]
+"""
+
+import os
+import json
+import time
+import random
+import argparse
+import resource
+import tempfile
+import subprocess
+from collections import defaultdict
+from typing import Dict, List
+
+import numpy as np
+
+from benchmarks.fakes import FakeEmbeddings, FakeChatClient, FakeAsyncChatClient
+from benchmarks.synthetic import make_products, make_orders, make_queries, write_dataset
+from assistente import AssitenteVirtual
+from rag_system import RAGSystem
+from config import parse_mapping
+
+POLICIES_FILE = os.path.join(os.path.dirname(__file__), "..", "data", "politicas.md")
+
+# Etapas de process_query, na ordem
+STAGES = ["classificacao", "busca", "llm", "total"]
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    """p50/p95/p99 em ms"""
+    values = np.percentile(np.array(samples) * 1000, [50, 95, 99]) if samples else [0.0] * 3
+    return {"p50": round(float(values[0]), 3), "p95": round(float(values[1]), 3), "p99": round(float(values[2]), 3)}
+
+
+def peak_rss_mb() -> float:
+    """Pico de memória residente do processo (ru_maxrss é em KB no Linux)"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def build_assistant(data_dir: str, embedding_latency_ms: float, chat_latency_ms: float,
+                    response_modes: Dict[str, str] = None, prefill_ms_per_1k: float = 0):
+    """Assistente completo com os fakes no lugar da OpenAI; retorna também os tempos de carga"""
+    rag = RAGSystem("benchmark", vector_db_path=None, embedding_cache_path=None)
+    rag.embeddings.underlying = FakeEmbeddings()
+    start = time.perf_counter()
+    rag.load_data(data_dir)
+    loaded = time.perf_counter()
+    rag.create_vector_stores()
+    built = time.perf_counter()
+    # A construção do índice não paga a latência simulada; as consultas sim
+    rag.embeddings.underlying = FakeEmbeddings(latency_ms=embedding_latency_ms)
+
+    assistant = AssitenteVirtual("benchmark", rag_system=rag, response_modes=response_modes)
+    assistant.client = FakeChatClient(latency_ms=chat_latency_ms, prefill_ms_per_1k=prefill_ms_per_1k)
+    assistant.async_client = FakeAsyncChatClient(latency_ms=chat_latency_ms, prefill_ms_per_1k=prefill_ms_per_1k)
+    return assistant, {"load_s": round(loaded - start, 3), "index_build_s": round(built - loaded, 3)}
+
+
+def make_query_mix(n: int, products: List[Dict], orders: List[Dict], seed: int = 7) -> List[str]:
+    """Consultas sintéticas de todas as intenções, com pedidos e nomes de produtos existentes"""
+    rng = random.Random(seed)
+    queries = make_queries(n - n // 10, seed=seed, order_ids=[order["pedido_id"] for order in orders])
+    queries += [f"Informações sobre {rng.choice(products)['nome']}" for _ in range(n // 10)]
+    rng.shuffle(queries)
+    return queries
+
+
+def run_queries(assistant: AssitenteVirtual, queries: List[str]):
+    """Executa as etapas de `process_query` medindo cada uma"""
+    stages = defaultdict(list)
+    by_intent = defaultdict(list)
+    by_mode = defaultdict(list)
+    prompt_tokens = defaultdict(list)
+    for i, query in enumerate(queries):
+        user_id = f"user{i % 50}"
+        start = time.perf_counter()
+        analysis = assistant._start_query(query, user_id)
+        classified = time.perf_counter()
+        result, prompt, cache_key = assistant._prepare(analysis, query, user_id)
+        prepared = time.perf_counter()
+        result["response"] = assistant._respond(result, prompt, cache_key)
+        done = time.perf_counter()
+
+        stages["classificacao"].append(classified - start)
+        stages["busca"].append(prepared - classified)
+        stages["llm"].append(done - prepared)
+        stages["total"].append(done - start)
+        by_intent[result["intent"]].append(done - start)
+        by_mode[result["response_mode"]].append(done - start)
+        prompt_tokens[result["intent"]].append(assistant.prompt_builder.count(prompt))
+    return stages, by_intent, by_mode, prompt_tokens
+
+
+def run(n_products: int, n_orders: int, n_queries: int, embedding_latency_ms: float, chat_latency_ms: float,
+        response_modes: Dict[str, str] = None, prefill_ms_per_1k: float = 0):
+    products = make_products(n_products)
+    orders = make_orders(n_orders, products)
+    with open(POLICIES_FILE, 'r', encoding='utf-8') as f:
+        policies = f.read()
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        write_dataset(data_dir, products, orders, policies)
+        assistant, build = build_assistant(data_dir, embedding_latency_ms, chat_latency_ms, response_modes,
+                                           prefill_ms_per_1k)
+
+    queries = make_query_mix(n_queries, products, orders)
+    start = time.perf_counter()
+    stages, by_intent, by_mode, prompt_tokens = run_queries(assistant, queries)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "commit": git_commit(),
+        "params": {
+            "products": n_products, "orders": n_orders, "queries": n_queries,
+            "embedding_latency_ms": embedding_latency_ms, "chat_latency_ms": chat_latency_ms,
+            "prefill_ms_per_1k": prefill_ms_per_1k, "response_modes": assistant.response_modes
+        },
+        "build": build,
+        "throughput_qps": round(n_queries / elapsed, 1),
+        "stages": {stage: percentiles(stages[stage]) for stage in STAGES},
+        "intents": {intent: {"count": len(samples), **percentiles(samples)}
+                    for intent, samples in sorted(by_intent.items())},
+        "prompt_tokens": {intent: {"mean": round(float(np.mean(samples)), 1),
+                                   "p95": round(float(np.percentile(samples, 95)), 1), "max": int(max(samples))}
+                          for intent, samples in sorted(prompt_tokens.items())},
+        "modes": {mode: {"count": len(samples), **percentiles(samples)} for mode, samples in sorted(by_mode.items())},
+        "embedding_calls": assistant.rag_system.embeddings.underlying.calls,
+        "llm_calls": assistant.client.calls,
+        "response_cache": assistant.response_cache.stats(),
+        "peak_rss_mb": round(peak_rss_mb(), 1)
+    }
+
+
+def report(results: Dict, baseline: Dict = None, tolerance: float = 0.1, min_delta_ms: float = 0.1):
+    """Imprime os resultados e, se houver linha de base, a variação de cada métrica.
+
+    Uma métrica só conta como regressão se piorar mais que `tolerance` e
+    mais que `min_delta_ms` (variações de microssegundos são ruído).
+    """
+    params = results["params"]
+    print(f"{params['products']} produtos, {params['orders']} pedidos, {params['queries']} consultas "
+          f"(embedding {params['embedding_latency_ms']:g} ms, chat {params['chat_latency_ms']:g} ms)")
+    print(f"carga {results['build']['load_s']:.2f} s | índices {results['build']['index_build_s']:.2f} s | "
+          f"pico RSS {results['peak_rss_mb']:.0f} MB | {results['throughput_qps']:.0f} consultas/s | "
+          f"embeddings {results['embedding_calls']} | LLM {results['llm_calls']}")
+
+    regressions = []
+
+    def row(label: str, current: Dict, previous: Dict = None, count: int = None):
+        cells = []
+        for key in ("p50", "p95", "p99"):
+            cell = f"{current[key]:>9.3f}"
+            if previous is not None and previous.get(key):
+                change = (current[key] - previous[key]) / previous[key]
+                cell += f" ({change:+.0%})"
+                if change > tolerance and current[key] - previous[key] > min_delta_ms:
+                    regressions.append(f"{label} {key}")
+            cells.append(f"{cell:>17}")
+        counted = f"{count:>6}" if count is not None else " " * 6
+        print(f"{label:>20} {counted} | " + " | ".join(cells))
+
+    header = " | ".join(f"{key + ' ms':>17}" for key in ("p50", "p95", "p99"))
+    print(f"\n{'etapa':>20} {'':>6} | {header}")
+    for stage in STAGES:
+        row(stage, results["stages"][stage], (baseline or {}).get("stages", {}).get(stage))
+    print(f"\n{'intenção':>20} {'n':>6} | {header}")
+    for intent, stats in results["intents"].items():
+        row(intent, stats, (baseline or {}).get("intents", {}).get(intent), stats["count"])
+    print(f"\n{'modo de resposta':>20} {'n':>6} | {header}")
+    for mode, stats in results.get("modes", {}).items():
+        row(mode, stats, (baseline or {}).get("modes", {}).get(mode), stats["count"])
+    print(f"\n{'tokens do prompt':>20} {'':>6} | {'média':>9} | {'p95':>9} | {'máx':>9}")
+    for intent, stats in results.get("prompt_tokens", {}).items():
+        previous = (baseline or {}).get("prompt_tokens", {}).get(intent)
+        change = f" ({(stats['mean'] - previous['mean']) / previous['mean']:+.0%})" if previous else ""
+        print(f"{intent:>20} {'':>6} | {stats['mean']:>9.0f} | {stats['p95']:>9.0f} | {stats['max']:>9}{change}")
+
+    if baseline is not None:
+        if baseline.get("params") != params:
+            print(f"\natenção: linha de base com outros parâmetros: {baseline.get('params')}")
+        print(f"\nlinha de base: commit {baseline.get('commit')}, "
+              f"índices {baseline['build']['index_build_s']:.2f} s, pico RSS {baseline['peak_rss_mb']:.0f} MB")
+        if regressions:
+            print(f"regressões acima de {tolerance:.0%}: {', '.join(regressions)}")
+        else:
+            print(f"sem regressões acima de {tolerance:.0%}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--products", type=int, default=20000)
+    parser.add_argument("--orders", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--embedding-latency-ms", type=float, default=0)
+    parser.add_argument("--chat-latency-ms", type=float, default=0)
+    parser.add_argument("--prefill-ms-per-1k-tokens", type=float, default=0,
+                        help="latência do chat falso por mil tokens de prompt")
+    parser.add_argument("--response-modes", help="modo por intenção (ex.: consulta_pedido=template); padrão RESPONSE_MODES")
+    parser.add_argument("--save", help="grava os resultados como linha de base (JSON)")
+    parser.add_argument("--compare", help="linha de base (JSON) para comparar")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    parser.add_argument("--min-delta-ms", type=float, default=0.1)
+    args = parser.parse_args()
+
+    response_modes = parse_mapping(args.response_modes) if args.response_modes is not None else None
+    results = run(args.products, args.orders, args.queries, args.embedding_latency_ms, args.chat_latency_ms,
+                  response_modes, args.prefill_ms_per_1k_tokens)
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+    regressions = report(results, baseline, args.tolerance, args.min_delta_ms)
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    raise SystemExit(1 if regressions else 0)
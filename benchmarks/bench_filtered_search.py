@@ -0,0 +1,77 @@
+"""
+Benchmark da busca de produtos com filtros aplicados dentro do FAISS.
+
+Para filtros de preço cada vez mais restritivos compara a busca atual
+(IDSelector sobre as colunas de filtro) com a abordagem anterior de buscar
+k*2 vizinhos e filtrar depois, reportando latência e quantos dos `k`
+resultados pedidos cada uma devolve.
+
+Uso: python -m benchmarks.bench_filtered_search [--products 50000] [--k 5]
+"""
+
+import argparse
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.fakes import FakeEmbeddings
+from benchmarks.synthetic import make_products, write_dataset
+from rag_system import RAGSystem
+
+QUERIES = ["notebook para trabalho", "presente para quem gosta de cozinhar", "tênis de corrida", "livro de receitas"]
+
+
+def _overfetch_search(rag: RAGSystem, vector, max_price: float, k: int):
+    """Busca k*2 vizinhos e filtra depois (implementação anterior)"""
+    docs = rag.vector_stores["produtos"].similarity_search_by_vector(vector, k=k * 2)
+    results = []
+    for doc in docs:
+        product = rag.find_product_by_id(doc.metadata["id"])
+        if product and product["preco"] <= max_price and product.get("disponivel", True):
+            results.append(product)
+            if len(results) >= k:
+                break
+    return results
+
+
+def _measure(fn, vectors, repeat: int = 5):
+    """Latência mediana (ms) e média de resultados devolvidos"""
+    timings, counts = [], []
+    for _ in range(repeat):
+        for vector in vectors:
+            start = time.perf_counter()
+            results = fn(vector)
+            timings.append((time.perf_counter() - start) * 1000)
+            counts.append(len(results))
+    return statistics.median(timings), statistics.mean(counts)
+
+
+def run(n_products: int, k: int):
+    products = make_products(n_products)
+    with tempfile.TemporaryDirectory() as data_dir:
+        write_dataset(data_dir, products, [])
+        rag = RAGSystem("benchmark", vector_db_path=None, embedding_cache_path=None)
+        rag.embeddings.underlying = FakeEmbeddings()
+        rag.load_data(data_dir)
+        rag.create_vector_stores()
+
+    vectors = [rag.embeddings.embed_query(query) for query in QUERIES]
+    prices = np.sort([p["preco"] for p in products])
+
+    print(f"{'seletividade':>12} {'preço máx.':>11} | {'pushdown ms':>11} {'itens':>6} | {'k*2 ms':>7} {'itens':>6}")
+    for selectivity in [1.0, 0.1, 0.01, 0.001, 0.0001]:
+        max_price = float(prices[max(0, int(len(prices) * selectivity) - 1)])
+        mask = rag._product_filter_mask(max_price=max_price)
+        pushdown = _measure(lambda v: rag._search_products_by_mask(v, mask, k), vectors)
+        overfetch = _measure(lambda v: _overfetch_search(rag, v, max_price, k), vectors)
+        print(f"{selectivity:>12.4%} {max_price:>11.2f} | {pushdown[0]:>11.3f} {pushdown[1]:>6.1f} | {overfetch[0]:>7.3f} {overfetch[1]:>6.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--products", type=int, default=50000)
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+    run(args.products, args.k)
@@ -0,0 +1,99 @@
+"""
+Busca híbrida (BM25 + vetorial) com atalho lexical sem embedding.
+
+Roda uma mistura de consultas (nomes exatos de produtos e as consultas
+sintéticas de busca, recomendação e políticas) com a busca lexical
+desligada e ligada. Os embeddings simulam a latência de rede; o relatório
+mostra a fração de buscas atendidas sem chamada de rede, as chamadas feitas
+e a latência p50/p95 por busca.
+
+Uso: python -m benchmarks.bench_hybrid_search [--products 20000] [--queries 500] [--latency-ms 30]
+"""
+
+import os
+import time
+import random
+import argparse
+import tempfile
+import statistics
+
+from benchmarks.fakes import FakeEmbeddings
+from benchmarks.synthetic import make_products, make_queries, write_dataset
+from embedding_cache import EmbeddingCache
+from rag_system import RAGSystem
+
+POLICIES_FILE = os.path.join(os.path.dirname(__file__), "..", "data", "politicas.md")
+
+
+def _search(rag: RAGSystem, query: str):
+    """Busca da intenção da consulta (as intenções sem busca vetorial são ignoradas)"""
+    analysis = rag.rules.analyze(query)
+    if analysis["intent"] == "busca_produto":
+        return rag.search_products(query, max_price=analysis["max_price"], category=analysis["category"])
+    if analysis["intent"] == "recomendacao":
+        return rag.get_recommendations(query)
+    if analysis["intent"] == "politicas":
+        return rag.search_policies(query)
+    return None
+
+
+def _run(rag: RAGSystem, queries, lexical: bool):
+    rag.lexical_search = lexical
+    rag.embeddings.cache = EmbeddingCache(None)
+    rag.retrieval_stats = dict.fromkeys(rag.retrieval_stats, 0)
+    calls = rag.embeddings.underlying.calls
+
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        _search(rag, query)
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    stats = rag.retrieval_stats_snapshot()
+    return {
+        "searches": stats["searches"],
+        "offline": stats["offline_fraction"],
+        "lexical": stats["lexical"],
+        "calls": rag.embeddings.underlying.calls - calls,
+        "p50": statistics.median(latencies),
+        "p95": latencies[max(int(len(latencies) * 0.95) - 1, 0)]
+    }
+
+
+def run(n_products: int, n_queries: int, latency_ms: float, exact_share: float):
+    products = make_products(n_products)
+    with open(POLICIES_FILE, 'r', encoding='utf-8') as f:
+        policies = f.read()
+    with tempfile.TemporaryDirectory() as data_dir:
+        write_dataset(data_dir, products, [], policies)
+        rag = RAGSystem("benchmark", vector_db_path=None, embedding_cache_path=None)
+        rag.embeddings.underlying = FakeEmbeddings()
+        rag.load_data(data_dir)
+        rag.create_vector_stores()
+    rag.embeddings.underlying = FakeEmbeddings(latency_ms=latency_ms)
+
+    # Nomes exatos (como vêm de links e do autocompletar) misturados às consultas sintéticas
+    rng = random.Random(7)
+    n_exact = int(n_queries * exact_share)
+    queries = [rng.choice(products)["nome"] for _ in range(n_exact)] + make_queries(n_queries - n_exact, seed=7)
+    rng.shuffle(queries)
+    queries = [query for query in queries
+               if rag.rules.analyze(query)["intent"] in ("busca_produto", "recomendacao", "politicas")]
+
+    print(f"{n_products} produtos, {len(queries)} buscas ({exact_share:.0%} nomes exatos), "
+          f"embedding com {latency_ms:.0f} ms, limiar {rag.lexical_threshold}")
+    print(f"{'busca':>9} | {'sem rede':>8} | {'só BM25':>7} | {'chamadas':>8} | {'p50 ms':>7} | {'p95 ms':>7}")
+    for label, lexical in (("vetorial", False), ("híbrida", True)):
+        result = _run(rag, queries, lexical)
+        print(f"{label:>9} | {result['offline']:>8.1%} | {result['lexical']:>7} | {result['calls']:>8} | "
+              f"{result['p50']:>7.2f} | {result['p95']:>7.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--products", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--latency-ms", type=float, default=30)
+    parser.add_argument("--exact-share", type=float, default=0.3)
+    args = parser.parse_args()
+    run(args.products, args.queries, args.latency_ms, args.exact_share)
@@ -0,0 +1,77 @@
+"""
+Benchmark da construção do índice de produtos contra o servidor falso.
+
+Compara a construção serial com o pipeline em lotes paralelos (com erros
+transitórios injetados) e mostra a retomada após uma queda do provedor:
+na segunda tentativa só os lotes que faltavam são enviados.
+
+Uso: python -m benchmarks.bench_index_build [--products 20000] [--latency-ms 30]
+"""
+
+import argparse
+import logging
+import os
+import tempfile
+import time
+
+from langchain_openai import OpenAIEmbeddings
+
+from benchmarks.fake_openai_server import FakeOpenAIServer
+from benchmarks.synthetic import make_products, write_dataset
+from index_builder import EmbeddingPipeline
+from rag_system import RAGSystem
+
+
+def _build(server: FakeOpenAIServer, data_dir: str, cache_path: str, pipeline: EmbeddingPipeline):
+    """Constrói o índice de produtos apontando os embeddings para o servidor falso"""
+    rag = RAGSystem("fake", vector_db_path=None, embedding_cache_path=cache_path)
+    # Sem tiktoken (evita download) e sem retries do cliente: quem repete é o pipeline
+    rag.embeddings.underlying = OpenAIEmbeddings(
+        base_url=server.base_url, api_key="fake", check_embedding_ctx_length=False, max_retries=0
+    )
+    rag.embedding_pipeline = pipeline
+    rag.load_data(data_dir)
+    start = time.perf_counter()
+    rag.create_vector_stores()
+    return rag, time.perf_counter() - start
+
+
+def run(n_products: int, latency_ms: float, batch_size: int, workers: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        write_dataset(tmp, make_products(n_products), [])
+        print(f"{n_products} produtos, lotes de {batch_size}, latência simulada {latency_ms:.0f} ms")
+
+        for label, max_workers, error_rate in [("serial", 1, 0.0), (f"{workers} workers", workers, 0.0),
+                                               (f"{workers} workers + 10% erros", workers, 0.1)]:
+            with FakeOpenAIServer(latency_ms=latency_ms, error_rate=error_rate) as server:
+                pipeline = EmbeddingPipeline(batch_size=batch_size, max_workers=max_workers, base_delay=0.05)
+                rag, elapsed = _build(server, tmp, None, pipeline)
+                print(f"  {label:<26} {elapsed:>7.2f}s  requisições={server.stats['requests']:<5} "
+                      f"erros={server.stats['errors']:<4} vetores={rag.vector_stores['produtos'].index.ntotal}")
+
+        # Queda do provedor no meio da construção e retomada pelo checkpoint
+        cache_path = os.path.join(tmp, "cache.sqlite")
+        total_batches = -(-n_products // batch_size)
+        with FakeOpenAIServer(latency_ms=latency_ms, fail_after=total_batches // 2) as server:
+            pipeline = EmbeddingPipeline(batch_size=batch_size, max_workers=workers, max_retries=1, base_delay=0.01)
+            try:
+                _build(server, tmp, cache_path, pipeline)
+            except Exception as e:
+                print(f"  interrompido após {server.stats['requests']} requisições: {type(e).__name__}")
+        with FakeOpenAIServer(latency_ms=latency_ms) as server:
+            pipeline = EmbeddingPipeline(batch_size=batch_size, max_workers=workers)
+            rag, elapsed = _build(server, tmp, cache_path, pipeline)
+            print(f"  retomada                   {elapsed:>7.2f}s  requisições={server.stats['requests']:<5} "
+                  f"(de {total_batches} lotes) vetores={rag.vector_stores['produtos'].index.ntotal}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--products", type=int, default=20000)
+    parser.add_argument("--latency-ms", type=float, default=30)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.ERROR)
+    run(args.products, args.latency_ms, args.batch_size, args.workers)
@@ -0,0 +1,74 @@
+"""
+Benchmark da leitura incremental de catálogos (JSON e JSONL).
+
+Mede registros/s e o pico de memória de `ingest.iter_records` contra
+`json.load` no mesmo arquivo, e a taxa de carga completa no catálogo
+colunar via RAGSystem.load_data.
+
+Uso: python -m benchmarks.bench_ingest [--records 200000]
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.synthetic import make_products
+from ingest import iter_records
+from rag_system import RAGSystem
+
+
+def _profile(fn):
+    """Executa `fn` e retorna (resultado, segundos, pico MB)"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak / 2**20
+
+
+def run(n_records: int):
+    products = make_products(n_records)
+    with tempfile.TemporaryDirectory() as tmp:
+        json_file = os.path.join(tmp, "produtos.json")
+        jsonl_file = os.path.join(tmp, "produtos.jsonl")
+        with open(json_file, "w", encoding="utf-8") as f:
+            json.dump(products, f, ensure_ascii=False, indent=2)
+        with open(jsonl_file, "w", encoding="utf-8") as f:
+            for product in products:
+                f.write(json.dumps(product, ensure_ascii=False) + "\n")
+        del products
+        size_mb = os.path.getsize(json_file) / 2**20
+
+        print(f"{n_records} registros ({size_mb:.1f} MB em JSON)")
+        print(f"{'leitura':<28} {'registros/s':>12} {'pico MB':>9}")
+
+        def _load():
+            with open(json_file, encoding="utf-8") as f:
+                return len(json.load(f))
+
+        for label, fn in [
+            ("json.load", _load),
+            ("iter_records (JSON)", lambda: sum(1 for _ in iter_records(json_file))),
+            ("iter_records (JSONL)", lambda: sum(1 for _ in iter_records(jsonl_file))),
+        ]:
+            count, elapsed, peak = _profile(fn)
+            print(f"{label:<28} {count / elapsed:>12.0f} {peak:>9.1f}")
+
+        data_dir = os.path.join(tmp, "dados")
+        os.makedirs(data_dir)
+        os.replace(jsonl_file, os.path.join(data_dir, "produtos.jsonl"))
+        rag = RAGSystem("benchmark", vector_db_path=None, embedding_cache_path=None)
+        _, elapsed, peak = _profile(lambda: rag.load_data(data_dir))
+        print(f"{'load_data (catálogo)':<28} {n_records / elapsed:>12.0f} {peak:>9.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--records", type=int, default=200000)
+    args = parser.parse_args()
+    run(args.records)
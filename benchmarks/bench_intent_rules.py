@@ -0,0 +1,123 @@
+"""
+Classificação de intenção e extração de entidades por consulta.
+
+Compara o IntentRules (uma expressão regular compilada, uma passada) com a
+implementação anterior (listas de palavras percorridas com `in` e padrões
+recompilados a cada chamada) sobre consultas sintéticas em português, e
+confere se os resultados coincidem.
+
+Uso: python -m benchmarks.bench_intent_rules [--queries 100000]
+"""
+
+import argparse
+import re
+import time
+
+from benchmarks.synthetic import make_queries
+from intent_rules import IntentRules
+
+
+# Implementação anterior (AssitenteVirtual.classify_intent/extract_order_id e
+# RAGSystem.extract_price_from_query/extract_category_from_query)
+def legacy_classify_intent(query: str) -> str:
+    query_lower = query.lower()
+    if re.search(r"#?\d+", query) and any(word in query_lower for word in ["pedido", "compra", "status", "entrega", "rastreamento", "onde está"]):
+        return "consulta_pedido"
+    if re.search(r"prod\d+", query_lower) or any(word in query_lower for word in ["qual o preço de", "informações sobre", "detalhes do"]):
+        return "busca_produto_exata"
+    if any(word in query_lower for word in ["trocar", "devolver", "política", "prazo", "garantia", "cancelar"]):
+        return "politicas"
+    if any(word in query_lower for word in ["recomendar", "sugerir", "indicar", "presente", "gift"]):
+        return "recomendacao"
+    if any(word in query_lower for word in ["buscar", "procurar", "quero", "preciso", "notebook", "smartphone", "celular", "computador", "tablet", "produto"]):
+        return "busca_produto"
+    if any(word in query_lower for word in ["oi", "olá", "bom dia", "boa tarde", "boa noite", "ajuda"]):
+        return "conversa_geral"
+    return "busca_produto"
+
+
+def legacy_extract_order_id(query: str) -> str:
+    for pattern in [r"#(\d+)", r"pedido\s*(\d+)", r"número\s*(\d+)", r"(\d{4,})"]:
+        match = re.search(pattern, query, re.IGNORECASE)
+        if match:
+            return match.group(1)
+    return None
+
+
+def legacy_extract_price(query: str) -> float:
+    patterns = [
+        r'até\s*R?\$?\s*(\d+(?:\.\d{3})*(?:,\d{2})?)',
+        r'máximo\s*R?\$?\s*(\d+(?:\.\d{3})*(?:,\d{2})?)',
+        r'no\s*máximo\s*R?\$?\s*(\d+(?:\.\d{3})*(?:,\d{2})?)',
+        r'R?\$?\s*(\d+(?:\.\d{3})*(?:,\d{2})?)?\s*reais?'
+    ]
+    for pattern in patterns:
+        match = re.search(pattern, query, re.IGNORECASE)
+        if match:
+            price_str = match.group(1)
+            if price_str is None:  # a versão anterior falhava aqui
+                continue
+            try:
+                return float(price_str.replace('.', '').replace(',', '.'))
+            except ValueError:
+                continue
+    return None
+
+
+def legacy_extract_category(query: str) -> str:
+    categories = {
+        'eletrônicos': ['notebook', 'smartphone', 'celular', 'computador', 'tablet'],
+        'roupas': ['camisa', 'calça', 'vestido', 'roupa', 'blusa'],
+        'casa': ['móvel', 'decoração', 'cozinha', 'quarto', 'sala'],
+        'esportes': ['tênis', 'bicicleta', 'academia', 'corrida', 'futebol']
+    }
+    query_lower = query.lower()
+    for category, keywords in categories.items():
+        if any(keyword in query_lower for keyword in keywords):
+            return category
+    return None
+
+
+def legacy_analyze(query: str):
+    product_id = re.search(r"(prod\d+)", query, re.IGNORECASE)
+    return {
+        "intent": legacy_classify_intent(query),
+        "order_id": legacy_extract_order_id(query),
+        "max_price": legacy_extract_price(query),
+        "category": legacy_extract_category(query),
+        "product_id": product_id.group(1).upper() if product_id else None
+    }
+
+
+def run(n_queries: int):
+    queries = make_queries(n_queries)
+    rules = IntentRules()
+
+    timings = {}
+    results = {}
+    for label, fn in (("anterior", legacy_analyze), ("IntentRules", rules.analyze)):
+        best = float("inf")
+        for _ in range(3):
+            start = time.perf_counter()
+            output = [fn(query) for query in queries]
+            best = min(best, time.perf_counter() - start)
+        timings[label], results[label] = best, output
+
+    mismatches = [
+        (query, old, new) for query, old, new in zip(queries, results["anterior"], results["IntentRules"])
+        if old != new
+    ]
+    print(f"{n_queries} consultas sintéticas")
+    for label, seconds in timings.items():
+        print(f"{label:>12}: {seconds / n_queries * 1e6:6.2f} µs/consulta  ({n_queries / seconds:,.0f} consultas/s)")
+    print(f"{'ganho':>12}: {timings['anterior'] / timings['IntentRules']:.1f}x")
+    print(f"resultados divergentes: {len(mismatches)}")
+    for query, old, new in mismatches[:5]:
+        print(f"  {query!r}\n    anterior: {old}\n    atual:    {new}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--queries", type=int, default=100000)
+    args = parser.parse_args()
+    run(args.queries)
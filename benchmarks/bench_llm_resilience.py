@@ -0,0 +1,124 @@
+"""
+Atendimento com o provedor degradado: cauda lenta, erros intermitentes e queda total.
+
+Sobe o servidor falso da OpenAI, injeta cada tipo de falha e roda as mesmas
+consultas (clientes simultâneos, aprocess_query) com e sem cada mecanismo do
+cliente resiliente: hedge contra a cauda lenta, novas tentativas contra erros
+intermitentes e circuit breaker contra a queda total. Reporta p50/p99, a fração
+de respostas que vieram do LLM (as demais são montadas por template com os
+dados recuperados) e quantas requisições chegaram ao provedor.
+
+Uso: python -m benchmarks.bench_llm_resilience [--queries 200] [--clients 8] [--chat-latency-ms 200]
+"""
+
+import time
+import asyncio
+import logging
+import argparse
+
+import numpy as np
+from langchain_openai import OpenAIEmbeddings
+
+from benchmarks.fake_openai_server import FakeOpenAIServer
+from benchmarks.load_chat import QUERIES, build_assistant, unique_suffixes
+from llm_client import CircuitBreaker, ResilientClient, create_openai_clients, http_clients
+
+# Latência base do endpoint de embeddings no servidor falso
+EMBEDDING_LATENCY_MS = 20
+
+# (rótulo, falhas injetadas no servidor, configuração dos clientes)
+SCENARIOS = [
+    ("sem falhas", {}, {}),
+    ("cauda lenta, sem hedge", {"slow_rate": 0.05, "slow_latency_ms": 3000}, {}),
+    ("cauda lenta, hedge", {"slow_rate": 0.05, "slow_latency_ms": 3000}, {"hedge": True}),
+    ("20% de erros, sem retry", {"error_rate": 0.2}, {"max_retries": 0}),
+    ("20% de erros, retry", {"error_rate": 0.2}, {"max_retries": 2}),
+    ("fora do ar, sem breaker", {"error_rate": 1.0}, {"failures": 10 ** 9}),
+    ("fora do ar, breaker", {"error_rate": 1.0}, {"failures": 5}),
+]
+
+FAULTS = ("error_rate", "slow_rate", "slow_latency_ms")
+
+
+def configure(assistant, chat_latency_ms: float, timeout: float, hedge: bool = False, max_retries: int = 2,
+              failures: int = 5):
+    """Clientes resilientes novos (circuito fechado, contadores zerados) para o cenário.
+
+    Com hedge, a duplicata sai depois de ~2x a latência normal do chat e ~5x a dos embeddings.
+    """
+    assistant.llm = ResilientClient(
+        "chat", CircuitBreaker(failures, reset_seconds=30), timeout=timeout, max_retries=max_retries,
+        hedge_after=2 * chat_latency_ms / 1000 if hedge else 0, base_delay=0.05
+    )
+    assistant.rag_system.embedding_client = ResilientClient(
+        "embeddings", CircuitBreaker(failures, reset_seconds=30), timeout=timeout, max_retries=max_retries,
+        hedge_after=5 * EMBEDDING_LATENCY_MS / 1000 if hedge else 0, base_delay=0.05
+    )
+
+
+async def run_scenario(assistant, queries, n_clients: int):
+    latencies, from_llm = [], 0
+    semaphore = asyncio.Semaphore(n_clients)
+
+    async def one(query: str):
+        nonlocal from_llm
+        async with semaphore:
+            start = time.perf_counter()
+            result = await assistant.aprocess_query(query, "bench")
+            latencies.append(time.perf_counter() - start)
+            # O servidor falso sempre responde com este prefixo; o resto veio do template
+            from_llm += result["response"].startswith("Resposta simulada")
+
+    await asyncio.gather(*(one(query) for query in queries))
+    return latencies, from_llm
+
+
+async def run_all(server: FakeOpenAIServer, n_queries: int, n_clients: int, chat_latency_ms: float,
+                  timeout: float, n_products: int):
+    assistant = build_assistant(server, n_products)
+    assistant.client, assistant.async_client = create_openai_clients("fake", base_url=server.base_url)
+    sync_http, async_http = http_clients()
+    assistant.rag_system.embeddings.underlying = OpenAIEmbeddings(
+        base_url=server.base_url, api_key="fake", check_embedding_ctx_length=False, max_retries=0,
+        http_client=sync_http, http_async_client=async_http
+    )
+
+    suffixes = unique_suffixes()
+    print(f"{n_queries} consultas por cenário, {n_clients} clientes, chat {chat_latency_ms:.0f} ms, "
+          f"prazo {timeout:g} s")
+    print(f"{'cenário':>26} | {'p50 ms':>8} | {'p99 ms':>8} | {'do LLM':>7} | {'requisições':>11} | "
+          f"{'retries':>7} | {'hedges':>6} | {'circuito':>9}")
+    for label, faults, client in SCENARIOS:
+        for name in FAULTS:
+            setattr(server, name, faults.get(name, 0))
+        configure(assistant, chat_latency_ms, timeout, **client)
+        # Consultas inéditas: nem o cache de respostas nem o de embeddings evitam a rede
+        queries = [f"{QUERIES[i % len(QUERIES)]} {next(suffixes)}" for i in range(n_queries)]
+        requests = server.stats["requests"]
+        latencies, from_llm = await run_scenario(assistant, queries, n_clients)
+
+        stats = assistant.llm.stats()
+        embedding_stats = assistant.rag_system.embedding_client.stats()
+        p50, p99 = np.percentile(np.array(latencies) * 1000, [50, 99])
+        print(f"{label:>26} | {p50:>8.0f} | {p99:>8.0f} | {from_llm / n_queries:>7.0%} | "
+              f"{server.stats['requests'] - requests:>11} | {stats['retries'] + embedding_stats['retries']:>7} | "
+              f"{stats['hedged'] + embedding_stats['hedged']:>6} | "
+              f"{stats['circuit']['state']:>9}")
+
+
+def run(n_queries: int, n_clients: int, chat_latency_ms: float, timeout: float, n_products: int):
+    with FakeOpenAIServer(latency_ms=EMBEDDING_LATENCY_MS, chat_latency_ms=chat_latency_ms, seed=3) as server:
+        asyncio.run(run_all(server, n_queries, n_clients, chat_latency_ms, timeout, n_products))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--chat-latency-ms", type=float, default=200)
+    parser.add_argument("--timeout", type=float, default=10)
+    parser.add_argument("--products", type=int, default=2000)
+    args = parser.parse_args()
+    # Cada falha gera um aviso no log; aqui só interessa a tabela
+    logging.basicConfig(level=logging.ERROR)
+    run(args.queries, args.clients, args.chat_latency_ms, args.timeout, args.products)
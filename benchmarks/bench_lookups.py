@@ -0,0 +1,79 @@
+"""
+Benchmark das buscas diretas por id/nome de produto e id de pedido.
+
+Compara os índices em memória do RAGSystem com a varredura linear antiga
+para catálogos de tamanhos crescentes. O custo dos índices deve ficar
+constante em N (também para nomes parciais e para os que não existem no
+catálogo); o da varredura cresce linearmente.
+
+Uso: python -m benchmarks.bench_lookups [--sizes 1000 10000 100000 200000]
+"""
+
+import argparse
+import random
+import tempfile
+import time
+
+from benchmarks.synthetic import make_products, make_orders, write_dataset
+from rag_system import RAGSystem
+
+
+def _per_call_us(fn, args, repeat: int = 3) -> float:
+    """Menor tempo médio por chamada (µs) entre `repeat` rodadas"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for arg in args:
+            fn(arg)
+        best = min(best, (time.perf_counter() - start) / len(args))
+    return best * 1e6
+
+
+def run(sizes, queries: int = 200):
+    print(
+        f"{'N':>8} | {'id (µs)':>9} {'nome (µs)':>10} {'parcial (µs)':>13} {'ausente (µs)':>13} {'pedido (µs)':>12} | "
+        f"{'scan id (µs)':>13} {'scan pedido (µs)':>17}"
+    )
+    for n in sizes:
+        products = make_products(n)
+        orders = make_orders(n, products)
+        with tempfile.TemporaryDirectory() as data_dir:
+            write_dataset(data_dir, products, orders)
+            rag = RAGSystem("benchmark", vector_db_path=None, embedding_cache_path=None)
+            rag.load_data(data_dir)
+
+        rng = random.Random(0)
+        product_ids = [p["id"] for p in rng.sample(products, min(queries, n))]
+        names = [p["nome"] for p in rng.sample(products, min(queries, n))]
+        # Nomes com a última palavra incompleta (ex.: "fone blue") e nomes que não estão no catálogo
+        partial_names = [name[:-2] if len(name.split()[-1]) > 2 else name[:-1] for name in names]
+        missing_names = [f"{name} inexistente{i}" for i, name in enumerate(names)]
+        order_ids = [o["pedido_id"] for o in rng.sample(rag.orders_data, min(queries, n))]
+
+        by_id = _per_call_us(rag.find_product_by_id, product_ids)
+        by_name = _per_call_us(rag.find_product_by_name, names)
+        by_partial = _per_call_us(rag.find_product_by_name, partial_names)
+        by_missing = _per_call_us(rag.find_product_by_name, missing_names)
+        by_order = _per_call_us(rag.find_order, order_ids)
+
+        # Varredura linear sobre a lista de dicionários (implementação anterior)
+        scan_ids = product_ids[:20]
+        scan_orders = order_ids[:20]
+        scan_id = _per_call_us(
+            lambda pid: next((p for p in products if p["id"] == pid), None), scan_ids, repeat=1
+        )
+        scan_order = _per_call_us(
+            lambda oid: next((o for o in rag.orders_data if o.get("pedido_id") == oid), None), scan_orders, repeat=1
+        )
+        print(
+            f"{n:>8} | {by_id:>9.2f} {by_name:>10.2f} {by_partial:>13.2f} {by_missing:>13.2f} {by_order:>12.2f} | "
+            f"{scan_id:>13.1f} {scan_order:>17.1f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000, 200000])
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+    run(args.sizes, args.queries)
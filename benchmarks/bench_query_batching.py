@@ -0,0 +1,70 @@
+"""
+Agrupamento de embeddings de consultas concorrentes (EmbeddingBatcher).
+
+Clientes simultâneos pedem embeddings de consultas inéditas pelo
+CachedEmbeddings, contra o servidor falso com latência e limite de
+requisições simultâneas. Compara chamadas individuais com janelas de
+agrupamento: vazão, chamadas HTTP e latência p50/p95 por consulta.
+
+Uso: python -m benchmarks.bench_query_batching [--clients 1 64] [--windows 0 2 5 10]
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+from langchain_openai import OpenAIEmbeddings
+
+from benchmarks.fake_openai_server import FakeOpenAIServer
+from embedding_cache import EmbeddingCache, CachedEmbeddings
+
+
+async def _run(embeddings: CachedEmbeddings, clients: int, per_client: int, tag: str):
+    latencies = []
+
+    async def client(client_id: int):
+        for i in range(per_client):
+            start = time.perf_counter()
+            await embeddings.aembed_query(f"consulta {tag} cliente {client_id} número {i}")
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(c) for c in range(clients)))
+    return clients * per_client / (time.perf_counter() - start), latencies
+
+
+def run(windows, client_counts, per_client: int, latency_ms: float, max_concurrent: int, max_batch: int):
+    with FakeOpenAIServer(latency_ms=latency_ms, max_concurrent=max_concurrent) as server:
+        underlying = OpenAIEmbeddings(
+            base_url=server.base_url, api_key="fake", check_embedding_ctx_length=False, max_retries=0
+        )
+        for clients in client_counts:
+            # Com um cliente só a janela é puro atraso: mostra a latência adicionada
+            print(f"\n{clients} clientes x {per_client} consultas, latência {latency_ms:.0f} ms, "
+                  f"{max_concurrent} requisições simultâneas no servidor")
+            print(f"{'janela':>8} | {'consultas/s':>11} | {'chamadas':>8} | {'p50 ms':>7} | {'p95 ms':>7}")
+            for window in windows:
+                embeddings = CachedEmbeddings(
+                    underlying, EmbeddingCache(None), batch_window_ms=window, max_batch_size=max_batch
+                )
+                before = server.stats["requests"]
+                rate, latencies = asyncio.run(_run(embeddings, clients, per_client, f"c{clients}j{window}"))
+                latencies.sort()
+                p50 = statistics.median(latencies) * 1000
+                p95 = latencies[max(int(len(latencies) * 0.95) - 1, 0)] * 1000
+                label = "sem" if not window else f"{window:g} ms"
+                print(f"{label:>8} | {rate:>11.1f} | {server.stats['requests'] - before:>8} | "
+                      f"{p50:>7.1f} | {p95:>7.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--windows", type=float, nargs="+", default=[0, 2, 5, 10])
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 64])
+    parser.add_argument("--per-client", type=int, default=10)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--max-concurrent", type=int, default=8)
+    parser.add_argument("--max-batch", type=int, default=64)
+    args = parser.parse_args()
+    run(args.windows, args.clients, args.per_client, args.latency_ms, args.max_concurrent, args.max_batch)
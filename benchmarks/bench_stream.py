@@ -0,0 +1,60 @@
+"""
+Latência percebida: resposta completa (/chat) x streaming (/chat/stream).
+
+Para cada consulta mede o tempo até a resposta inteira, até os dados
+estruturados (evento `meta`, o primeiro byte do stream) e até o primeiro
+token, com o LLM simulado pelo servidor falso.
+
+Uso: python -m benchmarks.bench_stream [--queries 20] [--chat-latency-ms 800]
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+from benchmarks.fake_openai_server import FakeOpenAIServer
+from benchmarks.load_chat import QUERIES, build_assistant, unique_suffixes
+
+
+async def measure(assistant, n_queries: int):
+    full, ttfb, first_token = [], [], []
+    suffixes = unique_suffixes()
+    for i in range(n_queries):
+        # Consultas inéditas, para que nenhuma das medições aproveite o cache de embeddings
+        query = f"{QUERIES[i % len(QUERIES)]} {next(suffixes)}"
+        start = time.perf_counter()
+        await assistant.aprocess_query(query, "bench")
+        full.append(time.perf_counter() - start)
+
+        query = f"{QUERIES[i % len(QUERIES)]} {next(suffixes)}"
+        start = time.perf_counter()
+        result, prompt, _ = await assistant.aprepare_query(query, "bench")
+        ttfb.append(time.perf_counter() - start)
+        first = None
+        async for _ in assistant.astream_response(prompt):
+            if first is None:
+                first = time.perf_counter() - start
+        first_token.append(first)
+    return full, ttfb, first_token
+
+
+def run(n_queries: int, latency_ms: float, chat_latency_ms: float, n_products: int):
+    with FakeOpenAIServer(latency_ms=latency_ms, chat_latency_ms=chat_latency_ms) as server:
+        assistant = build_assistant(server, n_products)
+        full, ttfb, first_token = asyncio.run(measure(assistant, n_queries))
+
+    print(f"latência embeddings {latency_ms:.0f} ms, chat {chat_latency_ms:.0f} ms, {n_queries} consultas")
+    for label, values in (("resposta completa", full), ("primeiro byte (meta)", ttfb),
+                          ("primeiro token", first_token)):
+        print(f"{label:>22}: mediana {statistics.median(values) * 1000:7.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=30)
+    parser.add_argument("--chat-latency-ms", type=float, default=800)
+    parser.add_argument("--products", type=int, default=2000)
+    args = parser.parse_args()
+    run(args.queries, args.latency_ms, args.chat_latency_ms, args.products)
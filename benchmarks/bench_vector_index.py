@@ -0,0 +1,90 @@
+"""
+Tipos de índice FAISS (VECTOR_DB_TYPE) em catálogos sintéticos.
+
+Para cada tamanho de catálogo constrói os índices flat, ivf_flat, hnsw e
+ivf_pq com vetores aleatórios agrupados (imitando embeddings, sem rede) e
+reporta tempo de construção (treino + inserção), tamanho do índice,
+recall@k em relação ao flat e latência p50/p95 de consultas isoladas, como
+as do assistente.
+
+Uso: python -m benchmarks.bench_vector_index [--sizes 10000 100000 1000000] [--dim 256]
+     [--nprobe 16] [--ef-search 64]
+"""
+
+import os
+import time
+import argparse
+import tempfile
+import statistics
+
+import faiss
+import numpy as np
+
+from vector_index import VectorIndexFactory, INDEX_TYPES
+
+
+def make_vectors(n: int, dim: int, n_queries: int, seed: int = 42):
+    """Vetores normalizados em torno de centros aleatórios, e consultas da mesma distribuição"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(n // 100, 10), dim)).astype(np.float32)
+
+    def sample(count: int) -> np.ndarray:
+        vectors = centers[rng.integers(len(centers), size=count)]
+        vectors += 0.5 * rng.standard_normal((count, dim)).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors
+
+    return sample(n), sample(n_queries)
+
+
+def index_size_mb(index: faiss.Index) -> float:
+    """Tamanho do índice serializado (o que vai para disco e para a memória)"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "index.faiss")
+        faiss.write_index(index, path)
+        return os.path.getsize(path) / 1024 / 1024
+
+
+def run(sizes, dim: int, k: int, n_queries: int, nprobe: int, ef_search: int, train_size: int):
+    for n in sizes:
+        vectors, queries = make_vectors(n, dim, n_queries)
+        print(f"\n{n} vetores de dimensão {dim}, {n_queries} consultas, k={k} "
+              f"(nprobe={nprobe}, efSearch={ef_search})")
+        print(f"{'índice':>9} | {'construção s':>12} | {'tamanho MB':>10} | {'recall@k':>8} | "
+              f"{'p50 ms':>7} | {'p95 ms':>7}")
+
+        exact = None
+        for index_type in INDEX_TYPES:
+            factory = VectorIndexFactory(index_type, nprobe=nprobe, ef_search=ef_search, min_vectors=0)
+            start = time.perf_counter()
+            # Como no RAGSystem: treino com a primeira leva de vetores
+            index = factory.create(vectors[:train_size], expected_total=n)
+            index.add(vectors)
+            build = time.perf_counter() - start
+
+            timings, results = [], []
+            for query in queries:
+                start = time.perf_counter()
+                _, positions = index.search(query[None, :], k)
+                timings.append((time.perf_counter() - start) * 1000)
+                results.append(positions[0])
+            timings.sort()
+            if exact is None:
+                exact = results
+            recall = np.mean([len(set(found) & set(truth)) / k for found, truth in zip(results, exact)])
+
+            print(f"{index_type:>9} | {build:>12.2f} | {index_size_mb(index):>10.1f} | {recall:>8.3f} | "
+                  f"{statistics.median(timings):>7.3f} | {timings[int(len(timings) * 0.95) - 1]:>7.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--nprobe", type=int, default=16)
+    parser.add_argument("--ef-search", type=int, default=64)
+    parser.add_argument("--train-size", type=int, default=10000)
+    args = parser.parse_args()
+    run(args.sizes, args.dim, args.k, args.queries, args.nprobe, args.ef_search, args.train_size)
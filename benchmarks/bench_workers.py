@@ -0,0 +1,129 @@
+"""
+Memória e tempo de início de vários workers com índices próprios ou compartilhados.
+
+Gera um catálogo sintético, constrói uma vez os índices e o catálogo compacto
+(como `src/build_index.py`) e sobe N processos em cada modo:
+
+- independente: cada worker lê os índices salvos por inteiro e refaz o BM25
+  (o comportamento sem VECTOR_DB_READ_ONLY);
+- compartilhado: cada worker abre índices e catálogo mapeados em memória
+  (VECTOR_DB_READ_ONLY=true).
+
+Com todos os workers vivos e depois de algumas buscas, reporta o tempo de
+início, o RSS e o PSS (memória proporcional: páginas compartilhadas são
+divididas entre os processos) de cada worker e o PSS somado.
+
+Uso: python -m benchmarks.bench_workers [--workers 4] [--products 20000] [--dim 1536]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+import statistics
+
+from benchmarks.fakes import FakeEmbeddings
+from benchmarks.synthetic import make_products, make_orders, make_queries, write_dataset
+from rag_system import RAGSystem
+
+POLICIES_FILE = os.path.join(os.path.dirname(__file__), "..", "data", "politicas.md")
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+MODES = {"independente": False, "compartilhado": True}
+
+
+def memory_mb() -> dict:
+    """RSS e PSS do processo atual (Linux, /proc/self/smaps_rollup)"""
+    values = {}
+    with open("/proc/self/smaps_rollup", 'r') as f:
+        for line in f:
+            key, _, rest = line.partition(":")
+            if key in ("Rss", "Pss"):
+                values[key.lower()] = int(rest.split()[0]) / 1024
+    return values
+
+
+def make_rag(data_dir: str, dim: int, read_only: bool) -> RAGSystem:
+    rag = RAGSystem("benchmark", vector_db_path=os.path.join(data_dir, "vector_db"),
+                    embedding_cache_path=None, read_only=read_only)
+    rag.embeddings.underlying = FakeEmbeddings(dim=dim)
+    return rag
+
+
+def worker(data_dir: str, dim: int, read_only: bool, n_queries: int):
+    """Processo filho: carrega, busca, avisa que está pronto e mede a memória quando pedido"""
+    start = time.perf_counter()
+    rag = make_rag(data_dir, dim, read_only)
+    rag.load_data(data_dir)
+    rag.create_vector_stores()
+    cold_start = time.perf_counter() - start
+
+    rag.lexical_search = False  # força a busca vetorial (percorre as páginas do índice)
+    for query in make_queries(n_queries, seed=11):
+        rag.get_recommendations(query)
+    print(json.dumps({"cold_start_s": cold_start}), flush=True)
+
+    sys.stdin.readline()
+    print(json.dumps(memory_mb()), flush=True)
+
+
+def run_mode(data_dir: str, dim: int, read_only: bool, n_workers: int, n_queries: int):
+    command = [sys.executable, "-m", "benchmarks.bench_workers", "--worker", "--data-dir", data_dir,
+               "--dim", str(dim), "--queries", str(n_queries)] + (["--read-only"] if read_only else [])
+    procs = [subprocess.Popen(command, cwd=ROOT_DIR, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+             for _ in range(n_workers)]
+    # Todos prontos antes de medir: o PSS só divide páginas entre processos vivos
+    ready = [json.loads(proc.stdout.readline()) for proc in procs]
+    for proc in procs:
+        proc.stdin.write("\n")
+        proc.stdin.flush()
+    memory = [json.loads(proc.stdout.readline()) for proc in procs]
+    for proc in procs:
+        proc.wait()
+    return ready, memory
+
+
+def run(n_workers: int, n_products: int, dim: int, n_queries: int):
+    products = make_products(n_products)
+    orders = make_orders(n_products // 4, products)
+    with open(POLICIES_FILE, 'r', encoding='utf-8') as f:
+        policies = f.read()
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        write_dataset(data_dir, products, orders, policies)
+        start = time.perf_counter()
+        rag = make_rag(data_dir, dim, read_only=False)
+        rag.load_data(data_dir)
+        rag.create_vector_stores()
+        rag.save_snapshot(data_dir)
+        print(f"{n_products} produtos, vetores de dimensão {dim}: build {time.perf_counter() - start:.1f} s; "
+              f"{n_workers} workers, {n_queries} buscas cada")
+        del rag
+
+        print(f"{'modo':>13} | {'início s':>8} | {'RSS MB':>7} | {'PSS MB':>7} | {'PSS total MB':>12}")
+        for label, read_only in MODES.items():
+            ready, memory = run_mode(data_dir, dim, read_only, n_workers, n_queries)
+            pss = [sample["pss"] for sample in memory]
+            print(f"{label:>13} | {statistics.mean(r['cold_start_s'] for r in ready):>8.2f} | "
+                  f"{statistics.mean(sample['rss'] for sample in memory):>7.0f} | "
+                  f"{statistics.mean(pss):>7.0f} | {sum(pss):>12.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--products", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--data-dir", help=argparse.SUPPRESS)
+    parser.add_argument("--read-only", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args.data_dir, args.dim, args.read_only, args.queries)
+    else:
+        run(args.workers, args.products, args.dim, args.queries)
@@ -0,0 +1,261 @@
+"""
+Servidor HTTP local que imita as APIs de embeddings e chat da OpenAI.
+
+Devolve vetores determinísticos (derivados do hash de cada entrada) e
+respostas de chat fixas (inteiras ou em streaming SSE), e permite injetar
+latência, cauda lenta (uma fração das requisições bem mais demorada),
+limite de requisições simultâneas, erros 500/429 e uma queda total após N
+requisições, para exercitar lotes, novas tentativas, hedge, circuit
+breaker, concorrência e retomada sem rede. Os atributos de falha podem ser
+alterados com o servidor no ar (ex.: `server.error_rate = 1` simula uma queda).
+
+Uso: python -m benchmarks.fake_openai_server [--port 8089] [--latency-ms 50]
+Clientes: OpenAIEmbeddings(base_url="http://127.0.0.1:8089/v1", api_key="fake"),
+          OpenAI/AsyncOpenAI(base_url="http://127.0.0.1:8089/v1", api_key="fake")
+"""
+
+import argparse
+import base64
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+
+class _Server(ThreadingHTTPServer):
+    # Fila de conexões maior que o padrão (5) para suportar muitos clientes simultâneos
+    request_queue_size = 1024
+    daemon_threads = True
+
+
+class FakeOpenAIServer:
+    """Servidor falso executado em uma thread em segundo plano"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, dim: int = 64, latency_ms: float = 0,
+                 error_rate: float = 0, rate_limit_rate: float = 0, fail_after: int = None, seed: int = 0,
+                 chat_latency_ms: float = None, max_concurrent: int = None, slow_rate: float = 0,
+                 slow_latency_ms: float = 0):
+        self.dim = dim
+        self.latency_ms = latency_ms
+        self.chat_latency_ms = latency_ms if chat_latency_ms is None else chat_latency_ms
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.slow_rate = slow_rate
+        self.slow_latency_ms = slow_latency_ms
+        self.fail_after = fail_after
+        self.random = random.Random(seed)
+        # Requisições além do limite esperam na fila, como num provedor saturado
+        self.slots = threading.BoundedSemaphore(max_concurrent) if max_concurrent else None
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "inputs": 0, "errors": 0, "slow": 0, "completions": 0, "streams_aborted": 0}
+        self.httpd = _Server((host, port), self._handler())
+        self.thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "FakeOpenAIServer":
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def vector(self, item) -> np.ndarray:
+        """Vetor determinístico para uma entrada (texto ou lista de tokens)"""
+        payload = item if isinstance(item, str) else json.dumps(item)
+        seed = int.from_bytes(hashlib.blake2b(payload.encode("utf-8"), digest_size=8).digest(), "little")
+        return np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32)
+
+    def _latency_ms(self, base_ms: float) -> float:
+        """Latência desta requisição: a base ou, com probabilidade slow_rate, a da cauda lenta"""
+        with self.lock:
+            if self.slow_rate and self.random.random() < self.slow_rate:
+                self.stats["slow"] += 1
+                return self.slow_latency_ms
+        return base_ms
+
+    def _fault(self) -> int:
+        """Status HTTP a simular nesta requisição (None = sucesso)"""
+        with self.lock:
+            self.stats["requests"] += 1
+            if self.fail_after is not None and self.stats["requests"] > self.fail_after:
+                status = 500
+            elif self.random.random() < self.rate_limit_rate:
+                status = 429
+            elif self.random.random() < self.error_rate:
+                status = 500
+            else:
+                return None
+            self.stats["errors"] += 1
+            return status
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status: int, body: dict):
+                data = json.dumps(body).encode("utf-8")
+                try:
+                    self.send_response(status)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    # Cliente desistiu antes da resposta (prazo esgotado ou hedge vencido pela duplicata)
+                    pass
+
+            def do_POST(self):
+                if server.slots is None:
+                    self._handle_post()
+                    return
+                with server.slots:
+                    self._handle_post()
+
+            def _handle_post(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                is_chat = self.path.rstrip("/").endswith("/chat/completions")
+                streaming = is_chat and body.get("stream", False)
+                latency_ms = server._latency_ms(server.chat_latency_ms if is_chat else server.latency_ms)
+                # Em streaming a latência é distribuída entre os pedaços da resposta
+                if latency_ms and not streaming:
+                    time.sleep(latency_ms / 1000)
+                status = server._fault()
+                if status is not None:
+                    self._send(status, {"error": {"message": "falha simulada", "type": "server_error"}})
+                    return
+
+                if self.path.rstrip("/").endswith("/embeddings"):
+                    self._embeddings(body)
+                elif streaming:
+                    self._chat_stream(body)
+                elif is_chat:
+                    self._chat(body)
+                else:
+                    self._send(404, {"error": {"message": f"rota desconhecida: {self.path}"}})
+
+            def _embeddings(self, body: dict):
+                inputs = body.get("input", [])
+                if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+                    inputs = [inputs]
+                with server.lock:
+                    server.stats["inputs"] += len(inputs)
+                data = []
+                for i, item in enumerate(inputs):
+                    vector = server.vector(item)
+                    if body.get("encoding_format") == "base64":
+                        embedding = base64.b64encode(vector.tobytes()).decode("ascii")
+                    else:
+                        embedding = vector.tolist()
+                    data.append({"object": "embedding", "index": i, "embedding": embedding})
+                tokens = sum(len(item) if isinstance(item, list) else len(item) // 4 + 1 for item in inputs)
+                self._send(200, {
+                    "object": "list",
+                    "data": data,
+                    "model": body.get("model", "fake-embedding"),
+                    "usage": {"prompt_tokens": tokens, "total_tokens": tokens}
+                })
+
+            def _chat(self, body: dict):
+                with server.lock:
+                    server.stats["completions"] += 1
+                prompt = body.get("messages", [{}])[-1].get("content", "")
+                content = server.reply(prompt)
+                prompt_tokens = sum(len(m.get("content", "")) // 4 + 1 for m in body.get("messages", []))
+                completion_tokens = len(content) // 4 + 1
+                self._send(200, {
+                    "id": "chatcmpl-fake",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": body.get("model", "fake-chat"),
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": content},
+                        "finish_reason": "stop"
+                    }],
+                    "usage": {
+                        "prompt_tokens": prompt_tokens,
+                        "completion_tokens": completion_tokens,
+                        "total_tokens": prompt_tokens + completion_tokens
+                    }
+                })
+
+            def _chat_stream(self, body: dict):
+                with server.lock:
+                    server.stats["completions"] += 1
+                prompt = body.get("messages", [{}])[-1].get("content", "")
+                words = server.reply(prompt).split(" ")
+                delay = server.chat_latency_ms / 1000 / len(words)
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.end_headers()
+                try:
+                    for i, word in enumerate(words):
+                        time.sleep(delay)
+                        chunk = {
+                            "id": "chatcmpl-fake",
+                            "object": "chat.completion.chunk",
+                            "created": int(time.time()),
+                            "model": body.get("model", "fake-chat"),
+                            "choices": [{
+                                "index": 0,
+                                "delta": {"content": word if i == 0 else " " + word},
+                                "finish_reason": "stop" if i == len(words) - 1 else None
+                            }]
+                        }
+                        self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                        self.wfile.flush()
+                    self.wfile.write(b"data: [DONE]\n\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    # Cliente fechou a conexão no meio da resposta
+                    with server.lock:
+                        server.stats["streams_aborted"] += 1
+
+        return Handler
+
+    def reply(self, prompt: str) -> str:
+        """Resposta fixa de chat, derivada do prompt"""
+        summary = " ".join(prompt.split())[:120]
+        return f"Resposta simulada do assistente com base em: {summary}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--dim", type=int, default=64)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--chat-latency-ms", type=float, default=None)
+    parser.add_argument("--error-rate", type=float, default=0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0)
+    parser.add_argument("--max-concurrent", type=int, default=None)
+    parser.add_argument("--slow-rate", type=float, default=0)
+    parser.add_argument("--slow-latency-ms", type=float, default=0)
+    args = parser.parse_args()
+    server = FakeOpenAIServer(args.host, args.port, args.dim, args.latency_ms, args.error_rate,
+                              args.rate_limit_rate, chat_latency_ms=args.chat_latency_ms,
+                              max_concurrent=args.max_concurrent, slow_rate=args.slow_rate,
+                              slow_latency_ms=args.slow_latency_ms)
+    print(f"Servidor falso em {server.base_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,109 @@
+"""
+Substitutos determinísticos da OpenAI para rodar benchmarks sem rede
+"""
+
+import time
+import asyncio
+import hashlib
+from types import SimpleNamespace
+from typing import List, Dict
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+class FakeEmbeddings(Embeddings):
+    """Embeddings determinísticos derivados do hash do texto.
+
+    `latency_ms` simula a espera de rede de cada chamada (lotes pagam uma vez só);
+    com `timeout` menor que ela, a chamada síncrona falha como a requisição real.
+    """
+
+    model = "fake-embedding"
+
+    def __init__(self, dim: int = 64, latency_ms: float = 0):
+        self.dim = dim
+        self.latency = latency_ms / 1000
+        self.calls = 0
+        self.texts = 0
+
+    def _vector(self, text: str) -> List[float]:
+        seed = int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+        return np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32).tolist()
+
+    def _wait(self, timeout: float = None):
+        if timeout is not None and timeout < self.latency:
+            time.sleep(timeout)
+            raise TimeoutError(f"embedding: {timeout:.3f}s sem resposta")
+        if self.latency:
+            time.sleep(self.latency)
+
+    def embed_documents(self, texts: List[str], timeout: float = None) -> List[List[float]]:
+        self._wait(timeout)
+        self.calls += 1
+        self.texts += len(texts)
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str, timeout: float = None) -> List[float]:
+        self._wait(timeout)
+        self.calls += 1
+        self.texts += 1
+        return self._vector(text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.calls += 1
+        self.texts += len(texts)
+        return [self._vector(text) for text in texts]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
+
+
+class FakeChatClient:
+    """Cliente de chat no formato do `openai.OpenAI` (só `chat.completions.create`).
+
+    A resposta é um texto determinístico derivado do prompt, com `words`
+    palavras; `latency_ms` simula o tempo de geração e `prefill_ms_per_1k`
+    o de leitura do prompt (por mil tokens, ~4 caracteres por token).
+    """
+
+    def __init__(self, latency_ms: float = 0, words: int = 60, prefill_ms_per_1k: float = 0):
+        self.latency = latency_ms / 1000
+        self.prefill = prefill_ms_per_1k / 1000 / 1000
+        self.words = words
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _prompt_tokens(self, messages: List[Dict[str, str]]) -> int:
+        return sum(len(m["content"]) for m in messages) // 4
+
+    def _latency(self, messages: List[Dict[str, str]]) -> float:
+        return self.latency + self.prefill * self._prompt_tokens(messages)
+
+    def _response(self, messages: List[Dict[str, str]]) -> SimpleNamespace:
+        self.calls += 1
+        prompt = messages[-1]["content"]
+        seed = hashlib.blake2b(prompt.encode("utf-8"), digest_size=4).hexdigest()
+        text = " ".join(f"resposta{seed}-{i}" for i in range(self.words))
+        usage = SimpleNamespace(
+            prompt_tokens=self._prompt_tokens(messages), completion_tokens=self.words
+        )
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))], usage=usage)
+
+    def _create(self, messages: List[Dict[str, str]], **params) -> SimpleNamespace:
+        latency = self._latency(messages)
+        if latency:
+            time.sleep(latency)
+        return self._response(messages)
+
+
+class FakeAsyncChatClient(FakeChatClient):
+    """Versão assíncrona do FakeChatClient, no formato do `openai.AsyncOpenAI`"""
+
+    async def _create(self, messages: List[Dict[str, str]], **params) -> SimpleNamespace:
+        latency = self._latency(messages)
+        if latency:
+            await asyncio.sleep(latency)
+        return self._response(messages)
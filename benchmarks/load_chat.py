@@ -0,0 +1,99 @@
+"""
+Teste de carga do atendimento em um único event loop (um worker uvicorn).
+
+Compara o caminho antigo (process_query síncrono chamado dentro de uma
+corrotina, como fazia o /chat) com aprocess_query, variando o número de
+clientes simultâneos. Embeddings e chat vão para o servidor falso com
+latência simulada, então o gargalo é a espera de rede, não a CPU.
+
+Uso: python -m benchmarks.load_chat [--clients 1 4 16 32] [--chat-latency-ms 300]
+"""
+
+import argparse
+import asyncio
+import itertools
+import string
+import tempfile
+import time
+
+from langchain_openai import OpenAIEmbeddings
+from openai import OpenAI, AsyncOpenAI
+
+from benchmarks.fake_openai_server import FakeOpenAIServer
+from benchmarks.fakes import FakeEmbeddings
+from benchmarks.synthetic import make_products, make_orders, write_dataset
+from assistente import AssitenteVirtual
+from rag_system import RAGSystem
+
+QUERIES = [
+    "Quero um notebook para programar",
+    "Como faço para trocar um produto?",
+    "Que presente vocês sugerem para quem gosta de cozinhar?",
+    "Meu pedido #100010 já saiu para entrega?",
+    "Oi, tudo bem?",
+]
+
+
+def unique_suffixes():
+    """Sufixos só com letras, para cada consulta ser inédita sem mudar a intenção"""
+    for size in itertools.count(2):
+        for letters in itertools.product(string.ascii_lowercase, repeat=size):
+            yield "".join(letters)
+
+
+def build_assistant(server: FakeOpenAIServer, n_products: int) -> AssitenteVirtual:
+    """Assistente com índices locais e chamadas de rede apontadas para o servidor falso"""
+    data_dir = tempfile.mkdtemp()
+    products = make_products(n_products)
+    write_dataset(data_dir, products, make_orders(100, products), "# Trocas\\nProdutos podem ser trocados em até 30 dias.")
+    rag = RAGSystem("fake", vector_db_path=None, embedding_cache_path=None)
+    rag.embeddings.underlying = FakeEmbeddings(dim=server.dim)
+    rag.load_data(data_dir)
+    rag.create_vector_stores()
+    rag.embeddings.underlying = OpenAIEmbeddings(
+        base_url=server.base_url, api_key="fake", check_embedding_ctx_length=False
+    )
+
+    assistant = AssitenteVirtual("fake", rag_system=rag)
+    assistant.client = OpenAI(base_url=server.base_url, api_key="fake")
+    assistant.async_client = AsyncOpenAI(base_url=server.base_url, api_key="fake")
+    return assistant
+
+
+async def _run_clients(assistant: AssitenteVirtual, mode: str, clients: int, per_client: int, suffixes) -> float:
+    """Executa `clients` clientes simultâneos e retorna requisições/s"""
+    async def client(client_id: int):
+        for i in range(per_client):
+            query = f"{QUERIES[(client_id + i) % len(QUERIES)]} {next(suffixes)}"
+            if mode == "sync":
+                # Comportamento anterior do /chat: chamada bloqueante dentro de `async def`
+                assistant.process_query(query, f"user{client_id}")
+            else:
+                await assistant.aprocess_query(query, f"user{client_id}")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(c) for c in range(clients)))
+    return clients * per_client / (time.perf_counter() - start)
+
+
+def run(client_counts, per_client: int, latency_ms: float, chat_latency_ms: float, n_products: int):
+    with FakeOpenAIServer(latency_ms=latency_ms, chat_latency_ms=chat_latency_ms) as server:
+        assistant = build_assistant(server, n_products)
+        suffixes = unique_suffixes()
+        print(f"latência embeddings {latency_ms:.0f} ms, chat {chat_latency_ms:.0f} ms, {per_client} consultas por cliente")
+        print(f"{'clientes':>8} | {'síncrono req/s':>15} | {'assíncrono req/s':>17}")
+        for clients in client_counts:
+            sync_rps = asyncio.run(_run_clients(assistant, "sync", clients, per_client, suffixes))
+            async_rps = asyncio.run(_run_clients(assistant, "async", clients, per_client, suffixes))
+            print(f"{clients:>8} | {sync_rps:>15.1f} | {async_rps:>17.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 4, 16, 32])
+    parser.add_argument("--per-client", type=int, default=5)
+    parser.add_argument("--latency-ms", type=float, default=30)
+    parser.add_argument("--chat-latency-ms", type=float, default=300)
+    parser.add_argument("--products", type=int, default=2000)
+    args = parser.parse_args()
+    run(args.clients, args.per_client, args.latency_ms, args.chat_latency_ms, args.products)
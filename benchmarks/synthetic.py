@@ -0,0 +1,114 @@
+"""
+Geração de catálogos e pedidos sintéticos para os benchmarks
+"""
+
+import os
+import json
+import random
+from typing import List, Dict
+
+CATEGORIAS = ["Eletrônicos", "Casa", "Esportes", "Roupas", "Livros"]
+MARCAS = ["Dell", "Samsung", "Apple", "Philips", "Nike", "Adidas", "Tramontina", "Electrolux", "LG", "Lenovo"]
+TIPOS = {
+    "Eletrônicos": ["Notebook", "Smartphone", "Tablet", "Fone de Ouvido", "Monitor"],
+    "Casa": ["Cafeteira", "Panela", "Liquidificador", "Aspirador", "Luminária"],
+    "Esportes": ["Tênis de Corrida", "Bicicleta", "Bola de Futebol", "Halteres", "Esteira"],
+    "Roupas": ["Camisa", "Calça Jeans", "Vestido", "Jaqueta", "Blusa"],
+    "Livros": ["Romance", "Livro de Receitas", "Biografia", "Manual de Python", "Ficção Científica"]
+}
+STATUS = ["Em trânsito", "Entregue", "Preparando", "Cancelado", "Aguardando pagamento"]
+
+# Modelos de consultas de clientes, um grupo por intenção esperada
+CONSULTAS = [
+    "Quero um {tipo} para trabalhar, até R$ {preco}",
+    "Preciso de um {tipo} {marca} bom e barato",
+    "Estou procurando {tipo} na faixa de {preco} reais",
+    "Tem {tipo} por no máximo {preco}?",
+    "Cadê meu pedido #{pedido}?",
+    "Meu pedido {pedido} já saiu para entrega?",
+    "Qual o status da compra número {pedido}",
+    "Como faço para trocar um produto com defeito?",
+    "Qual o prazo para devolver uma {tipo}?",
+    "A garantia cobre a {tipo} {marca}?",
+    "O que vocês podem recomendar para quem gosta de {hobby}?",
+    "Quero sugerir um presente para minha mãe",
+    "Qual o preço de {tipo} {marca}",
+    "Informações sobre PROD{produto:06d}",
+    "Detalhes do {tipo} {marca} Modelo {produto}",
+    "Oi, tudo bem?",
+    "Boa noite, preciso de ajuda",
+    "Vocês vendem {tipo}?",
+]
+HOBBIES = ["cozinhar", "correr", "ler", "tecnologia", "futebol", "decoração da sala"]
+
+
+def make_products(n: int, seed: int = 42) -> List[Dict]:
+    """Gera `n` produtos no formato de data/produtos.json"""
+    rng = random.Random(seed)
+    products = []
+    for i in range(n):
+        categoria = rng.choice(CATEGORIAS)
+        tipo = rng.choice(TIPOS[categoria])
+        marca = rng.choice(MARCAS)
+        products.append({
+            "id": f"PROD{i + 1:06d}",
+            "nome": f"{tipo} {marca} Modelo {i + 1}",
+            "categoria": categoria,
+            "preco": round(rng.uniform(20, 10000), 2),
+            "descricao": f"{tipo} da marca {marca} com ótimo custo-benefício, ideal para o dia a dia.",
+            "especificacoes": {"marca": marca, "garantia": f"{rng.choice([3, 6, 12, 24])} meses"},
+            "disponivel": rng.random() > 0.2
+        })
+    return products
+
+
+def make_orders(n: int, products: List[Dict], seed: int = 42) -> List[Dict]:
+    """Gera `n` pedidos que referenciam produtos do catálogo"""
+    rng = random.Random(seed)
+    orders = []
+    for i in range(n):
+        items = rng.sample(products, k=min(len(products), rng.randint(1, 3)))
+        orders.append({
+            "pedido_id": str(100000 + i),
+            "status": rng.choice(STATUS),
+            "data_compra": "2024-01-15",
+            "previsao_entrega": "2024-01-20",
+            "valor_total": round(sum(p["preco"] for p in items), 2),
+            "produtos": [
+                {"id": p["id"], "nome": p["nome"], "quantidade": 1, "preco_unitario": p["preco"]}
+                for p in items
+            ]
+        })
+    return orders
+
+
+def make_queries(n: int, seed: int = 42, order_ids: List[str] = None) -> List[str]:
+    """Gera `n` consultas em português cobrindo todas as intenções.
+
+    Com `order_ids`, as consultas de pedido usam pedidos existentes.
+    """
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(n):
+        categoria = rng.choice(CATEGORIAS)
+        queries.append(rng.choice(CONSULTAS).format(
+            tipo=rng.choice(TIPOS[categoria]).lower(),
+            marca=rng.choice(MARCAS),
+            preco=rng.choice(["500", "1.500", "2.999,90", "3000", "10.000"]),
+            pedido=rng.choice(order_ids) if order_ids else rng.randint(10000, 99999),
+            produto=rng.randint(1, 999),
+            hobby=rng.choice(HOBBIES)
+        ))
+    return queries
+
+
+def write_dataset(data_dir: str, products: List[Dict], orders: List[Dict], policies: str = ""):
+    """Grava os arquivos no layout esperado por RAGSystem.load_data"""
+    os.makedirs(data_dir, exist_ok=True)
+    with open(os.path.join(data_dir, "produtos.json"), "w", encoding="utf-8") as f:
+        json.dump(products, f, ensure_ascii=False)
+    with open(os.path.join(data_dir, "pedidos.json"), "w", encoding="utf-8") as f:
+        json.dump(orders, f, ensure_ascii=False)
+    if policies:
+        with open(os.path.join(data_dir, "politicas.md"), "w", encoding="utf-8") as f:
+            f.write(policies)
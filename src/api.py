@@ -4,20 +4,81 @@ Desenvolvido por Pedro Favoretti - Drope Dev
 """
 
 import os
-from fastapi import FastAPI, HTTPException
+import json
+import time
+import logging
+import secrets
+import threading
+import orjson
+from contextlib import aclosing, asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import StreamingResponse, ORJSONResponse, PlainTextResponse
 from pydantic import BaseModel
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Iterator
 from dotenv import load_dotenv
-from assistente import AssitenteVirtual
+from metrics import REGISTRY
+from readiness import Readiness, NotReadyError
 
 # Carregar variáveis de ambiente
 load_dotenv()
 
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+logger = logging.getLogger(__name__)
+
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+DATA_DIR = "./data"
+
+# Assistente criado em segundo plano; até lá (e para intenções cujos dados não carregaram) a API responde 503
+assistente = None
+readiness = Readiness()
+
+
+def warm_up():
+    """Importa os módulos pesados e carrega catálogo e índices, liberando as intenções por etapa"""
+    global assistente
+    started = time.perf_counter()
+    try:
+        if not OPENAI_API_KEY or OPENAI_API_KEY == "your_openai_api_key_here":
+            raise ValueError("OPENAI_API_KEY não configurada. Configure no arquivo .env")
+        
+        # langchain, faiss e openai levam segundos para importar: fora do caminho do bind
+        from assistente import AssitenteVirtual
+        from rag_system import RAGSystem
+        imported = time.perf_counter()
+        
+        rag_system = RAGSystem(OPENAI_API_KEY, readiness=readiness)
+        rag_system.load_data(DATA_DIR)
+        assistente = AssitenteVirtual(OPENAI_API_KEY, data_dir=DATA_DIR, rag_system=rag_system)
+        rag_system.create_product_index()
+        rag_system.create_policy_index()
+    
+    except Exception as e:
+        logger.exception("Falha ao iniciar o assistente")
+        readiness.fail_pending(str(e))
+        return
+    
+    components = readiness.snapshot()["components"]
+    logger.info(
+        "Assistente pronto em %.2f s (imports %.2f s; %s)",
+        time.perf_counter() - started, imported - started,
+        ", ".join(f"{name} em {state['seconds']:.2f} s" for name, state in components.items())
+    )
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # O servidor aceita conexões já; o carregamento segue em segundo plano
+    threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+    yield
+
+
 app = FastAPI(
     title="Assistente Virtual E-commerce",
     description="API para assistente virtual especializado em e-commerce",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Configurar CORS
@@ -29,12 +90,58 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Inicializar assistente
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-if not OPENAI_API_KEY or OPENAI_API_KEY == "your_openai_api_key_here":
-    raise ValueError("OPENAI_API_KEY não configurada. Configure no arquivo .env")
 
-assistente = AssitenteVirtual(OPENAI_API_KEY, data_dir="./data")
+
+class StreamSafeGZipMiddleware(GZipMiddleware):
+    """Compressão gzip, exceto nas rotas de streaming (o buffer do gzip atrasaria os eventos)"""
+    
+    def __init__(self, app, exclude_paths=(), **kwargs):
+        super().__init__(app, **kwargs)
+        self.exclude_paths = set(exclude_paths)
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] in self.exclude_paths:
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+
+# Comprimir respostas grandes (listagens e exportações)
+app.add_middleware(StreamSafeGZipMiddleware, minimum_size=1024, exclude_paths=("/chat/stream", "/chat/batch"))
+
+# Identifica esta instância nas ETags: as versões dos dados recomeçam a cada início
+INSTANCE_ID = secrets.token_hex(4)
+
+# Tamanho de página padrão e máximo das listagens
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Consultas por requisição em /chat/batch
+MAX_BATCH_QUERIES = 1000
+
+# Sugestão de espera (s) nas respostas 503 enquanto os dados carregam
+RETRY_AFTER_SECONDS = 5
+
+
+def require_ready(*components: str):
+    """Assistente com os componentes pedidos já carregados; senão, 503"""
+    missing = readiness.missing(components if assistente is not None else None)
+    if assistente is None or missing:
+        raise not_ready(missing or ["assistente"])
+    return assistente
+
+
+def not_ready(components: List[str]) -> HTTPException:
+    """503 para componentes ainda carregando (ou que falharam ao carregar)"""
+    states = readiness.snapshot()["components"]
+    failed = [name for name in components if states.get(name, {}).get("status") == "failed"]
+    if failed:
+        return HTTPException(status_code=503, detail=f"Falha ao carregar: {', '.join(failed)}; veja /ready")
+    return HTTPException(
+        status_code=503,
+        detail=f"Ainda carregando: {', '.join(components)}",
+        headers={"Retry-After": str(RETRY_AFTER_SECONDS)}
+    )
 
 
 # Modelos Pydantic
@@ -43,12 +150,35 @@ class QueryRequest(BaseModel):
     user_id: Optional[str] = "default"
 
 
+class BatchQueryRequest(BaseModel):
+    queries: List[str]
+    user_id: Optional[str] = "default"
+
+
 class QueryResponse(BaseModel):
     intent: str
     response: str
     data: Optional[Dict[str, Any]] = None
 
 
+class ProductPayload(BaseModel):
+    nome: str
+    categoria: str
+    preco: float
+    descricao: str
+    especificacoes: Dict[str, Any] = {}
+    disponivel: bool = True
+
+
+class ProductPatch(BaseModel):
+    nome: Optional[str] = None
+    categoria: Optional[str] = None
+    preco: Optional[float] = None
+    descricao: Optional[str] = None
+    especificacoes: Optional[Dict[str, Any]] = None
+    disponivel: Optional[bool] = None
+
+
 class HealthResponse(BaseModel):
     status: str
     message: str
@@ -66,11 +196,30 @@ async def root():
 
 @app.get("/health", response_model=HealthResponse)
 async def health_check():
-    """Verificação de saúde da API"""
-    return HealthResponse(
-        status="healthy",
-        message="API está funcionando corretamente"
-    )
+    """Verificação de vida do processo (a prontidão dos dados fica em /ready)"""
+    state = readiness.snapshot()
+    if state["ready"]:
+        return HealthResponse(status="healthy", message="API está funcionando corretamente")
+    if any(component["status"] == "failed" for component in state["components"].values()):
+        return HealthResponse(status="failed", message="Falha ao carregar os dados; veja /ready")
+    return HealthResponse(status="starting", message="API no ar, carregando dados e índices")
+
+
+@app.get("/ready")
+async def ready(require: Optional[str] = None):
+    """
+    Prontidão de cada componente (catalogo, indice_produtos, indice_politicas).
+    
+    Responde 200 quando todos (ou os listados em `require`, separados por
+    vírgula) estão prontos e 503 caso contrário, sempre com o estado de cada um.
+    """
+    state = readiness.snapshot()
+    components = parse_fields(require)
+    unknown = set(components or ()) - set(state["components"])
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Componentes desconhecidos: {', '.join(sorted(unknown))}")
+    ok = assistente is not None and not readiness.missing(components)
+    return ORJSONResponse(state, status_code=200 if ok else 503)
 
 
 @app.post("/chat", response_model=QueryResponse)
@@ -82,43 +231,160 @@ async def chat(request: QueryRequest):
         if not request.query.strip():
             raise HTTPException(status_code=400, detail="Query não pode estar vazia")
         
-        # Processar consulta
-        result = assistente.process_query(request.query, request.user_id)
-        
-        # Preparar dados adicionais
-        data = {}
-        if result["intent"] == "busca_produto":
-            data = {
-                "products": result.get("products", []),
-                "filters": result.get("filters", {})
-            }
-        elif result["intent"] == "consulta_pedido":
-            data = {
-                "order_id": result.get("order_id"),
-                "order": result.get("order")
-            }
-        elif result["intent"] == "recomendacao":
-            data = {
-                "recommendations": result.get("recommendations", [])
-            }
+        # Processar consulta sem bloquear o event loop
+        result = await require_ready().aprocess_query(request.query, request.user_id)
         
         return QueryResponse(
             intent=result["intent"],
             response=result["response"],
-            data=data
+            data=response_data(result)
         )
     
+    except HTTPException:
+        raise
+    except NotReadyError as e:
+        raise not_ready(e.components)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro interno: {str(e)}")
 
 
+@app.post("/chat/stream")
+async def chat_stream(request: QueryRequest, http_request: Request):
+    """
+    Conversa com o assistente via server-sent events.
+    
+    Eventos: `meta` (intenção e dados estruturados, assim que a busca termina),
+    `token` (pedaços da resposta) e `done` (tempos em ms); `error` em caso de falha.
+    """
+    if not request.query.strip():
+        raise HTTPException(status_code=400, detail="Query não pode estar vazia")
+    
+    assistente = require_ready()
+    # 503 antes de abrir o stream se a intenção depende de dados ainda carregando
+    missing = assistente.missing_components(assistente.classify_intent(request.query))
+    if missing:
+        raise not_ready(missing)
+    
+    started = time.perf_counter()
+    
+    def elapsed_ms() -> float:
+        return round((time.perf_counter() - started) * 1000, 1)
+    
+    async def events():
+        try:
+            result, prompt, cache_key = await assistente.aprepare_query(request.query, request.user_id)
+        except Exception as e:
+            yield sse_event("error", {"detail": f"Erro interno: {str(e)}"})
+            return
+        
+        ttfb_ms = elapsed_ms()
+        yield sse_event("meta", {"intent": result["intent"], "data": response_data(result)})
+        
+        first_token_ms = None
+        async with aclosing(assistente.astream_response(prompt, cache_key, result)) as tokens:
+            async for text in tokens:
+                if await http_request.is_disconnected():
+                    # Sair do bloco fecha o stream e cancela a chamada à OpenAI
+                    logger.info("chat/stream: cliente desconectado após %.0f ms", elapsed_ms())
+                    return
+                if first_token_ms is None:
+                    first_token_ms = elapsed_ms()
+                yield sse_event("token", {"text": text})
+        
+        timings = {"ttfb_ms": ttfb_ms, "first_token_ms": first_token_ms, "total_ms": elapsed_ms()}
+        logger.info(
+            "chat/stream: intent=%s ttfb=%.0f ms primeiro token=%s ms total=%.0f ms",
+            result["intent"], ttfb_ms, first_token_ms, timings["total_ms"]
+        )
+        yield sse_event("done", timings)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.post("/chat/batch")
+async def chat_batch(request: BatchQueryRequest):
+    """
+    Processa um lote de consultas e devolve NDJSON, uma linha por consulta, na ordem do lote.
+    
+    Cada linha traz `index`, `intent`, `response` e `data` (como o /chat) ou,
+    se a consulta falhar, `index`, `status` (503 ou 500) e `detail`.
+    """
+    if not request.queries:
+        raise HTTPException(status_code=400, detail="Lista de consultas vazia")
+    if len(request.queries) > MAX_BATCH_QUERIES:
+        raise HTTPException(status_code=400, detail=f"Máximo de {MAX_BATCH_QUERIES} consultas por lote")
+    empty = [i for i, query in enumerate(request.queries) if not query.strip()]
+    if empty:
+        raise HTTPException(status_code=400, detail=f"Consultas vazias nas posições: {', '.join(map(str, empty))}")
+    
+    assistente = require_ready()
+    
+    async def lines():
+        index = 0
+        try:
+            async with aclosing(assistente.aprocess_queries(request.queries, request.user_id)) as results:
+                async for result in results:
+                    yield batch_line(index, result)
+                    index += 1
+        except Exception as e:
+            # Falha do lote inteiro (ex.: classificação): as consultas restantes saem com erro
+            logger.exception("chat/batch: lote interrompido na consulta %d", index)
+            for position in range(index, len(request.queries)):
+                yield batch_line(position, e)
+    
+    return StreamingResponse(lines(), media_type="application/x-ndjson", headers={"Cache-Control": "no-cache"})
+
+
+def batch_line(index: int, result) -> bytes:
+    """Linha NDJSON de uma consulta do lote: o resultado ou o erro"""
+    if isinstance(result, NotReadyError):
+        error = not_ready(result.components)
+        payload = {"index": index, "status": error.status_code, "detail": error.detail}
+    elif isinstance(result, Exception):
+        payload = {"index": index, "status": 500, "detail": f"Erro interno: {str(result)}"}
+    else:
+        payload = {"index": index, "intent": result["intent"], "response": result["response"],
+                   "data": response_data(result)}
+    return orjson.dumps(payload) + b"\n"
+
+
+def response_data(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Dados estruturados da resposta, conforme a intenção"""
+    data = {}
+    if result["intent"] == "busca_produto":
+        data = {
+            "products": result.get("products", []),
+            "filters": result.get("filters", {})
+        }
+    elif result["intent"] == "consulta_pedido":
+        data = {
+            "order_id": result.get("order_id"),
+            "order": result.get("order")
+        }
+    elif result["intent"] == "recomendacao":
+        data = {
+            "recommendations": result.get("recommendations", [])
+        }
+    return data
+
+
+def sse_event(event: str, payload: Dict[str, Any]) -> str:
+    """Formata um evento server-sent events"""
+    return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+
 @app.get("/history/{user_id}")
 async def get_history(user_id: str):
     """
     Retorna histórico de conversas do usuário
     """
+    assistente = require_ready()
     try:
-        history = assistente.get_conversation_history(user_id)
+        history = await assistente.run_blocking(assistente.get_conversation_history, user_id)
         return {"user_id": user_id, "history": history}
     
     except Exception as e:
@@ -130,44 +396,304 @@ async def clear_history(user_id: str):
     """
     Limpa histórico de conversas do usuário
     """
+    assistente = require_ready()
     try:
-        assistente.clear_conversation_history(user_id)
+        await assistente.run_blocking(assistente.clear_conversation_history, user_id)
         return {"message": f"Histórico do usuário {user_id} limpo com sucesso"}
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao limpar histórico: {str(e)}")
 
 
+@app.get("/stats/embeddings")
+async def embedding_cache_stats():
+    """
+    Retorna os contadores do cache de embeddings
+    """
+    return require_ready().rag_system.embeddings.stats()
+
+
+@app.get("/stats/responses")
+async def response_cache_stats():
+    """
+    Retorna os contadores do cache de respostas do LLM
+    """
+    return require_ready().response_cache.stats()
+
+
+@app.get("/stats/retrieval")
+async def retrieval_stats():
+    """
+    Retorna os contadores da busca híbrida e a fração de buscas atendidas sem chamada de rede
+    """
+    return require_ready().rag_system.retrieval_stats_snapshot()
+
+
+@app.get("/stats/llm")
+async def llm_client_stats():
+    """
+    Retorna os contadores dos clientes de chat e de embeddings (novas tentativas, hedge) e o estado dos circuitos
+    """
+    assistente = require_ready()
+    return {"chat": assistente.llm.stats(), "embeddings": assistente.rag_system.embedding_client.stats()}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """
+    Métricas no formato de exposição do Prometheus: duração de cada etapa
+    (classificação, embedding, buscas, handlers, LLM), intenções, cache de
+    respostas, tokens do LLM e erros, mais os contadores dos caches e da
+    busca híbrida. O texto só é montado aqui, a cada coleta.
+    """
+    components = readiness.snapshot()["components"]
+    gauges = {
+        "assistente_component_ready": {name: int(state["status"] == "ready") for name, state in components.items()}
+    }
+    if assistente is not None:
+        rag = assistente.rag_system
+        gauges.update({
+            "assistente_embedding_cache": rag.embeddings.stats(),
+            "assistente_response_cache": assistente.response_cache.stats(),
+            "assistente_retrieval": rag.retrieval_stats_snapshot(),
+            "assistente_conversations": assistente.conversations.stats(),
+            "assistente_llm_client": {"chat": assistente.llm.stats(), "embeddings": rag.embedding_client.stats()}
+        })
+    return PlainTextResponse(REGISTRY.render(gauges), media_type="text/plain; version=0.0.4")
+
+
 @app.get("/products")
-async def list_products():
+async def list_products(
+    request: Request,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[str] = None,
+    categoria: Optional[str] = None,
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    disponivel: Optional[bool] = None
+):
     """
-    Lista todos os produtos disponíveis
+    Lista produtos em páginas (ordem de id), com filtros e projeção de campos.
+    
+    `cursor` é o `next_cursor` da página anterior; `fields` é uma lista
+    separada por vírgulas (ex.: `id,nome,preco`). Responde 304 se o
+    `If-None-Match` corresponder à versão atual do catálogo.
     """
+    rag = require_ready("catalogo").rag_system
+    etag = data_etag("produtos", rag.data_versions["produtos"])
+    if not_modified(request, etag):
+        return Response(status_code=304, headers=cache_headers(etag))
+    
     try:
-        return {"products": assistente.rag_system.products_data}
+        # Trava de leitura: uma alteração em andamento não desloca as linhas no meio da página
+        with rag.reading():
+            catalog = rag.products_data
+            mask = catalog.filter_mask(
+                max_price=max_price, min_price=min_price, category=categoria, available_only=bool(disponivel)
+            )
+            if disponivel is False:
+                mask &= ~catalog.available
+            rows = catalog.page_rows(mask, after=cursor, limit=limit + 1)
+            
+            page = project(catalog.records(rows[:limit]), parse_fields(fields))
+            next_cursor = str(catalog.ids[rows[limit - 1]]) if len(rows) > limit else None
+        return ORJSONResponse(
+            {"products": page, "next_cursor": next_cursor}, headers=cache_headers(etag)
+        )
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao listar produtos: {str(e)}")
 
 
+@app.get("/products/export")
+async def export_products(request: Request):
+    """
+    Exporta o catálogo inteiro em NDJSON (um produto por linha), em streaming
+    """
+    rag = require_ready("catalogo").rag_system
+    etag = data_etag("produtos", rag.data_versions["produtos"])
+    if not_modified(request, etag):
+        return Response(status_code=304, headers=cache_headers(etag))
+    
+    # Só as referências aos registros são tomadas sob a trava; as alterações seguintes não afetam a exportação
+    with rag.reading():
+        records = rag.products_data.raw_records()
+    
+    def lines() -> Iterator[bytes]:
+        # Registros lidos sob demanda, no threadpool do StreamingResponse (nada é copiado antes do envio)
+        yield from ndjson_lines(records)
+    
+    return StreamingResponse(lines(), media_type="application/x-ndjson", headers=cache_headers(etag))
+
+
+@app.put("/products/{product_id}")
+async def upsert_product(product_id: str, product: ProductPayload):
+    """
+    Cria ou substitui um produto sem reconstruir o índice inteiro
+    """
+    assistente = require_ready("catalogo", "indice_produtos")
+    try:
+        # Embedding e gravação em disco: fora do event loop
+        result = await assistente.run_blocking(
+            assistente.rag_system.upsert_product, {"id": product_id, **product.model_dump()}
+        )
+        return {"product_id": product_id, "result": result}
+    
+    except PermissionError as e:
+        # Índices abertos somente leitura (VECTOR_DB_READ_ONLY)
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao salvar produto: {str(e)}")
+
+
+@app.patch("/products/{product_id}")
+async def update_product(product_id: str, changes: ProductPatch):
+    """
+    Atualiza campos de um produto (ex.: preço e estoque) sem novo embedding
+    """
+    assistente = require_ready("catalogo", "indice_produtos")
+    product = assistente.rag_system.find_product_by_id(product_id)
+    if product is None:
+        raise HTTPException(status_code=404, detail=f"Produto {product_id} não encontrado")
+    
+    try:
+        updated = {**product, **changes.model_dump(exclude_none=True)}
+        result = await assistente.run_blocking(assistente.rag_system.upsert_product, updated)
+        return {"product_id": product_id, "result": result}
+    
+    except PermissionError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao atualizar produto: {str(e)}")
+
+
+@app.delete("/products/{product_id}")
+async def delete_product(product_id: str):
+    """
+    Remove um produto do catálogo e do índice
+    """
+    assistente = require_ready("catalogo", "indice_produtos")
+    try:
+        removed = await assistente.run_blocking(assistente.rag_system.delete_product, product_id)
+    except PermissionError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao remover produto: {str(e)}")
+    
+    if not removed:
+        raise HTTPException(status_code=404, detail=f"Produto {product_id} não encontrado")
+    return {"message": f"Produto {product_id} removido com sucesso"}
+
+
 @app.get("/orders")
-async def list_orders():
+async def list_orders(
+    request: Request,
+    cursor: Optional[int] = Query(None, ge=0),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[str] = None,
+    status: Optional[str] = None
+):
     """
-    Lista todos os pedidos (para fins de demonstração)
+    Lista pedidos em páginas (para fins de demonstração), com filtro de status e projeção
     """
+    rag = require_ready("catalogo").rag_system
+    etag = data_etag("pedidos", rag.data_versions["pedidos"])
+    if not_modified(request, etag):
+        return Response(status_code=304, headers=cache_headers(etag))
+    
     try:
-        return {"orders": assistente.rag_system.orders_data}
+        after = cursor if cursor is not None else -1
+        positions = rag.order_positions(status=status, after=after, limit=limit + 1)
+        
+        page = project([rag.orders_data[position] for position in positions[:limit]], parse_fields(fields))
+        next_cursor = positions[limit - 1] if len(positions) > limit else None
+        return ORJSONResponse(
+            {"orders": page, "next_cursor": next_cursor}, headers=cache_headers(etag)
+        )
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao listar pedidos: {str(e)}")
 
 
+@app.get("/orders/export")
+async def export_orders(request: Request):
+    """
+    Exporta todos os pedidos em NDJSON, em streaming
+    """
+    rag = require_ready("catalogo").rag_system
+    etag = data_etag("pedidos", rag.data_versions["pedidos"])
+    if not_modified(request, etag):
+        return Response(status_code=304, headers=cache_headers(etag))
+    
+    # A lista de pedidos só é trocada inteira (nova carga), então pode ser lida sob demanda
+    return StreamingResponse(
+        ndjson_lines(orjson.dumps(order) for order in rag.orders_data),
+        media_type="application/x-ndjson", headers=cache_headers(etag)
+    )
+
+
+def data_etag(name: str, version: int) -> str:
+    """ETag fraca de um conjunto de dados (vale para qualquer página e filtro da mesma versão)"""
+    return f'W/"{name}-{INSTANCE_ID}-{version}"'
+
+
+def not_modified(request: Request, etag: str) -> bool:
+    """Indica se o cliente já tem a versão atual (If-None-Match)"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [tag.strip() for tag in header.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+def cache_headers(etag: str) -> Dict[str, str]:
+    """Cabeçalhos das listagens: o cliente guarda a resposta, mas sempre revalida"""
+    return {"ETag": etag, "Cache-Control": "no-cache"}
+
+
+def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """Lista de campos da projeção (None = todos)"""
+    if not fields:
+        return None
+    return [field.strip() for field in fields.split(",") if field.strip()]
+
+
+def project(records: List[Dict[str, Any]], fields: Optional[List[str]]) -> List[Dict[str, Any]]:
+    """Mantém só os campos pedidos de cada registro"""
+    if fields is None:
+        return records
+    return [{field: record[field] for field in fields if field in record} for record in records]
+
+
+def ndjson_lines(records) -> Iterator[bytes]:
+    """Uma linha por registro já serializado, agrupadas em blocos para reduzir escritas"""
+    block = []
+    for record in records:
+        block.append(record)
+        if len(block) == 500:
+            yield b"\n".join(block) + b"\n"
+            block = []
+    if block:
+        yield b"\n".join(block) + b"\n"
+
+
 if __name__ == "__main__":
     import uvicorn
     
     host = os.getenv("API_HOST", "0.0.0.0")
     port = int(os.getenv("API_PORT", 5000))
+    workers = int(os.getenv("API_WORKERS", 1))
     
-    uvicorn.run(app, host=host, port=port)
+    if workers > 1:
+        # Cada worker importa o módulo; com VECTOR_DB_READ_ONLY todos abrem os mesmos índices mapeados
+        from config import VECTOR_DB_READ_ONLY
+        if not VECTOR_DB_READ_ONLY:
+            logger.warning("API_WORKERS > 1 sem VECTOR_DB_READ_ONLY: cada worker terá sua cópia dos índices")
+        uvicorn.run("api:app", host=host, port=port, workers=workers)
+    else:
+        uvicorn.run(app, host=host, port=port)
 
 
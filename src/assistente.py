@@ -6,347 +6,841 @@ Desenvolvido por Pedro Favoretti - Drope Dev
 import os
 import re
 import json
-from typing import Dict, List, Any
-from openai import OpenAI
-from openai import AuthenticationError
+import time
+import asyncio
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Tuple, AsyncIterator, Callable, Iterator, Union
+from openai import AuthenticationError, APITimeoutError
 from rag_system import RAGSystem
+from response_cache import ResponseCache
+from conversation_store import create_conversation_store
+from llm_client import create_openai_clients, CircuitBreaker, CircuitOpenError, ResilientClient
+from prompt_builder import PromptBuilder
+from metrics import (
+    span, STAGE_SECONDS, RESPONSE_SECONDS, QUERIES, RESPONSE_CACHE, LLM_TOKENS, ERRORS, TEMPLATE_RESPONSES
+)
+from readiness import NotReadyError
 from prompts import *
+from config import (
+    LLM_MAX_CONCURRENCY, RETRIEVAL_WORKERS, RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL,
+    CONVERSATION_STORE, CONVERSATION_DB_PATH, CONVERSATION_MAX_TURNS, CONVERSATION_MAX_BYTES,
+    CONVERSATION_IDLE_TTL, CONVERSATION_MAX_USERS, LLM_TIMEOUT, LLM_MAX_RETRIES, LLM_HEDGE_AFTER_MS,
+    LLM_BREAKER_FAILURES, LLM_BREAKER_RESET_SECONDS, RESPONSE_MODES, MODEL_NAME, TEMPERATURE, MAX_TOKENS,
+    ORDER_LIST_LIMIT
+)
+
+logger = logging.getLogger(__name__)
+
+
+# Nome do produto nas buscas exatas ("informações sobre X", ...)
+PRODUCT_NAME_PATTERN = re.compile(
+    r"informações sobre (.+)|detalhes do (.+)|qual o preço de (.+)", re.IGNORECASE
+)
+
+# Status buscados quando a consulta de pedido não traz ID: (status, termos que o indicam na consulta)
+ORDER_STATUS_QUERIES = (
+    ("em trânsito", ("em trânsito", "a caminho")),
+    ("entregue", ("entregue",)),
+    ("cancelado", ("cancelado",))
+)
+
+# Intenções cuja busca pode depender do embedding da consulta (a busca lexical às vezes dispensa)
+EMBEDDING_INTENTS = {"busca_produto", "politicas", "recomendacao"}
+
+# Conjuntos de dados de que cada intenção depende (versões entram na chave do cache de respostas)
+INTENT_DATA = {
+    "busca_produto": ("produtos",),
+    "busca_produto_exata": ("produtos",),
+    "recomendacao": ("produtos",),
+    "consulta_pedido": ("pedidos",),
+    "politicas": ("politicas",),
+    "conversa_geral": ()
+}
+
+# Componentes (readiness.COMPONENTS) que precisam estar carregados para atender cada intenção
+INTENT_COMPONENTS = {
+    "busca_produto": ("catalogo", "indice_produtos"),
+    "busca_produto_exata": ("catalogo",),
+    "recomendacao": ("catalogo", "indice_produtos"),
+    "consulta_pedido": ("catalogo",),
+    "politicas": ("catalogo", "indice_politicas"),
+    "conversa_geral": ()
+}
+
+# Modos de resposta por intenção: só o LLM, só o template (dados do registro encontrado) ou
+# o template na hora e a resposta do LLM gerada em segundo plano para o cache
+RESPONSE_MODE_NAMES = ("llm", "template", "template_then_llm_async")
+
+AUTH_ERROR_MESSAGE = (
+    "Desculpe, não foi possível conectar com o serviço de inteligência artificial. "
+    "A chave da API OpenAI pode estar inválida ou ausente. Por favor, verifique a configuração."
+)
 
 
 class AssitenteVirtual:
-    def __init__(self, openai_api_key: str, data_dir: str = "./data"):
-        self.client = OpenAI(api_key=openai_api_key)
-        self.rag_system = RAGSystem(openai_api_key)
+    def __init__(self, openai_api_key: str, data_dir: str = "./data", rag_system: RAGSystem = None,
+                 conversations=None, response_modes: Dict[str, str] = None):
+        self.client, self.async_client = create_openai_clients(openai_api_key)
+        # Prazo, novas tentativas, hedge e circuit breaker das chamadas de chat
+        self.llm = ResilientClient(
+            "chat",
+            CircuitBreaker(LLM_BREAKER_FAILURES, LLM_BREAKER_RESET_SECONDS),
+            timeout=LLM_TIMEOUT,
+            max_retries=LLM_MAX_RETRIES,
+            hedge_after=LLM_HEDGE_AFTER_MS / 1000
+        )
+        # Contexto recuperado dentro do orçamento de tokens de cada intenção
+        self.prompt_builder = PromptBuilder()
         self.data_dir = data_dir
         
-        # Carregar dados e criar índices
-        self.rag_system.load_data(data_dir)
-        self.rag_system.create_vector_stores()
-        
-        # Histórico de conversas (em produção, usar banco de dados)
-        self.conversation_history = []
+        if rag_system is None:
+            # Carregar dados e criar índices
+            rag_system = RAGSystem(openai_api_key)
+            rag_system.load_data(data_dir)
+            rag_system.create_vector_stores()
+        self.rag_system = rag_system
+        # Regras de intenção e entidades compiladas (compartilhadas com o RAGSystem)
+        self.rules = rag_system.rules
+        
+        # Busca (FAISS, filtros) roda fora do event loop; chamadas ao LLM têm limite de concorrência
+        self._executor = ThreadPoolExecutor(max_workers=RETRIEVAL_WORKERS, thread_name_prefix="retrieval")
+        self._llm_semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+        self.response_cache = ResponseCache(max_entries=RESPONSE_CACHE_SIZE, ttl_seconds=RESPONSE_CACHE_TTL)
+        
+        # Modo de resposta por intenção (RESPONSE_MODES); respostas do LLM em geração no segundo plano
+        self.response_modes = dict(RESPONSE_MODES if response_modes is None else response_modes)
+        unknown = {mode for mode in self.response_modes.values() if mode not in RESPONSE_MODE_NAMES}
+        if unknown:
+            raise ValueError(
+                f"Modo de resposta desconhecido: {', '.join(sorted(unknown))} "
+                f"(use {', '.join(RESPONSE_MODE_NAMES)})"
+            )
+        self._refreshing = set()
+        self._refresh_lock = threading.Lock()
+        self._background = set()
+        
+        # Histórico de conversas por usuário (em memória ou SQLite, conforme CONVERSATION_STORE)
+        if conversations is None:
+            conversations = create_conversation_store(
+                CONVERSATION_STORE,
+                CONVERSATION_DB_PATH,
+                max_turns=CONVERSATION_MAX_TURNS,
+                max_bytes=CONVERSATION_MAX_BYTES,
+                idle_seconds=CONVERSATION_IDLE_TTL,
+                max_users=CONVERSATION_MAX_USERS
+            )
+        self.conversations = conversations
+        
+        # Conversa geral não está aqui: ela depende do histórico do usuário
+        self._handlers = {
+            "busca_produto": self._handle_product_search,
+            "busca_produto_exata": self._handle_exact_product_search,
+            "consulta_pedido": self._handle_order_query,
+            "politicas": self._handle_policy_query,
+            "recomendacao": self._handle_recommendation
+        }
+    
+    async def run_blocking(self, fn: Callable, *args) -> Any:
+        """Executa uma chamada bloqueante (rede, disco) no executor da busca, fora do event loop"""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
     
     def classify_intent(self, query: str) -> str:
         """Classifica a intenção do usuário"""
-        query_lower = query.lower()
-        
-        # Padrões para identificar intenções
-        # Priorizar consulta de pedido se houver um ID claro
-        if re.search(r"#?\d+", query) and any(word in query_lower for word in ["pedido", "compra", "status", "entrega", "rastreamento", "onde está"]):
-            return "consulta_pedido"
-        
-        # Busca de produto por ID ou nome exato
-        if re.search(r"prod\d+", query_lower) or any(word in query_lower for word in ["qual o preço de", "informações sobre", "detalhes do"]):
-            return "busca_produto_exata"
-
-        if any(word in query_lower for word in ["trocar", "devolver", "política", "prazo", "garantia", "cancelar"]):
-            return "politicas"
-        
-        if any(word in query_lower for word in ["recomendar", "sugerir", "indicar", "presente", "gift"]):
-            return "recomendacao"
-        
-        if any(word in query_lower for word in ["buscar", "procurar", "quero", "preciso", "notebook", "smartphone", "celular", "computador", "tablet", "produto"]):
-            return "busca_produto"
-        
-        if any(word in query_lower for word in ["oi", "olá", "bom dia", "boa tarde", "boa noite", "ajuda"]):
-            return "conversa_geral"
-        
-        # Default: busca de produto genérica
-        return "busca_produto"
+        return self.rules.analyze(query)["intent"]
     
     def extract_order_id(self, query: str) -> str:
         """Extrai ID do pedido da consulta"""
-        # Procurar por padrões como #12345, pedido 12345, etc.
-        patterns = [
-            r"#(\d+)",
-            r"pedido\s*(\d+)",
-            r"número\s*(\d+)",
-            r"(\d{4,})"  # Número com pelo menos 4 dígitos
-        ]
+        return self.rules.analyze(query)["order_id"]
+    
+    def missing_components(self, intent: str) -> List[str]:
+        """Componentes da intenção que ainda estão carregando"""
+        return self.rag_system.readiness.missing(INTENT_COMPONENTS.get(intent, ()))
+    
+    def _start_query(self, query: str, user_id: str) -> Dict[str, Any]:
+        """Classifica a consulta, extrai as entidades e registra no histórico.
+        
+        Levanta NotReadyError (antes de registrar) se os dados da intenção ainda não carregaram.
+        """
+        with span("classificacao"):
+            analysis = self.rules.analyze(query)
+        QUERIES.inc(intent=analysis["intent"])
+        missing = self.missing_components(analysis["intent"])
+        if missing:
+            raise NotReadyError(analysis["intent"], missing)
         
-        for pattern in patterns:
-            match = re.search(pattern, query, re.IGNORECASE)
-            if match:
-                return match.group(1)
+        # Adicionar ao histórico
+        with span("historico"):
+            self.conversations.append(user_id, {
+                "user_id": user_id,
+                "query": query,
+                "intent": analysis["intent"]
+            })
+        return analysis
+    
+    def _prepare(self, analysis: Dict[str, Any], query: str,
+                 user_id: str = "default") -> Tuple[Dict[str, Any], str, str]:
+        """Busca os dados da intenção e monta o prompt (sem chamar o LLM).
+        
+        Retorna também a chave do cache de respostas, calculada sobre o
+        contexto exato entregue ao prompt.
+        """
+        handler = self._handlers.get(analysis["intent"])
+        # Uma etapa por handler: separa busca de produtos, pedidos, políticas...
+        with span(f"dados_{analysis['intent']}"):
+            if handler is not None:
+                result, template, context = handler(query, analysis)
+            else:
+                result, template, context = self._handle_general_conversation(query, user_id, analysis.get("history"))
         
-        return None
+        with span("prompt"):
+            prompt = template.format(query=query, **context)
+            versions = {name: self.rag_system.data_versions[name] for name in INTENT_DATA.get(result["intent"], ())}
+            cache_key = self.response_cache.make_key(result["intent"], query, context, versions)
+        return result, prompt, cache_key
     
     def process_query(self, query: str, user_id: str = "default") -> Dict[str, Any]:
         """Processa uma consulta do usuário"""
-        intent = self.classify_intent(query)
+        start = time.perf_counter()
+        with span("total"):
+            analysis = self._start_query(query, user_id)
+            result, prompt, cache_key = self._prepare(analysis, query, user_id)
+            result["response"] = self._respond(result, prompt, cache_key)
+        RESPONSE_SECONDS.observe(time.perf_counter() - start, intent=result["intent"], mode=result["response_mode"])
+        return result
+    
+    async def aprepare_query(self, query: str, user_id: str = "default") -> Tuple[Dict[str, Any], str, str]:
+        """Classifica, busca os dados e monta o prompt sem bloquear o event loop"""
+        loop = asyncio.get_running_loop()
+        analysis, needs_vector = await loop.run_in_executor(self._executor, self._analyze, query, user_id)
         
-        # Adicionar ao histórico
-        self.conversation_history.append({
-            "user_id": user_id,
-            "query": query,
-            "intent": intent
-        })
-        
-        # Processar baseado na intenção
-        if intent == "busca_produto":
-            return self._handle_product_search(query)
-        elif intent == "busca_produto_exata":
-            return self._handle_exact_product_search(query)
-        elif intent == "consulta_pedido":
-            return self._handle_order_query(query)
-        elif intent == "politicas":
-            return self._handle_policy_query(query)
-        elif intent == "recomendacao":
-            return self._handle_recommendation(query)
+        if needs_vector:
+            # Embedding assíncrono: a busca síncrona no executor recebe o vetor pronto
+            analysis["query_vector"] = await self.rag_system.aembed_query(query)
+        
+        return await loop.run_in_executor(self._executor, self._prepare, analysis, query, user_id)
+    
+    def _analyze(self, query: str, user_id: str) -> Tuple[Dict[str, Any], bool]:
+        """`_start_query` (o histórico pode gravar em disco) e se a busca vai precisar do embedding"""
+        analysis = self._start_query(query, user_id)
+        return analysis, analysis["intent"] in EMBEDDING_INTENTS and self._needs_query_vector(analysis, query)
+    
+    def _needs_query_vector(self, analysis: Dict[str, Any], query: str) -> bool:
+        """Indica se a busca da intenção vai usar o embedding (a busca lexical pode bastar).
+        
+        O resultado lexical fica na análise para a busca da intenção não repeti-lo.
+        """
+        if analysis["intent"] == "politicas":
+            analysis["lexical_hits"] = self.rag_system.policy_lexical_hits(query)
+            return self.rag_system.policies_need_vector(analysis["lexical_hits"])
+        if analysis["intent"] == "busca_produto":
+            analysis["lexical_hits"] = self.rag_system.product_lexical_hits(
+                query, max_price=analysis["max_price"], category=analysis["category"]
+            )
         else:
-            return self._handle_general_conversation(query)
+            analysis["lexical_hits"] = self.rag_system.product_lexical_hits(query)
+        return self.rag_system.products_need_vector(analysis["lexical_hits"])
+    
+    async def aprocess_query(self, query: str, user_id: str = "default") -> Dict[str, Any]:
+        """Versão assíncrona de `process_query`, sem bloquear o event loop"""
+        start = time.perf_counter()
+        with span("total"):
+            result, prompt, cache_key = await self.aprepare_query(query, user_id)
+            result["response"] = await self._arespond(result, prompt, cache_key)
+        RESPONSE_SECONDS.observe(time.perf_counter() - start, intent=result["intent"], mode=result["response_mode"])
+        return result
+    
+    def process_queries(self, queries: List[str], user_id: str = "default") -> Iterator[Union[Dict[str, Any], Exception]]:
+        """Processa um lote de consultas; os resultados saem na ordem das consultas.
+        
+        Classifica tudo numa passada, calcula os embeddings das buscas em
+        lotes, faz a busca vetorial de cada tipo numa só chamada do FAISS e
+        gera as respostas com até LLM_MAX_CONCURRENCY em paralelo. Uma
+        consulta que não pode ser atendida (ex.: NotReadyError) sai como a
+        exceção no lugar do resultado, sem interromper o lote.
+        """
+        analyses, pending = self._analyze_batch(queries, user_id)
+        vectors = self.rag_system.embed_queries([queries[i] for i in pending])
+        self._attach_vector_hits(analyses, pending, vectors)
+        
+        pool = ThreadPoolExecutor(max_workers=LLM_MAX_CONCURRENCY, thread_name_prefix="batch")
+        try:
+            yield from pool.map(self._process_analyzed, queries, analyses, [user_id] * len(queries))
+        finally:
+            pool.shutdown(cancel_futures=True)
+    
+    async def aprocess_queries(self, queries: List[str],
+                               user_id: str = "default") -> AsyncIterator[Union[Dict[str, Any], Exception]]:
+        """Versão assíncrona de `process_queries`: até LLM_MAX_CONCURRENCY consultas em andamento"""
+        loop = asyncio.get_running_loop()
+        analyses, pending = await loop.run_in_executor(self._executor, self._analyze_batch, queries, user_id)
+        vectors = await self.rag_system.aembed_queries([queries[i] for i in pending])
+        await loop.run_in_executor(self._executor, self._attach_vector_hits, analyses, pending, vectors)
+        
+        in_flight = deque()
+        try:
+            for query, analysis in zip(queries, analyses):
+                in_flight.append(asyncio.ensure_future(self._aprocess_analyzed(query, analysis, user_id)))
+                if len(in_flight) >= LLM_MAX_CONCURRENCY:
+                    yield await in_flight.popleft()
+            while in_flight:
+                yield await in_flight.popleft()
+        finally:
+            for task in in_flight:
+                task.cancel()
+    
+    def _analyze_batch(self, queries: List[str], user_id: str) -> Tuple[List[Any], List[int]]:
+        """Análise de cada consulta (ou a NotReadyError) e as posições das que precisam do embedding"""
+        analyses, pending = [], []
+        for i, query in enumerate(queries):
+            try:
+                analysis = self._start_query(query, user_id)
+            except NotReadyError as e:
+                analyses.append(e)
+                continue
+            if analysis["intent"] == "conversa_geral":
+                # O histórico de quando a consulta chegou, sem as consultas seguintes do lote
+                analysis["history"] = self.conversations.recent(user_id, 3)
+            analyses.append(analysis)
+            if analysis["intent"] in EMBEDDING_INTENTS and self._needs_query_vector(analysis, query):
+                pending.append(i)
+        return analyses, pending
+    
+    def _attach_vector_hits(self, analyses: List[Dict[str, Any]], pending: List[int], vectors: List[List[float]]):
+        """Busca vetorial do lote: uma chamada para as políticas e uma por filtro para os produtos"""
+        products = [(i, vector) for i, vector in zip(pending, vectors) if analyses[i]["intent"] != "politicas"]
+        policies = [(i, vector) for i, vector in zip(pending, vectors) if analyses[i]["intent"] == "politicas"]
+        
+        with span("busca_lote"):
+            product_hits = self.rag_system.product_vector_hits(
+                [vector for _, vector in products],
+                [
+                    (analyses[i]["max_price"], analyses[i]["category"])
+                    if analyses[i]["intent"] == "busca_produto" else (None, None)
+                    for i, _ in products
+                ]
+            )
+            policy_hits = self.rag_system.policy_vector_hits([vector for _, vector in policies])
+        
+        for (i, vector), hits in zip(products + policies, product_hits + policy_hits):
+            analyses[i]["query_vector"] = vector
+            analyses[i]["vector_hits"] = hits
+    
+    def _process_analyzed(self, query: str, analysis: Any, user_id: str) -> Union[Dict[str, Any], Exception]:
+        """Busca e resposta de uma consulta do lote já classificada; erros voltam como resultado"""
+        if isinstance(analysis, Exception):
+            return analysis
+        start = time.perf_counter()
+        try:
+            result, prompt, cache_key = self._prepare(analysis, query, user_id)
+            result["response"] = self._respond(result, prompt, cache_key)
+        except Exception as e:
+            logger.exception("Consulta do lote falhou: %s", query)
+            return e
+        RESPONSE_SECONDS.observe(time.perf_counter() - start, intent=result["intent"], mode=result["response_mode"])
+        return result
+    
+    async def _aprocess_analyzed(self, query: str, analysis: Any, user_id: str) -> Union[Dict[str, Any], Exception]:
+        """Versão assíncrona de `_process_analyzed`"""
+        if isinstance(analysis, Exception):
+            return analysis
+        start = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            result, prompt, cache_key = await loop.run_in_executor(
+                self._executor, self._prepare, analysis, query, user_id
+            )
+            result["response"] = await self._arespond(result, prompt, cache_key)
+        except Exception as e:
+            logger.exception("Consulta do lote falhou: %s", query)
+            return e
+        RESPONSE_SECONDS.observe(time.perf_counter() - start, intent=result["intent"], mode=result["response_mode"])
+        return result
     
-    def _handle_product_search(self, query: str) -> Dict[str, Any]:
+    def _handle_product_search(self, query: str, analysis: Dict[str, Any]) -> Tuple[Dict[str, Any], str, Dict[str, str]]:
         """Processa busca de produtos"""
-        # Extrair filtros da consulta
-        max_price = self.rag_system.extract_price_from_query(query)
-        category = self.rag_system.extract_category_from_query(query)
+        # Filtros já extraídos da consulta
+        max_price = analysis["max_price"]
+        category = analysis["category"]
         
         # Buscar produtos
         products = self.rag_system.search_products(
             query, 
             max_price=max_price, 
-            category=category
+            category=category,
+            query_vector=analysis.get("query_vector"),
+            vector_hits=analysis.get("vector_hits"),
+            lexical_hits=analysis.get("lexical_hits")
         )
         
         # Gerar resposta
+        # Descrição por último: é o que se corta quando os produtos não cabem no orçamento
         if products:
-            products_text = "\n\n".join([
-                f"**{p["nome"]}**\n"
-                f"Categoria: {p["categoria"]}\n"
-                f"Preço: R$ {p["preco"]:.2f}\n"
-                f"Descrição: {p["descricao"]}\n"
-                f"ID: {p["id"]}"
+            products_text = self.prompt_builder.fit("busca_produto", [
+                f"**{p['nome']}**\n"
+                f"Categoria: {p['categoria']}\n"
+                f"Preço: R$ {p['preco']:.2f}\n"
+                f"ID: {p['id']}\n"
+                f"Descrição: {p['descricao']}"
                 for p in products
             ])
         else:
             products_text = "Nenhum produto encontrado com os critérios especificados."
         
-        prompt = PRODUCT_SEARCH_PROMPT.format(
-            query=query,
-            products=products_text
-        )
-        
-        response = self._generate_response(prompt)
-        
         return {
             "intent": "busca_produto",
-            "response": response,
             "products": products,
             "filters": {
                 "max_price": max_price,
                 "category": category
             }
-        }
+        }, PRODUCT_SEARCH_PROMPT, {"products": products_text}
 
-    def _handle_exact_product_search(self, query: str) -> Dict[str, Any]:
+    def _handle_exact_product_search(self, query: str, analysis: Dict[str, Any]) -> Tuple[Dict[str, Any], str, Dict[str, str]]:
         """Processa busca exata de produtos por ID ou nome"""
-        product_id_match = re.search(r"(prod\d+)", query, re.IGNORECASE)
-        product_name_match = re.search(r"informações sobre (.+)|detalhes do (.+)|qual o preço de (.+)", query, re.IGNORECASE)
+        product_id = analysis["product_id"]
+        product_name_match = PRODUCT_NAME_PATTERN.search(query)
 
         product = None
-        if product_id_match:
-            product_id = product_id_match.group(1).upper()
+        if product_id:
             product = self.rag_system.find_product_by_id(product_id)
         elif product_name_match:
             product_name = next(g for g in product_name_match.groups() if g is not None)
             product = self.rag_system.find_product_by_name(product_name)
 
         if product:
-            product_text = f"""
-            **{product["nome"]}**\n
-            Categoria: {product["categoria"]}\n
-            Preço: R$ {product["preco"]:.2f}\n
-            Descrição: {product["descricao"]}\n
-            Especificações: {json.dumps(product.get("especificacoes", {}), ensure_ascii=False)}\n
-            Disponível: {'Sim' if product.get('disponivel', True) else 'Não'}\n
-            ID: {product["id"]}
-            """
+            product_text = self.prompt_builder.fit("busca_produto_exata", [
+                f"**{product['nome']}**\n"
+                f"Categoria: {product['categoria']}\n"
+                f"Preço: R$ {product['preco']:.2f}\n"
+                f"Disponível: {'Sim' if product.get('disponivel', True) else 'Não'}\n"
+                f"ID: {product['id']}\n"
+                f"Especificações: {json.dumps(product.get('especificacoes', {}), ensure_ascii=False)}\n"
+                f"Descrição: {product['descricao']}"
+            ])
         else:
             product_text = "Produto não encontrado com o ID ou nome especificado."
 
-        prompt = PRODUCT_SEARCH_PROMPT.format(
-            query=query,
-            products=product_text
-        )
-
-        response = self._generate_response(prompt)
-
         return {
             "intent": "busca_produto_exata",
-            "response": response,
+            "product_id": product_id,
             "product": product
-        }
+        }, PRODUCT_SEARCH_PROMPT, {"products": product_text}
     
-    def _handle_order_query(self, query: str) -> Dict[str, Any]:
+    def _handle_order_query(self, query: str, analysis: Dict[str, Any]) -> Tuple[Dict[str, Any], str, Dict[str, str]]:
         """Processa consulta de pedidos"""
-        order_id = self.extract_order_id(query)
+        order_id = analysis["order_id"]
+        order = None
         
         if order_id:
             order = self.rag_system.find_order(order_id)
             
             if order:
-                order_text = f"""
-                Pedido #{order["pedido_id"]}
-                Status: {order["status"]}
-                Data da compra: {order["data_compra"]}
-                Previsão de entrega: {order["previsao_entrega"]}
-                Produtos: {", ".join([p["nome"] for p in order["produtos"]])}
-                """
+                fields = {**ORDER_FIELD_DEFAULTS, **order}
+                order_text = self.prompt_builder.fit("consulta_pedido", [
+                    f"Pedido #{order['pedido_id']}\n"
+                    f"Status: {fields['status']}\n"
+                    f"Data da compra: {fields['data_compra']}\n"
+                    f"Previsão de entrega: {fields['previsao_entrega']}\n"
+                    f"Produtos: {', '.join([p['nome'] for p in order.get('produtos', [])])}"
+                ])
             else:
                 order_text = f"Pedido #{order_id} não encontrado."
         else:
-            # Tentar buscar por status ou produto se não houver ID
-            if "em trânsito" in query.lower() or "a caminho" in query.lower():
-                orders = self.rag_system.search_orders_by_status("em trânsito")
-                if orders:
-                    order_text = "\n\n".join([
-                        f"Pedido #{o["pedido_id"]}: Status: {o["status"]}" for o in orders
-                    ])
-                else:
-                    order_text = "Nenhum pedido em trânsito encontrado."
-            elif "entregue" in query.lower():
-                orders = self.rag_system.search_orders_by_status("entregue")
-                if orders:
-                    order_text = "\n\n".join([
-                        f"Pedido #{o["pedido_id"]}: Status: {o["status"]}" for o in orders
-                    ])
-                else:
-                    order_text = "Nenhum pedido entregue encontrado."
-            elif "cancelado" in query.lower():
-                orders = self.rag_system.search_orders_by_status("cancelado")
-                if orders:
-                    order_text = "\n\n".join([
-                        f"Pedido #{o["pedido_id"]}: Status: {o["status"]}" for o in orders
-                    ])
-                else:
-                    order_text = "Nenhum pedido cancelado encontrado."
-            elif "produto" in query.lower():
-                product_name_match = re.search(r"produto (.+)", query, re.IGNORECASE)
-                if product_name_match:
-                    product_name = product_name_match.group(1)
-                    orders = self.rag_system.search_orders_by_product(product_name)
-                    if orders:
-                        order_text = "\n\n".join([
-                            f"Pedido #{o["pedido_id"]}: Status: {o["status"]}" for o in orders
-                        ])
-                    else:
-                        order_text = f"Nenhum pedido encontrado com o produto {product_name}."
-                else:
-                    order_text = "ID do pedido não identificado e não foi possível buscar por status ou produto."
-            else:
-                order_text = "ID do pedido não identificado na consulta."
-        
-        prompt = ORDER_STATUS_PROMPT.format(
-            query=query,
-            order_info=order_text
-        )
-        
-        response = self._generate_response(prompt)
+            order_text = self._order_list_text(query)
         
         return {
             "intent": "consulta_pedido",
-            "response": response,
             "order_id": order_id,
-            "order": order if order_id else None
-        }
+            "order": order
+        }, ORDER_STATUS_PROMPT, {"order_info": order_text}
     
-    def _handle_policy_query(self, query: str) -> Dict[str, Any]:
-        """Processa consultas sobre políticas"""
-        policy_info = self.rag_system.search_policies(query)
+    def _order_list_text(self, query: str) -> str:
+        """Pedidos por status ou produto (consulta sem ID), resumidos: o total e os ORDER_LIST_LIMIT primeiros"""
+        query_lower = query.lower()
+        status = next((status for status, terms in ORDER_STATUS_QUERIES
+                       if any(term in query_lower for term in terms)), None)
+        if status is not None:
+            orders = self.rag_system.search_orders_by_status(status, limit=ORDER_LIST_LIMIT)
+            if not orders:
+                return f"Nenhum pedido {status} encontrado."
+            total = self.rag_system.count_orders_by_status(status)
+            header = f"{total} pedidos com status {status}; os {len(orders)} primeiros:\n" if total > len(orders) else ""
+        elif "produto" in query_lower:
+            product_name_match = re.search(r"produto (.+)", query, re.IGNORECASE)
+            if not product_name_match:
+                return "ID do pedido não identificado e não foi possível buscar por status ou produto."
+            product_name = product_name_match.group(1)
+            # Um a mais só para saber se a lista foi cortada
+            orders = self.rag_system.search_orders_by_product(product_name, limit=ORDER_LIST_LIMIT + 1)
+            if not orders:
+                return f"Nenhum pedido encontrado com o produto {product_name}."
+            header = ""
+            if len(orders) > ORDER_LIST_LIMIT:
+                orders = orders[:ORDER_LIST_LIMIT]
+                header = f"Mais de {ORDER_LIST_LIMIT} pedidos com o produto {product_name}; os {ORDER_LIST_LIMIT} primeiros:\n"
+        else:
+            return "ID do pedido não identificado na consulta."
         
-        prompt = POLICY_PROMPT.format(
-            query=query,
-            policy_info=policy_info
+        return self.prompt_builder.fit("consulta_pedido", [
+            f"Pedido #{o['pedido_id']}: Status: {o['status']}" for o in orders
+        ], separator="\n", header=header)
+    
+    def _handle_policy_query(self, query: str, analysis: Dict[str, Any]) -> Tuple[Dict[str, Any], str, Dict[str, str]]:
+        """Processa consultas sobre políticas"""
+        # Trechos vizinhos se sobrepõem (CHUNK_OVERLAP): a parte repetida sai antes do orçamento
+        chunks = self.rag_system.search_policy_chunks(
+            query, query_vector=analysis.get("query_vector"), vector_hits=analysis.get("vector_hits"),
+            lexical_hits=analysis.get("lexical_hits")
+        )
+        policy_info = (
+            self.prompt_builder.fit_chunks("politicas", chunks)
+            or "Informações sobre políticas não disponíveis no momento."
         )
-        
-        response = self._generate_response(prompt)
         
         return {
             "intent": "politicas",
-            "response": response,
             "policy_info": policy_info
-        }
+        }, POLICY_PROMPT, {"policy_info": policy_info}
     
-    def _handle_recommendation(self, query: str) -> Dict[str, Any]:
+    def _handle_recommendation(self, query: str, analysis: Dict[str, Any]) -> Tuple[Dict[str, Any], str, Dict[str, str]]:
         """Processa pedidos de recomendação"""
-        recommendations = self.rag_system.get_recommendations(query)
+        recommendations = self.rag_system.get_recommendations(
+            query, query_vector=analysis.get("query_vector"), vector_hits=analysis.get("vector_hits"),
+            lexical_hits=analysis.get("lexical_hits")
+        )
         
         if recommendations:
-            rec_text = "\n\n".join([
-                f"**{p["nome"]}**\n"
-                f"Categoria: {p["categoria"]}\n"
-                f"Preço: R$ {p["preco"]:.2f}\n"
-                f"Descrição: {p["descricao"]}"
+            rec_text = self.prompt_builder.fit("recomendacao", [
+                f"**{p['nome']}**\n"
+                f"Categoria: {p['categoria']}\n"
+                f"Preço: R$ {p['preco']:.2f}\n"
+                f"Descrição: {p['descricao']}"
                 for p in recommendations
             ])
         else:
             rec_text = "Não foi possível encontrar recomendações adequadas."
         
-        prompt = RECOMMENDATION_PROMPT.format(
-            query=query,
-            recommendations=rec_text
-        )
-        
-        response = self._generate_response(prompt)
-        
         return {
             "intent": "recomendacao",
-            "response": response,
             "recommendations": recommendations
-        }
+        }, RECOMMENDATION_PROMPT, {"recommendations": rec_text}
     
-    def _handle_general_conversation(self, query: str) -> Dict[str, Any]:
-        """Processa conversas gerais"""
-        # Contexto das últimas interações
-        recent_context = "\n".join([
-            f"Usuário: {h["query"]}" 
-            for h in self.conversation_history[-3:]
-        ])
-        
-        prompt = GENERAL_CONVERSATION_PROMPT.format(
-            query=query,
-            context=recent_context
-        )
-        
-        response = self._generate_response(prompt)
+    def _handle_general_conversation(self, query: str, user_id: str = "default",
+                                     history: List[Dict] = None) -> Tuple[Dict[str, Any], str, Dict[str, str]]:
+        """Processa conversas gerais (`history`: últimas interações já lidas, como nos lotes)"""
+        # Contexto das últimas interações do próprio usuário
+        if history is None:
+            history = self.conversations.recent(user_id, 3)
+        recent_context = self.prompt_builder.fit("conversa_geral", [
+            f"Usuário: {h['query']}"
+            for h in history
+        ], separator="\n")
         
         return {
             "intent": "conversa_geral",
-            "response": response,
             "context": recent_context
+        }, GENERAL_CONVERSATION_PROMPT, {"context": recent_context}
+    
+    def _completion_params(self, prompt: str) -> Dict[str, Any]:
+        """Parâmetros da chamada de chat completion"""
+        return {
+            "model": MODEL_NAME,
+            "messages": [
+                {"role": "system", "content": SYSTEM_PROMPT.format(context="")},
+                {"role": "user", "content": prompt}
+            ],
+            "temperature": TEMPERATURE,
+            "max_tokens": MAX_TOKENS
         }
     
-    def _generate_response(self, prompt: str) -> str:
-        """Gera resposta usando OpenAI"""
-        try:
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": SYSTEM_PROMPT.format(context="")},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.7,
-                max_tokens=500
+    def _cached_response(self, cache_key: str = None) -> str:
+        """Resposta já gerada para a chave (ou None), contabilizando acertos e faltas"""
+        if cache_key is None:
+            return None
+        cached = self.response_cache.get(cache_key)
+        RESPONSE_CACHE.inc(result="hit" if cached is not None else "miss")
+        return cached
+    
+    def _record_usage(self, response):
+        """Contabiliza os tokens informados pela OpenAI na resposta"""
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            LLM_TOKENS.inc(usage.prompt_tokens or 0, type="prompt")
+            LLM_TOKENS.inc(usage.completion_tokens or 0, type="completion")
+    
+    def template_response(self, result: Dict[str, Any] = None) -> str:
+        """Resposta determinística montada só com os dados recuperados (sem o LLM)"""
+        result = result or {}
+        intent = result.get("intent")
+        
+        if intent in ("busca_produto", "recomendacao"):
+            products = result.get("products" if intent == "busca_produto" else "recommendations") or []
+            if not products:
+                return TEMPLATE_NO_PRODUCTS
+            lines = "\n".join(
+                TEMPLATE_PRODUCT_LINE.format(
+                    **p, indisponivel="" if p.get("disponivel", True) else " (indisponível)"
+                )
+                for p in products
             )
-            
-            return response.choices[0].message.content.strip()
+            template = TEMPLATE_PRODUCTS if intent == "busca_produto" else TEMPLATE_RECOMMENDATIONS
+            return template.format(products=lines)
+        
+        if intent == "busca_produto_exata":
+            product = result.get("product")
+            if not product:
+                return TEMPLATE_PRODUCT_NOT_FOUND
+            specifications = product.get("especificacoes") or {}
+            return TEMPLATE_PRODUCT.format(**{
+                **product,
+                "especificacoes": TEMPLATE_SPECIFICATIONS.format(
+                    items="\n".join(f"- {name.replace('_', ' ')}: {value}" for name, value in specifications.items())
+                ) if specifications else "",
+                "disponivel": "Sim" if product.get("disponivel", True) else "Não"
+            })
+        
+        if intent == "consulta_pedido":
+            order = result.get("order")
+            if order:
+                text = TEMPLATE_ORDER.format(**{
+                    **ORDER_FIELD_DEFAULTS,
+                    **order,
+                    "status_message": ORDER_STATUS_MESSAGES.get(order.get('status', '').lower(), ""),
+                    "produtos": ", ".join(
+                        f"{p['nome']} ({p.get('quantidade', 1)}x)" for p in order.get('produtos', [])
+                    )
+                })
+                if order.get("codigo_rastreamento"):
+                    text += TEMPLATE_ORDER_TRACKING.format(codigo_rastreamento=order["codigo_rastreamento"])
+                return text
+            if result.get("order_id"):
+                return TEMPLATE_ORDER_NOT_FOUND.format(order_id=result["order_id"])
+            return TEMPLATE_ORDER_WITHOUT_ID
+        
+        if intent == "politicas":
+            return TEMPLATE_POLICIES.format(policy_info=result.get("policy_info", ""))
+        
+        return TEMPLATE_GENERAL
+    
+    def _fallback_response(self, error: Exception, result: Dict[str, Any] = None) -> str:
+        """Resposta por template quando o LLM falha, estoura o prazo ou o circuito está aberto"""
+        if isinstance(error, CircuitOpenError):
+            reason = "circuito_aberto"
+        elif isinstance(error, (TimeoutError, APITimeoutError)):
+            reason = "prazo"
+        else:
+            reason = "erro"
+        TEMPLATE_RESPONSES.inc(reason=reason)
+        logger.warning("LLM indisponível (%s: %s); resposta por template", type(error).__name__, error)
+        return self.template_response(result)
+    
+    def response_mode(self, result: Dict[str, Any]) -> str:
+        """Modo de resposta da consulta: o configurado para a intenção, se os dados bastarem.
+        
+        Pedido e produto exato só dispensam o LLM quando o registro foi
+        encontrado (o produto, pelo código); senão a resposta é do LLM, que
+        explica como seguir.
+        """
+        mode = self.response_modes.get(result["intent"], "llm")
+        if mode == "llm":
+            return mode
+        if result["intent"] == "consulta_pedido" and not result.get("order"):
+            return "llm"
+        if result["intent"] == "busca_produto_exata" and not (result.get("product") and result.get("product_id")):
+            return "llm"
+        return mode
+    
+    def _template_first(self, result: Dict[str, Any], mode: str, prompt: str, cache_key: str,
+                        background: Callable[[str, str], Any]) -> str:
+        """Resposta dos modos template.
+        
+        Em `template_then_llm_async`, uma resposta do LLM já gerada para o
+        mesmo contexto tem preferência; sem ela, `background` gera uma para o
+        cache e as próximas consultas iguais já a recebem.
+        """
+        if mode == "template_then_llm_async":
+            cached = self._cached_response(cache_key)
+            if cached is not None:
+                return cached
+            with self._refresh_lock:
+                start = cache_key not in self._refreshing
+                self._refreshing.add(cache_key)
+            if start:
+                background(prompt, cache_key)
+        return self.template_response(result)
+    
+    def _respond(self, result: Dict[str, Any], prompt: str, cache_key: str) -> str:
+        """Resposta conforme o modo da intenção (LLM, template ou template com LLM em segundo plano)"""
+        mode = result["response_mode"] = self.response_mode(result)
+        if mode == "llm":
+            return self._generate_response(prompt, cache_key, result)
+        return self._template_first(
+            result, mode, prompt, cache_key,
+            lambda prompt, cache_key: self._executor.submit(self._refresh_response, prompt, cache_key)
+        )
+    
+    async def _arespond(self, result: Dict[str, Any], prompt: str, cache_key: str) -> str:
+        """Versão assíncrona de `_respond`"""
+        mode = result["response_mode"] = self.response_mode(result)
+        if mode == "llm":
+            return await self._agenerate_response(prompt, cache_key, result)
+        return self._template_first(result, mode, prompt, cache_key, self._schedule_refresh)
+    
+    def _schedule_refresh(self, prompt: str, cache_key: str):
+        task = asyncio.get_running_loop().create_task(self._arefresh_response(prompt, cache_key))
+        # Referência até o fim: o event loop só guarda referências fracas às tarefas
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+    
+    def _refresh_response(self, prompt: str, cache_key: str):
+        """Gera em segundo plano a resposta do LLM para o cache (modo template_then_llm_async)"""
+        try:
+            self.response_cache.put(cache_key, self._complete(prompt))
+        except Exception as e:
+            logger.warning("Resposta em segundo plano não gerada (%s: %s)", type(e).__name__, e)
+        finally:
+            with self._refresh_lock:
+                self._refreshing.discard(cache_key)
+    
+    async def _arefresh_response(self, prompt: str, cache_key: str):
+        """Versão assíncrona de `_refresh_response`"""
+        try:
+            self.response_cache.put(cache_key, await self._acomplete(prompt))
+        except Exception as e:
+            logger.warning("Resposta em segundo plano não gerada (%s: %s)", type(e).__name__, e)
+        finally:
+            with self._refresh_lock:
+                self._refreshing.discard(cache_key)
+    
+    def _complete(self, prompt: str) -> str:
+        """Chamada ao LLM com prazo, novas tentativas e circuit breaker; erros sobem"""
+        params = self._completion_params(prompt)
+        with span("llm"):
+            response = self.llm.call(lambda timeout: self.client.chat.completions.create(**params, timeout=timeout))
+        self._record_usage(response)
+        return response.choices[0].message.content.strip()
+    
+    async def _acomplete(self, prompt: str) -> str:
+        """Versão assíncrona de `_complete`, com o limite de concorrência e o hedge"""
+        params = self._completion_params(prompt)
+        async with self._llm_semaphore:
+            with span("llm"):
+                response = await self.llm.acall(
+                    lambda timeout: self.async_client.chat.completions.create(**params, timeout=timeout)
+                )
+        self._record_usage(response)
+        return response.choices[0].message.content.strip()
+    
+    def _generate_response(self, prompt: str, cache_key: str = None, result: Dict[str, Any] = None) -> str:
+        """Gera resposta usando OpenAI (ou devolve a já gerada para o mesmo contexto).
+        
+        Se o LLM falhar, a resposta é montada por template a partir de `result`.
+        """
+        cached = self._cached_response(cache_key)
+        if cached is not None:
+            return cached
         
-        except openai.AuthenticationError:
-            return "Desculpe, não foi possível conectar com o serviço de inteligência artificial. A chave da API OpenAI pode estar inválida ou ausente. Por favor, verifique a configuração."
+        try:
+            text = self._complete(prompt)
+        
+        except AuthenticationError:
+            return AUTH_ERROR_MESSAGE
+        except Exception as e:
+            return self._fallback_response(e, result)
+        
+        if cache_key is not None:
+            self.response_cache.put(cache_key, text)
+        return text
+    
+    async def _agenerate_response(self, prompt: str, cache_key: str = None, result: Dict[str, Any] = None) -> str:
+        """Gera resposta usando o cliente assíncrono da OpenAI (com hedge, se configurado)"""
+        cached = self._cached_response(cache_key)
+        if cached is not None:
+            return cached
+        
+        try:
+            text = await self._acomplete(prompt)
+        
+        except AuthenticationError:
+            return AUTH_ERROR_MESSAGE
         except Exception as e:
-            return f"Desculpe, ocorreu um erro ao processar sua solicitação: {str(e)}"
+            return self._fallback_response(e, result)
+        
+        if cache_key is not None:
+            self.response_cache.put(cache_key, text)
+        return text
+    
+    async def astream_response(self, prompt: str, cache_key: str = None,
+                               result: Dict[str, Any] = None) -> AsyncIterator[str]:
+        """Gera a resposta em pedaços, à medida que o modelo produz os tokens.
+        
+        Fechar o gerador (ex.: cliente desconectado) encerra a chamada à OpenAI.
+        Só respostas recebidas por completo entram no cache. Falhas antes do
+        primeiro pedaço viram a resposta por template; depois dele, o stream
+        só é encerrado. Com `result` de uma intenção em modo template, a
+        resposta inteira sai num pedaço só, sem chamar o LLM.
+        """
+        if result is not None:
+            mode = result["response_mode"] = self.response_mode(result)
+            if mode != "llm":
+                yield self._template_first(result, mode, prompt, cache_key, self._schedule_refresh)
+                return
+        
+        cached = self._cached_response(cache_key)
+        if cached is not None:
+            yield cached
+            return
+        
+        params = self._completion_params(prompt)
+        parts = []
+        stream = None
+        try:
+            async with self._llm_semaphore:
+                start = time.perf_counter()
+                # Só a abertura do stream é repetida (sem hedge: duplicaria a geração)
+                stream = await self.llm.acall(
+                    lambda timeout: self.async_client.chat.completions.create(**params, stream=True, timeout=timeout),
+                    hedge=False
+                )
+                try:
+                    async for chunk in stream:
+                        if chunk.choices and chunk.choices[0].delta.content:
+                            if not parts:
+                                # Só o tempo até o primeiro pedaço: o resto depende do ritmo de leitura do cliente
+                                STAGE_SECONDS.observe(time.perf_counter() - start, stage="llm_primeiro_token")
+                            parts.append(chunk.choices[0].delta.content)
+                            yield chunk.choices[0].delta.content
+                finally:
+                    await stream.close()
+        
+        except AuthenticationError:
+            ERRORS.inc(stage="llm")
+            yield AUTH_ERROR_MESSAGE
+            return
+        except Exception as e:
+            ERRORS.inc(stage="llm")
+            if stream is not None:
+                # Aberto com sucesso, interrompido na leitura: também conta como falha do provedor
+                self.llm.breaker.record_failure()
+            if parts:
+                logger.warning("Stream do LLM interrompido (%s: %s)", type(e).__name__, e)
+            else:
+                yield self._fallback_response(e, result)
+            return
+        
+        if cache_key is not None:
+            self.response_cache.put(cache_key, "".join(parts).strip())
     
     def get_conversation_history(self, user_id: str = "default") -> List[Dict]:
         """Retorna histórico de conversas do usuário"""
-        return [h for h in self.conversation_history if h.get("user_id") == user_id]
+        return self.conversations.history(user_id)
     
     def clear_conversation_history(self, user_id: str = "default"):
         """Limpa histórico de conversas do usuário"""
-        self.conversation_history = [
-            h for h in self.conversation_history 
-            if h.get("user_id") != user_id
-        ]
+        self.conversations.clear(user_id)
 
 
 
@@ -0,0 +1,54 @@
+"""
+Constrói uma vez os índices vetoriais, os índices BM25 e o catálogo compacto
+que os workers da API abrem somente leitura (VECTOR_DB_READ_ONLY=true)
+Desenvolvido por Pedro Favoretti - Drope Dev
+
+Uso (a partir da raiz do projeto):
+    python src/build_index.py [--data-dir ./data]
+    VECTOR_DB_READ_ONLY=true API_WORKERS=4 python src/api.py
+"""
+
+import os
+import time
+import argparse
+from rag_system import RAGSystem
+from config import VECTOR_DB_PATH
+
+
+def directory_size_mb(path: str) -> float:
+    """Soma do tamanho dos arquivos de um diretório"""
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return total / 1024 / 1024
+
+
+def build(openai_api_key: str, data_dir: str, vector_db_path: str = VECTOR_DB_PATH) -> RAGSystem:
+    """Carrega os dados, reaproveita ou reconstrói os índices e grava o catálogo compacto"""
+    rag_system = RAGSystem(openai_api_key, vector_db_path=vector_db_path, read_only=False)
+    rag_system.load_data(data_dir)
+    rag_system.create_vector_stores()
+    # Alterações feitas pela API entram no arquivo do catálogo antes do snapshot
+    rag_system.compact_products()
+    rag_system.save_snapshot(data_dir)
+    return rag_system
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Constrói os índices para os workers somente leitura")
+    parser.add_argument("--data-dir", default="./data")
+    parser.add_argument("--vector-db-path", default=VECTOR_DB_PATH)
+    args = parser.parse_args()
+
+    openai_api_key = os.getenv("OPENAI_API_KEY")
+    if not openai_api_key or openai_api_key == "your_openai_api_key_here":
+        raise ValueError("OPENAI_API_KEY não configurada. Configure no arquivo .env")
+
+    start = time.perf_counter()
+    rag_system = build(openai_api_key, args.data_dir, args.vector_db_path)
+    print(f"{len(rag_system.products_data)} produtos, {len(rag_system.orders_data)} pedidos indexados "
+          f"em {time.perf_counter() - start:.1f} s")
+    for name in sorted(os.listdir(args.vector_db_path)):
+        path = os.path.join(args.vector_db_path, name)
+        if os.path.isdir(path):
+            print(f"  {name}: {directory_size_mb(path):.1f} MB")
@@ -0,0 +1,348 @@
+"""
+Catálogo de produtos em colunas numpy
+Desenvolvido por Pedro Favoretti - Drope Dev
+"""
+
+import os
+import json
+import mmap
+from collections.abc import Sequence
+from typing import List, Dict, Iterable, Iterator
+
+import numpy as np
+
+
+# Colunas gravadas no arquivo do catálogo (os registros vão em records.bin + offsets.npy)
+COLUMNS = ("ids", "names", "prices", "categories", "available")
+
+
+class MappedRecords(Sequence):
+    """Registros serializados lidos de um arquivo mapeado em memória.
+
+    Os bytes ficam no page cache do sistema operacional, compartilhados entre
+    processos que abrem o mesmo arquivo; só o registro acessado é copiado.
+    """
+
+    def __init__(self, path: str, offsets: np.ndarray):
+        self._offsets = offsets
+        with open(path, 'rb') as f:
+            self._buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.path.getsize(path) else b""
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, row: int) -> bytes:
+        return self._buffer[self._offsets[row]:self._offsets[row + 1]]
+
+
+class ProductCatalog(Sequence):
+    """Catálogo de produtos organizado em colunas.
+
+    Preço, categoria, disponibilidade, id e nome ficam em arrays para que
+    filtros, ordenações e faixas de preço sejam vetorizados. O registro
+    completo é guardado como JSON compacto e só vira dicionário quando
+    acessado (por exemplo, para os `k` produtos finais de uma busca).
+
+    Uma remoção só marca a linha como lápide, sem deslocar as seguintes; as
+    linhas são renumeradas em `compact`, chamado por quem mantém mapas para
+    elas. `len` e a iteração consideram só os produtos ativos, enquanto as
+    colunas e os índices de linha incluem as lápides (excluídas por `filter_mask`).
+    """
+
+    def __init__(self, products: Iterable[Dict] = (), capacity: int = 1024):
+        self._size = 0
+        self._ids = np.empty(capacity, dtype=object)
+        self._names = np.empty(capacity, dtype=object)
+        self._prices = np.empty(capacity, dtype=np.float64)
+        self._categories = np.empty(capacity, dtype=np.int32)
+        self._available = np.empty(capacity, dtype=bool)
+        self._live = np.empty(capacity, dtype=bool)
+        self._records = []
+        self._rows = {}
+        # Linhas com o id repetido (só a primeira ocorrência fica em _rows), em ordem
+        self._duplicate_rows = {}
+        self._removed = 0
+        self.category_names = []
+        self._category_codes = {}
+        # Linhas em ordem de id e os ids ordenados, para paginação (recalculados sob demanda)
+        self._id_order = None
+        self.extend(products)
+
+    # Colunas (views somente dos registros válidos)
+    @property
+    def ids(self) -> np.ndarray:
+        return self._ids[:self._size]
+
+    @property
+    def names(self) -> np.ndarray:
+        return self._names[:self._size]
+
+    @property
+    def prices(self) -> np.ndarray:
+        return self._prices[:self._size]
+
+    @property
+    def categories(self) -> np.ndarray:
+        return self._categories[:self._size]
+
+    @property
+    def available(self) -> np.ndarray:
+        return self._available[:self._size]
+
+    @property
+    def live(self) -> np.ndarray:
+        """Linhas ativas (False nas lápides)"""
+        return self._live[:self._size]
+
+    @property
+    def removed(self) -> int:
+        """Lápides ainda não compactadas"""
+        return self._removed
+
+    def __len__(self) -> int:
+        return self._size - self._removed
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [self.get(i) for i in range(*row.indices(self._size)) if self._live[i]]
+        if row < 0:
+            row += self._size
+        if not 0 <= row < self._size:
+            raise IndexError("índice fora do catálogo")
+        return self.get(row)
+
+    def __iter__(self):
+        for row in self._live_rows():
+            yield self.get(row)
+
+    def _live_rows(self) -> Iterable[int]:
+        return range(self._size) if not self._removed else np.flatnonzero(self.live).tolist()
+
+    def get(self, row: int) -> Dict:
+        """Materializa o registro completo de uma linha"""
+        return json.loads(self._records[row])
+
+    def records(self, rows: Iterable[int]) -> List[Dict]:
+        """Materializa os registros de várias linhas, na ordem dada"""
+        return [json.loads(self._records[int(row)]) for row in rows]
+
+    def row_of(self, product_id: str) -> int:
+        """Linha de um produto pelo id (None se não existir)"""
+        return self._rows.get(product_id)
+
+    def category_code(self, category: str) -> int:
+        """Código da categoria sem diferenciar maiúsculas (None se desconhecida)"""
+        return self._category_codes.get(category.lower())
+
+    def _encode_category(self, category: str) -> int:
+        key = category.lower()
+        code = self._category_codes.get(key)
+        if code is None:
+            code = self._category_codes[key] = len(self.category_names)
+            self.category_names.append(category)
+        return code
+
+    def _ensure_capacity(self, size: int):
+        capacity = len(self._prices)
+        if size <= capacity:
+            return
+        capacity = max(size, capacity * 2)
+        for attr in ("_ids", "_names", "_prices", "_categories", "_available", "_live"):
+            old = getattr(self, attr)
+            new = np.empty(capacity, dtype=old.dtype)
+            new[:self._size] = old[:self._size]
+            setattr(self, attr, new)
+
+    def _make_writable(self):
+        """Copia para a memória do processo um catálogo aberto de arquivo, antes de alterá-lo"""
+        if isinstance(self._records, list):
+            return
+        self._records = list(self._records)
+        self._ids = self._ids.astype(object)
+        self._names = self._names.astype(object)
+        for attr in ("_prices", "_categories", "_available", "_live"):
+            setattr(self, attr, np.array(getattr(self, attr)))
+
+    def _write_row(self, row: int, product: Dict):
+        self._make_writable()
+        if row == self._size or product['id'] != self._ids[row]:
+            self._id_order = None
+        self._ids[row] = product['id']
+        self._names[row] = product.get('nome', '')
+        self._prices[row] = product['preco']
+        self._categories[row] = self._encode_category(product['categoria'])
+        self._available[row] = product.get('disponivel', True)
+        self._live[row] = True
+        record = json.dumps(product, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        if row == len(self._records):
+            self._records.append(record)
+        else:
+            self._records[row] = record
+
+    def append(self, product: Dict) -> int:
+        """Adiciona um produto ao final do catálogo e retorna sua linha"""
+        row = self._size
+        self._ensure_capacity(row + 1)
+        self._write_row(row, product)
+        if self._rows.setdefault(product['id'], row) != row:
+            self._duplicate_rows.setdefault(product['id'], []).append(row)
+        self._size += 1
+        return row
+
+    def extend(self, products: Iterable[Dict]):
+        """Adiciona vários produtos"""
+        for product in products:
+            self.append(product)
+
+    def update(self, row: int, product: Dict):
+        """Substitui o registro de uma linha mantendo sua posição"""
+        old_id = self._ids[row]
+        self._write_row(row, product)
+        if product['id'] != old_id:
+            del self._rows[old_id]
+            self._rows[product['id']] = row
+
+    def delete(self, row: int):
+        """Remove a linha do id (a de `row_of`), deixando uma lápide no lugar"""
+        self._make_writable()
+        product_id = self._ids[row]
+        self._live[row] = False
+        self._removed += 1
+        self._records[row] = b""
+        del self._rows[product_id]
+        # Em ids duplicados prevalece a primeira ocorrência: a seguinte assume o id
+        duplicates = self._duplicate_rows.get(product_id)
+        if duplicates:
+            self._rows[product_id] = duplicates.pop(0)
+            if not duplicates:
+                del self._duplicate_rows[product_id]
+
+    def compact(self):
+        """Descarta as lápides, renumerando as linhas seguintes a cada uma"""
+        if not self._removed:
+            return
+        rows = np.flatnonzero(self.live)
+        for attr in ("_ids", "_names", "_prices", "_categories", "_available", "_live"):
+            column = getattr(self, attr)
+            column[:len(rows)] = column[rows]
+        self._records = [self._records[row] for row in rows.tolist()]
+        self._size = len(rows)
+        self._removed = 0
+        self._id_order = None
+        self._index_rows()
+
+    def _index_rows(self):
+        """Refaz o id -> linha (e as linhas de ids repetidos) a partir da coluna de ids"""
+        ids = self.ids.tolist()
+        # Em ids duplicados prevalece a primeira ocorrência
+        self._rows = dict(zip(ids[::-1], range(self._size - 1, -1, -1)))
+        self._duplicate_rows = {}
+        if len(self._rows) < self._size:
+            for row, product_id in enumerate(ids):
+                if self._rows[product_id] != row:
+                    self._duplicate_rows.setdefault(product_id, []).append(row)
+
+    def filter_mask(self, max_price: float = None, min_price: float = None,
+                    category: str = None, available_only: bool = True) -> np.ndarray:
+        """Máscara booleana (por linha) dos produtos que passam nos filtros (lápides nunca passam)"""
+        mask = self.available & self.live if available_only else self.live.copy()
+        if max_price is not None:
+            mask &= self.prices <= max_price
+        if min_price is not None:
+            mask &= self.prices >= min_price
+        if category:
+            code = self.category_code(category)
+            if code is None:
+                return np.zeros(self._size, dtype=bool)
+            mask &= self.categories == code
+        return mask
+
+    def sorted_rows(self, mask: np.ndarray, by: str = "preco", descending: bool = False,
+                    limit: int = None) -> np.ndarray:
+        """Linhas da máscara ordenadas por preço ou nome, opcionalmente só as `limit` primeiras"""
+        rows = np.flatnonzero(mask)
+        if by == "preco":
+            keys = self.prices[rows]
+            if descending:
+                keys = -keys
+            if limit is not None and limit < len(rows):
+                top = np.argpartition(keys, limit)[:limit]
+                rows, keys = rows[top], keys[top]
+            return rows[np.argsort(keys, kind="stable")]
+        rows = rows[np.argsort(self.names[rows], kind="stable")]
+        if descending:
+            rows = rows[::-1]
+        return rows[:limit] if limit is not None else rows
+
+    def page_rows(self, mask: np.ndarray, after: str = None, limit: int = 100) -> np.ndarray:
+        """Linhas da máscara em ordem de id, começando no primeiro id maior que `after`.
+
+        Paginação por chave: inserções e remoções entre uma página e outra não
+        fazem a próxima página repetir nem pular produtos.
+        """
+        if self._id_order is None:
+            order = np.argsort(self.ids, kind="stable")
+            self._id_order = (order, self.ids[order])
+        order, sorted_ids = self._id_order
+        start = int(np.searchsorted(sorted_ids, after, side="right")) if after is not None else 0
+        rows = order[start:]
+        return rows[mask[rows]][:limit]
+
+    def raw_records(self) -> Iterator[bytes]:
+        """Registros serializados (JSON compacto) dos produtos ativos, sem decodificar.
+
+        Na lista em memória a iteração percorre uma cópia das referências, para
+        que alterações posteriores não mudem o que ainda não foi lido; o
+        catálogo mapeado de arquivo não muda e é lido sob demanda.
+        """
+        if isinstance(self._records, list):
+            if not self._removed:
+                return iter(self._records.copy())
+            return iter([self._records[row] for row in self._live_rows()])
+        return iter(self._records)
+
+    def save(self, directory: str):
+        """Grava o catálogo em formato compacto (colunas .npy e registros concatenados), sem as lápides"""
+        os.makedirs(directory, exist_ok=True)
+        rows = np.flatnonzero(self.live)
+        for column in COLUMNS:
+            values = getattr(self, column)[rows]
+            # Texto em largura fixa para poder ser mapeado (arrays de objetos não podem)
+            np.save(os.path.join(directory, f"{column}.npy"),
+                    values.astype(str) if values.dtype == object else values)
+        offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+        with open(os.path.join(directory, "records.bin"), 'wb') as f:
+            for i, row in enumerate(rows.tolist()):
+                record = self._records[row]
+                f.write(record)
+                offsets[i + 1] = offsets[i] + len(record)
+        np.save(os.path.join(directory, "offsets.npy"), offsets)
+        with open(os.path.join(directory, "categories.json"), 'w', encoding='utf-8') as f:
+            json.dump(self.category_names, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, directory: str) -> "ProductCatalog":
+        """Abre um catálogo gravado por `save`, com colunas e registros mapeados em memória.
+
+        Processos que abrem o mesmo diretório compartilham as páginas; a
+        primeira alteração copia o catálogo para a memória do processo.
+        """
+        catalog = cls(capacity=0)
+        columns = {column: np.load(os.path.join(directory, f"{column}.npy"), mmap_mode='r') for column in COLUMNS}
+        catalog._ids, catalog._names = columns["ids"], columns["names"]
+        catalog._prices, catalog._categories = columns["prices"], columns["categories"]
+        catalog._available = columns["available"]
+        catalog._size = len(catalog._ids)
+        catalog._live = np.ones(catalog._size, dtype=bool)
+        catalog._records = MappedRecords(
+            os.path.join(directory, "records.bin"), np.load(os.path.join(directory, "offsets.npy"))
+        )
+        with open(os.path.join(directory, "categories.json"), 'r', encoding='utf-8') as f:
+            catalog.category_names = json.load(f)
+        catalog._category_codes = {name.lower(): code for code, name in enumerate(catalog.category_names)}
+        catalog._index_rows()
+        return catalog
+
+    def to_list(self) -> List[Dict]:
+        """Materializa o catálogo inteiro (usar apenas para exportação)"""
+        return list(self)
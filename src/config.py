@@ -0,0 +1,122 @@
+"""
+Configurações do assistente lidas do arquivo .env
+Desenvolvido por Pedro Favoretti - Drope Dev
+"""
+
+import os
+from dotenv import load_dotenv
+
+# Carregar variáveis de ambiente antes de ler as configurações
+load_dotenv()
+
+
+def parse_mapping(value: str, cast=str) -> dict:
+    """Lê pares "chave=valor" separados por vírgula (ex.: "consulta_pedido=template,politicas=llm")"""
+    pairs = (map(str.strip, item.split("=", 1)) for item in value.split(",") if item.strip())
+    return {key: cast(item) for key, item in pairs}
+
+
+# Banco de dados vetorial
+VECTOR_DB_PATH = os.getenv("VECTOR_DB_PATH", "./data/vector_db")
+
+# Tipo de índice FAISS: flat (exato), ivf_flat, hnsw ou ivf_pq ("faiss" equivale a flat).
+# Coleções com menos de VECTOR_DB_MIN_VECTORS vetores usam sempre flat.
+VECTOR_DB_TYPE = os.getenv("VECTOR_DB_TYPE", "flat")
+VECTOR_DB_MIN_VECTORS = int(os.getenv("VECTOR_DB_MIN_VECTORS", 10000))
+VECTOR_DB_NLIST = int(os.getenv("VECTOR_DB_NLIST", 0))  # 0 = automático (~4·√n)
+VECTOR_DB_NPROBE = int(os.getenv("VECTOR_DB_NPROBE", 16))
+VECTOR_DB_HNSW_M = int(os.getenv("VECTOR_DB_HNSW_M", 32))
+VECTOR_DB_EF_CONSTRUCTION = int(os.getenv("VECTOR_DB_EF_CONSTRUCTION", 200))
+VECTOR_DB_EF_SEARCH = int(os.getenv("VECTOR_DB_EF_SEARCH", 64))
+VECTOR_DB_PQ_M = int(os.getenv("VECTOR_DB_PQ_M", 16))
+
+# Modo de serviço com vários workers: os índices e o catálogo compacto gerados uma vez por
+# `python src/build_index.py` são abertos mapeados em memória (compartilhados entre os
+# processos) e nada é reconstruído nem alterado pela API
+VECTOR_DB_READ_ONLY = os.getenv("VECTOR_DB_READ_ONLY", "false").lower() in ("1", "true", "yes")
+
+# Alterações de produtos pela API vão para um log (`produtos.changes.jsonl`, ao lado do catálogo);
+# o catálogo e o índice de produtos são regravados inteiros a cada PRODUCT_CHANGELOG_MAX alterações
+PRODUCT_CHANGELOG_MAX = int(os.getenv("PRODUCT_CHANGELOG_MAX", 1000))
+
+# Cache de embeddings (LRU em memória na frente do SQLite em disco)
+EMBEDDING_CACHE_PATH = os.getenv(
+    "EMBEDDING_CACHE_PATH", os.path.join(VECTOR_DB_PATH, "embeddings_cache.sqlite")
+)
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", 10000))
+EMBEDDING_CACHE_TTL = float(os.getenv("EMBEDDING_CACHE_TTL", 86400))
+# Limites do nível em disco: entradas (0 = sem limite; as mais antigas saem primeiro) e validade em segundos
+EMBEDDING_CACHE_DISK_SIZE = int(os.getenv("EMBEDDING_CACHE_DISK_SIZE", 200000))
+EMBEDDING_CACHE_DISK_TTL = float(os.getenv("EMBEDDING_CACHE_DISK_TTL", 30 * 86400))
+
+# Consultas concorrentes: embeddings agrupados por janela de tempo (0 desativa)
+EMBEDDING_BATCH_WINDOW_MS = float(os.getenv("EMBEDDING_BATCH_WINDOW_MS", 5))
+EMBEDDING_QUERY_BATCH_SIZE = int(os.getenv("EMBEDDING_QUERY_BATCH_SIZE", 64))
+
+# Construção dos índices: lotes de embeddings em paralelo
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", 256))
+EMBEDDING_MAX_WORKERS = int(os.getenv("EMBEDDING_MAX_WORKERS", 4))
+EMBEDDING_MAX_RETRIES = int(os.getenv("EMBEDDING_MAX_RETRIES", 5))
+EMBEDDING_TOKENS_PER_MINUTE = int(os.getenv("EMBEDDING_TOKENS_PER_MINUTE", 0))
+
+# Regras de intenção e entidades (arquivo JSON opcional; sem ele valem as regras padrão)
+INTENT_RULES_PATH = os.getenv("INTENT_RULES_PATH") or None
+
+# Busca híbrida: BM25 ao lado dos índices vetoriais; acima do limiar de confiança
+# a consulta é respondida só pela busca lexical, sem embedding
+LEXICAL_SEARCH = os.getenv("LEXICAL_SEARCH", "true").lower() in ("1", "true", "yes")
+LEXICAL_CONFIDENCE_THRESHOLD = float(os.getenv("LEXICAL_CONFIDENCE_THRESHOLD", 0.35))
+
+# Atendimento assíncrono: threads para a busca e limite de chamadas simultâneas ao LLM
+RETRIEVAL_WORKERS = int(os.getenv("RETRIEVAL_WORKERS", 8))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 16))
+
+# RAG: trechos das políticas, resultados recuperados por busca e parâmetros do modelo de chat
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", 1000))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", 200))
+TOP_K_RESULTS = int(os.getenv("TOP_K_RESULTS", 5))
+MODEL_NAME = os.getenv("MODEL_NAME", "gpt-3.5-turbo")
+TEMPERATURE = float(os.getenv("TEMPERATURE", 0.7))
+MAX_TOKENS = int(os.getenv("MAX_TOKENS", 500))
+
+# Orçamento de tokens do contexto recuperado (produtos, trechos, pedidos) por intenção,
+# "intencao=tokens" separados por vírgula; intenções ausentes usam PROMPT_TOKEN_BUDGET.
+# Listas de pedidos por status/produto entram resumidas: total e os ORDER_LIST_LIMIT primeiros
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", 400))
+PROMPT_TOKEN_BUDGETS = parse_mapping(os.getenv(
+    "PROMPT_TOKEN_BUDGETS",
+    "busca_produto=400,recomendacao=400,busca_produto_exata=300,politicas=450,consulta_pedido=250,conversa_geral=120"
+), int)
+ORDER_LIST_LIMIT = int(os.getenv("ORDER_LIST_LIMIT", 10))
+
+# Cliente da OpenAI (chat e embeddings): pool de conexões compartilhado, prazo total por
+# chamada (com as novas tentativas), duplicata da chamada após *_HEDGE_AFTER_MS sem
+# resposta (0 desativa) e circuit breaker; com o circuito aberto o chat responde por
+# template com os dados recuperados e a busca usa só o BM25
+LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", 64))
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", 3))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", 20))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 2))
+LLM_HEDGE_AFTER_MS = float(os.getenv("LLM_HEDGE_AFTER_MS", 0))
+EMBEDDING_TIMEOUT = float(os.getenv("EMBEDDING_TIMEOUT", 5))
+EMBEDDING_HEDGE_AFTER_MS = float(os.getenv("EMBEDDING_HEDGE_AFTER_MS", 0))
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", 5))
+LLM_BREAKER_RESET_SECONDS = float(os.getenv("LLM_BREAKER_RESET_SECONDS", 30))
+
+# Modo de resposta por intenção ("intencao=modo", separados por vírgula; as demais usam llm):
+# llm, template (resposta montada do pedido/produto encontrado, sem chamar o LLM) ou
+# template_then_llm_async (template na hora; a resposta do LLM é gerada em segundo plano
+# para o cache de respostas e servida nas próximas consultas iguais)
+RESPONSE_MODES = parse_mapping(os.getenv("RESPONSE_MODES", ""))
+
+# Cache de respostas do LLM (0 desativa)
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", 1000))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", 300))
+
+# Histórico de conversas por usuário ("memory" ou "sqlite")
+CONVERSATION_STORE = os.getenv("CONVERSATION_STORE", "memory")
+CONVERSATION_DB_PATH = os.getenv("CONVERSATION_DB_PATH", "./data/conversations.sqlite")
+CONVERSATION_MAX_TURNS = int(os.getenv("CONVERSATION_MAX_TURNS", 50))
+CONVERSATION_MAX_BYTES = int(os.getenv("CONVERSATION_MAX_BYTES", 65536))
+CONVERSATION_IDLE_TTL = float(os.getenv("CONVERSATION_IDLE_TTL", 3600))
+CONVERSATION_MAX_USERS = int(os.getenv("CONVERSATION_MAX_USERS", 10000))
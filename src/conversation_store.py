@@ -0,0 +1,211 @@
+"""
+Histórico de conversas por usuário, em memória ou em SQLite
+Desenvolvido por Pedro Favoretti - Drope Dev
+"""
+
+import os
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict, deque
+from itertools import islice
+from typing import List, Dict
+
+
+def _entry_size(entry: Dict) -> int:
+    """Tamanho da interação em bytes (JSON compacto)"""
+    return len(json.dumps(entry, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+
+
+class ConversationStore:
+    """Histórico em memória: um buffer circular por usuário.
+
+    Cada usuário guarda no máximo `max_turns` interações e `max_bytes` bytes
+    (as mais antigas saem primeiro). Usuários sem atividade há mais de
+    `idle_seconds` são descartados, assim como os menos recentes quando há
+    mais de `max_users`. Inserir e ler as últimas interações custa O(1) por
+    interação, independentemente do número de usuários.
+    """
+
+    def __init__(self, max_turns: int = 50, max_bytes: int = 65536, idle_seconds: float = 3600,
+                 max_users: int = 10000):
+        self.max_turns = max_turns
+        self.max_bytes = max_bytes
+        self.idle_seconds = idle_seconds
+        self.max_users = max_users
+        # user_id -> [deque de (interação, bytes), total de bytes, última atividade], do menos ao mais ativo
+        self._users = OrderedDict()
+        self._lock = threading.Lock()
+
+    def append(self, user_id: str, entry: Dict):
+        """Registra uma interação do usuário"""
+        now = time.monotonic()
+        size = _entry_size(entry)
+        with self._lock:
+            state = self._users.get(user_id)
+            if state is None:
+                state = self._users[user_id] = [deque(), 0, now]
+            self._users.move_to_end(user_id)
+            turns = state[0]
+            turns.append((entry, size))
+            state[1] += size
+            state[2] = now
+            while len(turns) > self.max_turns or (state[1] > self.max_bytes and len(turns) > 1):
+                state[1] -= turns.popleft()[1]
+            self._evict(now)
+
+    def _evict(self, now: float):
+        """Remove usuários ociosos ou em excesso (os menos ativos estão no início)"""
+        while self._users:
+            user_id, state = next(iter(self._users.items()))
+            if now - state[2] <= self.idle_seconds and len(self._users) <= self.max_users:
+                break
+            del self._users[user_id]
+
+    def _turns(self, user_id: str):
+        state = self._users.get(user_id)
+        if state is None or time.monotonic() - state[2] > self.idle_seconds:
+            return ()
+        return state[0]
+
+    def recent(self, user_id: str, n: int) -> List[Dict]:
+        """Últimas `n` interações do usuário, da mais antiga para a mais recente"""
+        with self._lock:
+            entries = [entry for entry, _ in islice(reversed(self._turns(user_id)), n)]
+        entries.reverse()
+        return entries
+
+    def history(self, user_id: str) -> List[Dict]:
+        """Todas as interações guardadas do usuário"""
+        with self._lock:
+            return [entry for entry, _ in self._turns(user_id)]
+
+    def clear(self, user_id: str):
+        """Apaga o histórico do usuário"""
+        with self._lock:
+            self._users.pop(user_id, None)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "users": len(self._users),
+                "turns": sum(len(state[0]) for state in self._users.values()),
+                "bytes": sum(state[1] for state in self._users.values())
+            }
+
+
+class SQLiteConversationStore:
+    """Histórico em SQLite, com os mesmos limites do ConversationStore.
+
+    Sobrevive a reinícios e pode ser compartilhado por vários workers
+    apontando para o mesmo arquivo (modo WAL).
+    """
+
+    # A limpeza de usuários ociosos roda a cada N inserções
+    EVICT_EVERY = 500
+
+    def __init__(self, db_path: str, max_turns: int = 50, max_bytes: int = 65536,
+                 idle_seconds: float = 3600, max_users: int = 10000):
+        self.max_turns = max_turns
+        self.max_bytes = max_bytes
+        self.idle_seconds = idle_seconds
+        self.max_users = max_users
+        self._appends = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._db = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS conversations ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, user_id TEXT NOT NULL, "
+            "created_at REAL NOT NULL, size INTEGER NOT NULL, entry TEXT NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS conversations_user ON conversations (user_id, id)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS conversations_created ON conversations (created_at)")
+        self._db.commit()
+
+    def append(self, user_id: str, entry: Dict):
+        """Registra uma interação do usuário"""
+        data = json.dumps(entry, ensure_ascii=False, separators=(',', ':'))
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO conversations (user_id, created_at, size, entry) VALUES (?, ?, ?, ?)",
+                (user_id, now, len(data.encode('utf-8')), data)
+            )
+            self._trim(user_id)
+            self._appends += 1
+            if self._appends % self.EVICT_EVERY == 0:
+                self._evict(now)
+            self._db.commit()
+
+    def _trim(self, user_id: str):
+        """Aplica os limites de interações e de bytes ao usuário"""
+        rows = self._db.execute(
+            "SELECT id, size FROM conversations WHERE user_id = ? ORDER BY id DESC LIMIT ?",
+            (user_id, self.max_turns + 1)
+        ).fetchall()
+        kept_bytes = 0
+        for i, (row_id, size) in enumerate(rows):
+            kept_bytes += size
+            if i == self.max_turns or (kept_bytes > self.max_bytes and i > 0):
+                self._db.execute("DELETE FROM conversations WHERE user_id = ? AND id <= ?", (user_id, row_id))
+                break
+
+    def _evict(self, now: float):
+        """Remove usuários ociosos e, se necessário, os menos ativos"""
+        self._db.execute(
+            "DELETE FROM conversations WHERE user_id IN ("
+            "SELECT user_id FROM conversations GROUP BY user_id HAVING MAX(created_at) < ?)",
+            (now - self.idle_seconds,)
+        )
+        self._db.execute(
+            "DELETE FROM conversations WHERE user_id IN ("
+            "SELECT user_id FROM conversations GROUP BY user_id ORDER BY MAX(created_at) DESC "
+            "LIMIT -1 OFFSET ?)",
+            (self.max_users,)
+        )
+
+    def _is_idle(self, user_id: str) -> bool:
+        row = self._db.execute(
+            "SELECT created_at FROM conversations WHERE user_id = ? ORDER BY id DESC LIMIT 1", (user_id,)
+        ).fetchone()
+        return row is None or time.time() - row[0] > self.idle_seconds
+
+    def recent(self, user_id: str, n: int) -> List[Dict]:
+        """Últimas `n` interações do usuário, da mais antiga para a mais recente"""
+        with self._lock:
+            if self._is_idle(user_id):
+                return []
+            rows = self._db.execute(
+                "SELECT entry FROM conversations WHERE user_id = ? ORDER BY id DESC LIMIT ?", (user_id, n)
+            ).fetchall()
+        return [json.loads(entry) for entry, in reversed(rows)]
+
+    def history(self, user_id: str) -> List[Dict]:
+        """Todas as interações guardadas do usuário"""
+        return self.recent(user_id, self.max_turns)
+
+    def clear(self, user_id: str):
+        """Apaga o histórico do usuário"""
+        with self._lock:
+            self._db.execute("DELETE FROM conversations WHERE user_id = ?", (user_id,))
+            self._db.commit()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            users, turns, size = self._db.execute(
+                "SELECT COUNT(DISTINCT user_id), COUNT(*), COALESCE(SUM(size), 0) FROM conversations"
+            ).fetchone()
+        return {"users": users, "turns": turns, "bytes": size}
+
+
+def create_conversation_store(backend: str, db_path: str = None, **limits):
+    """Cria o histórico conforme o backend configurado ("memory" ou "sqlite")"""
+    if backend == "sqlite":
+        return SQLiteConversationStore(db_path, **limits)
+    if backend == "memory":
+        return ConversationStore(**limits)
+    raise ValueError(f"Backend de histórico desconhecido: {backend}")
@@ -0,0 +1,77 @@
+"""
+Agrupamento de embeddings de consultas concorrentes
+Desenvolvido por Pedro Favoretti - Drope Dev
+"""
+
+import asyncio
+import logging
+from typing import List, Dict, Callable, Awaitable
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingBatcher:
+    """Junta consultas que chegam dentro de uma janela curta em uma única chamada.
+
+    Cada `embed` entra na fila do lote atual; o lote é enviado quando a janela
+    de `window_ms` termina ou quando atinge `max_batch_size` textos, e os
+    vetores são devolvidos a quem esperava. Textos repetidos no mesmo lote são
+    enviados uma vez só. Uma falha na chamada é repassada a todos do lote.
+    """
+
+    def __init__(self, embed_fn: Callable[[List[str]], Awaitable[List[List[float]]]],
+                 window_ms: float = 5, max_batch_size: int = 64):
+        self.embed_fn = embed_fn
+        self.window = window_ms / 1000
+        self.max_batch_size = max_batch_size
+        self._pending = []
+        self._timer = None
+        self._stats = {"requests": 0, "batches": 0, "texts": 0, "max_batch": 0}
+
+    async def embed(self, text: str) -> List[float]:
+        """Embedding de um texto, enviado junto com os demais do lote"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+        self._stats["requests"] += 1
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        """Fecha o lote atual e o envia em segundo plano"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            asyncio.get_running_loop().create_task(self._dispatch(batch))
+
+    async def _dispatch(self, batch):
+        texts = list(dict.fromkeys(text for text, _ in batch))
+        self._stats["batches"] += 1
+        self._stats["texts"] += len(texts)
+        self._stats["max_batch"] = max(self._stats["max_batch"], len(texts))
+
+        try:
+            vectors: Dict[str, List[float]] = dict(zip(texts, await self.embed_fn(texts)))
+        except Exception as e:
+            logger.warning("Falha no lote de %d embeddings: %s", len(texts), e)
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for text, future in batch:
+            # Quem desistiu (ex.: cliente desconectado) já teve o future cancelado
+            if not future.done():
+                future.set_result(vectors[text])
+
+    def stats(self) -> Dict[str, float]:
+        """Contadores do agrupamento (consultas, lotes, textos enviados e maior lote)"""
+        stats = dict(self._stats)
+        stats["avg_batch"] = round(stats["texts"] / stats["batches"], 2) if stats["batches"] else 0.0
+        return stats
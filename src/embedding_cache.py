@@ -0,0 +1,391 @@
+"""
+Cache de embeddings em dois níveis (LRU em memória + SQLite em disco)
+Desenvolvido por Pedro Favoretti - Drope Dev
+"""
+
+import os
+import re
+import time
+import atexit
+import asyncio
+import sqlite3
+import hashlib
+import logging
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import List, Dict, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from embedding_batcher import EmbeddingBatcher
+
+logger = logging.getLogger(__name__)
+
+# Intervalo mínimo (segundos) entre as limpezas do cache em disco (expirados e excesso de entradas)
+PRUNE_INTERVAL = 60
+
+
+def normalize_text(text: str) -> str:
+    """Normaliza o texto antes de gerar a chave do cache"""
+    text = unicodedata.normalize('NFC', text)
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+class EmbeddingCache:
+    """Cache de vetores chaveado por (modelo, hash do texto normalizado).
+
+    Memória e disco têm travas separadas: uma leitura ou gravação no SQLite
+    não segura os acertos do LRU das outras threads. As gravações em disco
+    ficam num buffer e são confirmadas em lote, numa thread à parte, a cada
+    `commit_every` vetores ou `commit_interval` segundos (`flush` força a
+    gravação). No disco cada vetor guarda quando foi gravado: os com mais de
+    `disk_ttl_seconds` deixam de ser lidos e, junto com os mais antigos além
+    de `max_disk_entries`, são apagados periodicamente.
+    """
+
+    def __init__(self, db_path: str = None, max_entries: int = 10000, ttl_seconds: float = 86400,
+                 max_disk_entries: int = 200000, disk_ttl_seconds: float = 30 * 86400,
+                 commit_every: int = 256, commit_interval: float = 1.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_disk_entries = max_disk_entries
+        self.disk_ttl_seconds = disk_ttl_seconds
+        self.commit_every = commit_every
+        self.commit_interval = commit_interval
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "disk_evictions": 0,
+            "disk_expirations": 0
+        }
+        # Vetores ainda não confirmados no disco (no buffer e no lote sendo gravado), sob _lock
+        self._pending = {}
+        self._flushing = {}
+        self._flush_timer = None
+
+        self._db = None
+        self._db_lock = threading.Lock()
+        self._last_prune = 0.0
+        if db_path:
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings "
+                "(key TEXT PRIMARY KEY, vector BLOB NOT NULL, stored_at REAL NOT NULL)"
+            )
+            columns = {row[1] for row in self._db.execute("PRAGMA table_info(embeddings)")}
+            if "stored_at" not in columns:
+                # Cache gravado antes da validade em disco: os vetores existentes contam a partir de agora
+                self._db.execute("ALTER TABLE embeddings ADD COLUMN stored_at REAL NOT NULL DEFAULT 0")
+                self._db.execute("UPDATE embeddings SET stored_at = ?", (time.time(),))
+            self._db.execute("CREATE INDEX IF NOT EXISTS embeddings_stored_at ON embeddings (stored_at)")
+            self._prune()
+            self._db.commit()
+            # O buffer não confirmado vai para o disco ao encerrar o processo
+            atexit.register(self.flush)
+
+    @property
+    def on_disk(self) -> bool:
+        """Se há o nível em disco (as leituras dele bloqueiam)"""
+        return self._db is not None
+
+    @staticmethod
+    def make_key(model: str, text: str) -> str:
+        """Gera a chave do cache para um texto já normalizado"""
+        return hashlib.sha256(f"{model}\x00{text}".encode('utf-8')).hexdigest()
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        """Busca vetores na memória e depois no disco; retorna apenas os encontrados"""
+        found = self.get_memory(keys)
+        missing = [key for key in keys if key not in found]
+        if missing:
+            found.update(self.get_disk(missing))
+        return found
+
+    def get_memory(self, keys: List[str]) -> Dict[str, List[float]]:
+        """Só o nível em memória (inclui o que ainda não foi confirmado no disco); não bloqueia"""
+        found = {}
+        now = time.monotonic()
+        with self._lock:
+            for key in keys:
+                entry = self._memory.get(key)
+                if entry is None:
+                    continue
+                vector, stored_at = entry
+                if now - stored_at > self.ttl_seconds:
+                    del self._memory[key]
+                    self._stats["expirations"] += 1
+                    continue
+                self._memory.move_to_end(key)
+                found[key] = vector
+            for key in keys:
+                entry = self._pending.get(key) or self._flushing.get(key)
+                if entry is not None and key not in found:
+                    found[key] = entry[0]
+            self._stats["memory_hits"] += len(found)
+        return found
+
+    def get_disk(self, keys: List[str]) -> Dict[str, List[float]]:
+        """Só o nível em disco, para as chaves ausentes da memória (conta as que faltarem nos dois)"""
+        found = {}
+        if self._db is not None:
+            cutoff = time.time() - self.disk_ttl_seconds
+            rows = []
+            with self._db_lock:
+                for start in range(0, len(keys), 500):
+                    batch = keys[start:start + 500]
+                    placeholders = ",".join("?" * len(batch))
+                    rows += self._db.execute(
+                        f"SELECT key, vector FROM embeddings WHERE stored_at >= ? AND key IN ({placeholders})",
+                        [cutoff, *batch]
+                    ).fetchall()
+            found = {key: np.frombuffer(blob, dtype=np.float32).tolist() for key, blob in rows}
+
+        now = time.monotonic()
+        with self._lock:
+            for key, vector in found.items():
+                self._remember(key, vector, now)
+            self._stats["disk_hits"] += len(found)
+            self._stats["misses"] += len(set(keys) - found.keys())
+        return found
+
+    def put_many(self, items: Dict[str, List[float]]):
+        """Grava vetores na memória e no buffer do disco, confirmado em lote (ver `flush`)"""
+        now = time.monotonic()
+        stored_at = time.time()
+        with self._lock:
+            for key, vector in items.items():
+                self._remember(key, vector, now)
+            if self._db is None:
+                return
+            for key, vector in items.items():
+                self._pending[key] = (vector, stored_at)
+            if len(self._pending) >= self.commit_every:
+                self._schedule_flush(0)
+            elif self._flush_timer is None:
+                self._schedule_flush(self.commit_interval)
+
+    def _schedule_flush(self, delay: float):
+        """Agenda a gravação do buffer numa thread à parte (chamado com _lock)"""
+        if self._flush_timer is not None:
+            if delay:
+                return
+            self._flush_timer.cancel()
+        self._flush_timer = threading.Timer(delay, self._flush_in_background)
+        self._flush_timer.daemon = True
+        self._flush_timer.start()
+
+    def _flush_in_background(self):
+        try:
+            self.flush()
+        except sqlite3.Error as e:
+            logger.warning("Falha ao gravar o cache de embeddings em disco: %s", e)
+
+    def flush(self):
+        """Confirma no disco, numa só transação, os vetores do buffer"""
+        with self._lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            pending, self._pending = self._pending, {}
+            self._flushing.update(pending)
+        if not pending:
+            return
+        rows = [
+            (key, np.asarray(vector, dtype=np.float32).tobytes(), stored_at)
+            for key, (vector, stored_at) in pending.items()
+        ]
+        try:
+            with self._db_lock:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vector, stored_at) VALUES (?, ?, ?)", rows
+                )
+                if time.time() - self._last_prune >= PRUNE_INTERVAL:
+                    self._prune()
+                self._db.commit()
+        finally:
+            with self._lock:
+                for key in pending:
+                    self._flushing.pop(key, None)
+
+    def _prune(self):
+        """Apaga do disco os vetores expirados e, além de `max_disk_entries`, os mais antigos (com _db_lock)"""
+        now = self._last_prune = time.time()
+        expired = self._db.execute(
+            "DELETE FROM embeddings WHERE stored_at < ?", (now - self.disk_ttl_seconds,)
+        ).rowcount
+        evicted = 0
+        if self.max_disk_entries:
+            excess = self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0] - self.max_disk_entries
+            if excess > 0:
+                evicted = self._db.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY stored_at LIMIT ?)", (excess,)
+                ).rowcount
+        with self._lock:
+            self._stats["disk_expirations"] += expired
+            self._stats["disk_evictions"] += evicted
+
+    def close(self):
+        """Grava o buffer e fecha o banco em disco"""
+        if self._db is None:
+            return
+        self.flush()
+        atexit.unregister(self.flush)
+        with self._db_lock:
+            self._db.close()
+            self._db = None
+
+    def _remember(self, key: str, vector: List[float], now: float):
+        """Insere no LRU em memória, removendo as entradas mais antigas"""
+        self._memory[key] = (vector, now)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def stats(self) -> Dict[str, int]:
+        """Retorna os contadores do cache"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_size"] = len(self._memory)
+            stats["disk_pending"] = len(self._pending) + len(self._flushing)
+        return stats
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings que consultam o cache antes de chamar o provedor.
+
+    Com `batch_window_ms` > 0, consultas assíncronas ausentes do cache são
+    agrupadas por um EmbeddingBatcher em vez de gerar uma chamada cada.
+    """
+
+    def __init__(self, underlying: Embeddings, cache: EmbeddingCache, model: Optional[str] = None,
+                 batch_window_ms: float = 0, max_batch_size: int = 64):
+        self.underlying = underlying
+        self.cache = cache
+        self.model = model or getattr(underlying, "model", type(underlying).__name__)
+        self.batcher = None
+        if batch_window_ms > 0:
+            self.batcher = EmbeddingBatcher(self._aembed_batch, batch_window_ms, max_batch_size)
+
+    async def _aembed_batch(self, texts: List[str]) -> List[List[float]]:
+        return await self.underlying.aembed_documents(texts)
+
+    def _lookup(self, texts: List[str]):
+        """Normaliza os textos e separa os que ainda precisam ser calculados"""
+        normalized = [normalize_text(text) for text in texts]
+        keys = [self.cache.make_key(self.model, text) for text in normalized]
+        found = self.cache.get_many(list(dict.fromkeys(keys)))
+        return keys, found, self._pending(keys, normalized, found)
+
+    async def _alookup(self, texts: List[str]):
+        """Como `_lookup`, com a leitura do disco no executor (fora do event loop)"""
+        normalized = [normalize_text(text) for text in texts]
+        keys = [self.cache.make_key(self.model, text) for text in normalized]
+        unique = list(dict.fromkeys(keys))
+        found = self.cache.get_memory(unique)
+        missing = [key for key in unique if key not in found]
+        if missing and self.cache.on_disk:
+            found.update(await asyncio.get_running_loop().run_in_executor(None, self.cache.get_disk, missing))
+        elif missing:
+            found.update(self.cache.get_disk(missing))
+        return keys, found, self._pending(keys, normalized, found)
+
+    @staticmethod
+    def _pending(keys: List[str], normalized: List[str], found: Dict[str, List[float]]) -> Dict[str, str]:
+        # Textos repetidos na mesma chamada são calculados uma única vez
+        pending = {}
+        for key, text in zip(keys, normalized):
+            if key not in found and key not in pending:
+                pending[key] = text
+        return pending
+
+    def embed_documents(self, texts: List[str], **kwargs) -> List[List[float]]:
+        """Vetores dos textos; `kwargs` vão para a requisição ao provedor (ex.: `timeout`)"""
+        keys, found, pending = self._lookup(texts)
+        if pending:
+            vectors = self.underlying.embed_documents(list(pending.values()), **kwargs)
+            computed = dict(zip(pending.keys(), vectors))
+            self.cache.put_many(computed)
+            found.update(computed)
+        return [found[key] for key in keys]
+
+    def embed_documents_batched(self, texts: List[str], pipeline) -> List[List[float]]:
+        """Como `embed_documents`, mas calcula os textos ausentes com um EmbeddingPipeline.
+
+        Cada lote concluído é gravado no cache na hora, servindo de checkpoint.
+        """
+        keys, found, pending = self._lookup(texts)
+        if pending:
+            pending_keys = list(pending.keys())
+            if found:
+                logger.info(
+                    "Embeddings: retomando com %d de %d textos já em cache",
+                    len(found), len(pending) + len(found)
+                )
+
+            def checkpoint(start: int, vectors: List[List[float]]):
+                self.cache.put_many(dict(zip(pending_keys[start:start + len(vectors)], vectors)))
+                self.cache.flush()
+
+            vectors = pipeline.run(self.underlying.embed_documents, list(pending.values()), on_batch=checkpoint)
+            found.update(zip(pending_keys, vectors))
+        return [found[key] for key in keys]
+
+    def embed_query(self, text: str, **kwargs) -> List[float]:
+        keys, found, pending = self._lookup([text])
+        if pending:
+            vector = self.underlying.embed_query(pending[keys[0]], **kwargs)
+            self.cache.put_many({keys[0]: vector})
+            return vector
+        return found[keys[0]]
+
+    def cached_query(self, text: str) -> Optional[List[float]]:
+        """Embedding da consulta se já estiver em cache (sem chamar o provedor)"""
+        return self.cached_queries([text])[0]
+
+    def cached_queries(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """Embeddings das consultas que já estão em cache (None nas demais), sem chamar o provedor"""
+        keys, found, _ = self._lookup(texts)
+        return [found.get(key) for key in keys]
+
+    async def acached_queries(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """Versão assíncrona de `cached_queries`"""
+        keys, found, _ = await self._alookup(texts)
+        return [found.get(key) for key in keys]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, found, pending = await self._alookup(texts)
+        if pending:
+            vectors = await self.underlying.aembed_documents(list(pending.values()))
+            computed = dict(zip(pending.keys(), vectors))
+            self.cache.put_many(computed)
+            found.update(computed)
+        return [found[key] for key in keys]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        keys, found, pending = await self._alookup([text])
+        if pending:
+            if self.batcher is not None:
+                vector = await self.batcher.embed(pending[keys[0]])
+            else:
+                vector = await self.underlying.aembed_query(pending[keys[0]])
+            self.cache.put_many({keys[0]: vector})
+            return vector
+        return found[keys[0]]
+
+    def stats(self) -> Dict[str, int]:
+        """Retorna os contadores do cache (e do agrupamento de consultas, se ativo)"""
+        stats = self.cache.stats()
+        if self.batcher is not None:
+            stats["batching"] = self.batcher.stats()
+        return stats
@@ -0,0 +1,119 @@
+"""
+Pipeline de embeddings em lotes para a construção dos índices
+Desenvolvido por Pedro Favoretti - Drope Dev
+"""
+
+import time
+import random
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Callable
+
+import openai
+
+logger = logging.getLogger(__name__)
+
+# Erros transitórios que valem uma nova tentativa
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+    ConnectionError,
+    TimeoutError,
+)
+
+
+def estimate_tokens(texts: List[str]) -> int:
+    """Estimativa barata de tokens (~4 caracteres por token)"""
+    return sum(len(text) // 4 + 1 for text in texts)
+
+
+class TokenBucket:
+    """Limita o consumo a `tokens_per_minute`, bloqueando quem exceder"""
+
+    def __init__(self, tokens_per_minute: int):
+        self.capacity = tokens_per_minute
+        self.rate = tokens_per_minute / 60.0
+        self.tokens = float(tokens_per_minute)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, amount: int):
+        # Um lote maior que a capacidade só precisa esperar o balde encher
+        amount = min(amount, self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class EmbeddingPipeline:
+    """Embute textos em lotes, em paralelo, com novas tentativas e limite de tokens/min.
+
+    Cada lote concluído é entregue a `on_batch` assim que termina; o RAGSystem
+    usa isso para gravar o lote no cache persistente de embeddings, de modo que
+    uma construção interrompida retoma apenas os lotes que faltam.
+    """
+
+    def __init__(self, batch_size: int = 256, max_workers: int = 4, max_retries: int = 5,
+                 base_delay: float = 1.0, max_delay: float = 30.0, tokens_per_minute: int = 0):
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.bucket = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+
+    def run(self, embed_fn: Callable[[List[str]], List[List[float]]], texts: List[str],
+            on_batch: Callable[[int, List[List[float]]], None] = None) -> List[List[float]]:
+        """Embute `texts` com `embed_fn` e retorna os vetores na ordem original"""
+        results = [None] * len(texts)
+        starts = list(range(0, len(texts), self.batch_size))
+        if not starts:
+            return results
+
+        completed = 0
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {
+                pool.submit(self._embed_batch, embed_fn, texts[start:start + self.batch_size]): start
+                for start in starts
+            }
+            try:
+                for future in as_completed(futures):
+                    start = futures[future]
+                    vectors = future.result()
+                    results[start:start + len(vectors)] = vectors
+                    if on_batch is not None:
+                        on_batch(start, vectors)
+                    completed += 1
+                    logger.info("Embeddings: lote %d/%d concluído", completed, len(starts))
+            except BaseException:
+                # Não iniciar os lotes restantes; os concluídos já foram entregues
+                for future in futures:
+                    future.cancel()
+                raise
+        return results
+
+    def _embed_batch(self, embed_fn, batch: List[str]) -> List[List[float]]:
+        """Embute um lote, repetindo com backoff exponencial em erros transitórios"""
+        for attempt in range(self.max_retries + 1):
+            if self.bucket is not None:
+                self.bucket.acquire(estimate_tokens(batch))
+            try:
+                return embed_fn(batch)
+            except RETRYABLE_ERRORS as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = min(self.max_delay, self.base_delay * 2 ** attempt) * random.uniform(0.5, 1.0)
+                logger.warning(
+                    "Falha ao gerar embeddings (%s); nova tentativa em %.1fs", type(e).__name__, delay
+                )
+                time.sleep(delay)
@@ -0,0 +1,139 @@
+"""
+Leitura incremental de catálogos e pedidos em JSON (array) ou JSONL
+Desenvolvido por Pedro Favoretti - Drope Dev
+"""
+
+import os
+import json
+import time
+import logging
+from typing import Any, Dict, Iterator, Iterable, Callable
+
+logger = logging.getLogger(__name__)
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\r\n"
+
+
+def find_data_file(data_dir: str, name: str) -> str:
+    """Retorna `<name>.jsonl` se existir, senão `<name>.json`"""
+    jsonl_file = os.path.join(data_dir, f"{name}.jsonl")
+    if os.path.exists(jsonl_file):
+        return jsonl_file
+    return os.path.join(data_dir, f"{name}.json")
+
+
+def iter_records(path: str, chunk_size: int = 1 << 16) -> Iterator[Dict]:
+    """Lê os registros de um arquivo um a um, sem carregar o arquivo inteiro.
+
+    Aceita um array JSON (`[{...}, {...}]`) ou JSONL (um objeto por linha);
+    o formato é detectado pelo primeiro caractere do arquivo.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        first = f.read(1)
+        while first and first in _WHITESPACE:
+            first = f.read(1)
+        if not first:
+            return
+        if first == '[':
+            yield from _iter_array(f, chunk_size)
+        else:
+            line = first + f.readline()
+            while line:
+                if line.strip():
+                    yield json.loads(line)
+                line = f.readline()
+
+
+def _iter_array(f, chunk_size: int) -> Iterator[Dict]:
+    """Decodifica os elementos de um array JSON cujo '[' já foi consumido"""
+    buffer = ""
+    position = 0
+    eof = False
+    expect_value = True
+
+    while True:
+        # Pular espaços e separadores
+        while True:
+            while position < len(buffer) and buffer[position] in _WHITESPACE:
+                position += 1
+            if position < len(buffer) or eof:
+                break
+            buffer, position = buffer[position:] + f.read(chunk_size), 0
+            eof = position == len(buffer)
+
+        if position >= len(buffer):
+            raise ValueError(f"Array JSON incompleto em {f.name}")
+        if buffer[position] == ']':
+            return
+        if not expect_value:
+            if buffer[position] != ',':
+                raise ValueError(f"Separador inválido em {f.name}: {buffer[position]!r}")
+            position += 1
+            expect_value = True
+            continue
+
+        try:
+            record, end = _decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            # Registro cortado no fim do buffer: ler mais e tentar de novo
+            buffer, position = buffer[position:], 0
+            more = f.read(max(chunk_size, len(buffer)))
+            eof = not more
+            buffer += more
+            continue
+
+        yield record
+        position = end
+        expect_value = False
+        if position > chunk_size:
+            buffer, position = buffer[position:], 0
+
+
+def ingest(path: str, sink: Callable[[Dict], Any]) -> Dict[str, float]:
+    """Envia cada registro de `path` para `sink` à medida que é lido.
+
+    Retorna e registra no log a quantidade de registros e a taxa em registros/s.
+    """
+    start = time.perf_counter()
+    count = 0
+    for record in iter_records(path):
+        sink(record)
+        count += 1
+
+    elapsed = time.perf_counter() - start
+    stats = {
+        "records": count,
+        "seconds": round(elapsed, 3),
+        "records_per_sec": round(count / elapsed, 1) if elapsed > 0 else float(count)
+    }
+    logger.info(
+        "Ingeridos %d registros de %s em %.2fs (%.0f registros/s)",
+        count, os.path.basename(path), elapsed, stats["records_per_sec"]
+    )
+    return stats
+
+
+def write_records(path: str, records: Iterable[bytes]):
+    """Grava registros já serializados (JSON compacto) no formato do arquivo de destino.
+
+    JSONL fica com um registro compacto por linha; o array JSON é indentado
+    como o `json.dump(..., indent=2)` dos arquivos de dados do repositório.
+    """
+    tmp_file = path + ".tmp"
+    with open(tmp_file, 'wb') as f:
+        if path.endswith(".jsonl"):
+            for record in records:
+                f.write(record)
+                f.write(b"\n")
+        else:
+            separator = b"[\n  "
+            for record in records:
+                f.write(separator)
+                pretty = json.dumps(json.loads(record), ensure_ascii=False, indent=2)
+                f.write(pretty.replace("\n", "\n  ").encode('utf-8'))
+                separator = b",\n  "
+            f.write(b"[]\n" if separator == b"[\n  " else b"\n]\n")
+    os.replace(tmp_file, path)
@@ -0,0 +1,207 @@
+"""
+Regras de classificação de intenção e extração de entidades, compiladas uma vez
+Desenvolvido por Pedro Favoretti - Drope Dev
+"""
+
+import re
+import json
+from typing import List, Dict, Any
+
+# Regras padrão. Um arquivo JSON com a mesma estrutura (INTENT_RULES_PATH)
+# substitui as chaves que definir.
+DEFAULT_RULES = {
+    # Em ordem de prioridade. "entity" combina uma entidade com as palavras-chave:
+    # "all" exige as duas, "any" aceita qualquer uma.
+    "intents": [
+        {"intent": "consulta_pedido",
+         "keywords": ["pedido", "compra", "status", "entrega", "rastreamento", "onde está"],
+         "entity": "number", "mode": "all"},
+        {"intent": "busca_produto_exata",
+         "keywords": ["qual o preço de", "informações sobre", "detalhes do"],
+         "entity": "product_id", "mode": "any"},
+        {"intent": "politicas",
+         "keywords": ["trocar", "devolver", "política", "prazo", "garantia", "cancelar"]},
+        {"intent": "recomendacao",
+         "keywords": ["recomendar", "sugerir", "indicar", "presente", "gift"]},
+        {"intent": "busca_produto",
+         "keywords": ["buscar", "procurar", "quero", "preciso", "notebook", "smartphone", "celular",
+                      "computador", "tablet", "produto"]},
+        {"intent": "conversa_geral",
+         "keywords": ["oi", "olá", "bom dia", "boa tarde", "boa noite", "ajuda"]}
+    ],
+    "default_intent": "busca_produto",
+    # A primeira categoria (na ordem abaixo) com alguma palavra na consulta
+    "categories": {
+        "eletrônicos": ["notebook", "smartphone", "celular", "computador", "tablet"],
+        "roupas": ["camisa", "calça", "vestido", "roupa", "blusa"],
+        "casa": ["móvel", "decoração", "cozinha", "quarto", "sala"],
+        "esportes": ["tênis", "bicicleta", "academia", "corrida", "futebol"]
+    },
+    # Entidades: expressões regulares em minúsculas; vale o primeiro padrão da
+    # lista que aparecer na consulta, e o grupo 1 é o valor extraído. Nenhuma
+    # entidade começa no meio de um número.
+    "number_pattern": r"\d",
+    "product_id_pattern": r"(prod\d+)",
+    "order_id_patterns": [
+        r"#(\d+)",
+        r"pedido\s*(\d+)",
+        r"número\s*(\d+)",
+        r"(\d{4,})"  # Número com pelo menos 4 dígitos
+    ],
+    "price_patterns": [
+        r"até\s*r?\$?\s*(\d+(?:\.\d{3})*(?:,\d{2})?)",
+        r"máximo\s*r?\$?\s*(\d+(?:\.\d{3})*(?:,\d{2})?)",
+        r"no\s*máximo\s*r?\$?\s*(\d+(?:\.\d{3})*(?:,\d{2})?)",
+        # Equivale a r"r?\$?\s*(\d+...)?\s*reais?" para o valor extraído, mas começa
+        # no número em vez de ser tentado em toda posição
+        r"(\d+(?:\.\d{3})*(?:,\d{2})?)\s*reais?"
+    ]
+}
+
+
+def _trie_pattern(words: List[str]) -> str:
+    """Expressão regular em forma de trie para um conjunto de palavras.
+
+    Prefixos comuns são fatorados e, num mesmo ponto, a palavra mais longa é
+    tentada primeiro.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node: Dict) -> str:
+        terminal = "" in node
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if terminal:
+            return f"(?:{body})?"
+        return body
+
+    return build(trie)
+
+
+class IntentRules:
+    """Classificador de intenção e extrator de entidades.
+
+    Todas as palavras-chave e padrões de entidades viram uma única expressão
+    regular, percorrida uma vez por consulta. Cada posição que casa informa
+    a palavra-chave mais longa ali (as que são prefixo dela contam também)
+    ou o início de uma entidade, e então os padrões de entidade são testados
+    só naquela posição.
+    """
+
+    def __init__(self, rules: Dict[str, Any] = None):
+        rules = {**DEFAULT_RULES, **(rules or {})}
+        self.intents = rules["intents"]
+        self.default_intent = rules["default_intent"]
+        self.category_names = list(rules["categories"])
+
+        # Palavra-chave -> rótulos ("intent:<nome>" / "category:<nome>") dela e de seus prefixos
+        labels = {}
+        for rule in self.intents:
+            for keyword in rule.get("keywords", []):
+                labels.setdefault(keyword.lower(), set()).add("intent:" + rule["intent"])
+        for category, keywords in rules["categories"].items():
+            for keyword in keywords:
+                labels.setdefault(keyword.lower(), set()).add("category:" + category)
+        self._labels = {
+            keyword: frozenset().union(*(labels[other] for other in labels if keyword.startswith(other)))
+            for keyword in labels
+        }
+
+        # Entidades: (nome, posição na prioridade, padrão compilado)
+        self._entities = [("number", 0, re.compile(rules["number_pattern"])),
+                          ("product_id", 0, re.compile(rules["product_id_pattern"]))]
+        self._entities += [("order_id", i, re.compile(p)) for i, p in enumerate(rules["order_id_patterns"])]
+        self._entities += [("max_price", i, re.compile(p)) for i, p in enumerate(rules["price_patterns"])]
+
+        self._keywords = re.compile(_trie_pattern(labels))
+        entity_alternatives = "|".join(f"(?:{pattern.pattern})" for _, _, pattern in self._entities)
+        # Depois de uma entidade o número inteiro é consumido, para não repetir a análise a cada dígito
+        self._scanner = re.compile(
+            f"(?=(?P<entity>{entity_alternatives})|(?P<keyword>{self._keywords.pattern}))\\d*"
+        )
+        self._keyword_group = self._scanner.groupindex["keyword"]
+
+    @classmethod
+    def from_file(cls, path: str) -> "IntentRules":
+        """Carrega regras de um arquivo JSON (chaves ausentes usam o padrão)"""
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def analyze(self, query: str) -> Dict[str, Any]:
+        """Classifica a consulta e extrai pedido, preço máximo, categoria e produto em uma passada"""
+        text = query.lower()
+        keyword_labels = self._labels
+        keyword_group = self._keyword_group
+        labels = set()
+        # Entidade -> {prioridade do padrão: valor da primeira ocorrência}
+        found = {"number": {}, "product_id": {}, "order_id": {}, "max_price": {}}
+
+        for match in self._scanner.finditer(text):
+            keyword = match.group(keyword_group)
+            if keyword is not None:
+                labels |= keyword_labels[keyword]
+                continue
+
+            # Início de entidade: testar cada padrão e as palavras-chave nesta posição
+            position = match.start()
+            for name, priority, pattern in self._entities:
+                values = found[name]
+                if priority in values:
+                    continue
+                entity = pattern.match(text, position)
+                if entity is not None:
+                    value = entity.group(1) if pattern.groups else entity.group(0)
+                    if value is not None:
+                        values[priority] = value
+            keyword = self._keywords.match(text, position)
+            if keyword is not None and keyword.group(0):
+                labels |= keyword_labels[keyword.group(0)]
+
+        return {
+            "intent": self._classify(labels, found),
+            "order_id": self._first(found["order_id"]),
+            "max_price": self._parse_price(found["max_price"]),
+            "category": next((c for c in self.category_names if "category:" + c in labels), None),
+            "product_id": (self._first(found["product_id"]) or "").upper() or None
+        }
+
+    def _classify(self, labels: set, found: Dict[str, Dict]) -> str:
+        for rule in self.intents:
+            has_keyword = "intent:" + rule["intent"] in labels
+            entity = rule.get("entity")
+            if entity is None:
+                matched = has_keyword
+            elif rule.get("mode", "all") == "all":
+                matched = has_keyword and bool(found[entity])
+            else:
+                matched = has_keyword or bool(found[entity])
+            if matched:
+                return rule["intent"]
+        return self.default_intent
+
+    @staticmethod
+    def _first(values: Dict[int, str]) -> str:
+        """Valor do padrão de maior prioridade encontrado"""
+        return values[min(values)] if values else None
+
+    @staticmethod
+    def _parse_price(values: Dict[int, str]) -> float:
+        """Converte o preço (pontos de milhar e vírgula decimal) do padrão de maior prioridade"""
+        for priority in sorted(values):
+            try:
+                return float(values[priority].replace('.', '').replace(',', '.'))
+            except ValueError:
+                continue
+        return None
+
+
+def load_rules(path: str = None) -> IntentRules:
+    """Regras padrão ou, se informado, as do arquivo JSON"""
+    return IntentRules.from_file(path) if path else IntentRules()
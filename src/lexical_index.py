@@ -0,0 +1,246 @@
+"""
+Índice invertido BM25 em memória para busca lexical de produtos e políticas
+Desenvolvido por Pedro Favoretti - Drope Dev
+"""
+
+import re
+import math
+import unicodedata
+from collections import Counter
+from typing import List, Dict, Tuple, Hashable, Iterable, Optional
+
+import numpy as np
+
+# Palavras sem valor de busca (após remover acentos), incluindo as que só indicam a intenção
+STOPWORDS = frozenset("""
+a o as os um uma uns umas de do da dos das em no na nos nas por pelo pela para pra com sem
+e ou que se ao aos the of and me meu minha eu voce voces tem ter qual quais como quem
+quero preciso gostaria procuro busco buscar procurar sobre informacoes detalhes preco
+""".split())
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Minúsculas, sem acentos e sem stopwords"""
+    text = unicodedata.normalize('NFKD', text.lower())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return [token for token in _TOKEN.findall(text) if token not in STOPWORDS]
+
+
+class BM25Index:
+    """Índice BM25 com inserção e remoção de documentos.
+
+    Cada documento ocupa um slot; remoções só marcam o slot como inativo e as
+    listas de ocorrências são compactadas quando metade dos slots está
+    inativa. As pontuações de uma consulta são acumuladas com numpy sobre as
+    listas de ocorrências dos termos.
+
+    Serializado (pickle), o índice guarda só os arrays das listas de
+    ocorrências; as estruturas de alteração são refeitas na primeira
+    inserção ou remoção, então abrir um índice só para busca é rápido.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.keys = []           # slot -> chave do documento (None se removido)
+        self._slots = {}         # chave -> slot
+        self._terms = []         # slot -> Counter de termos
+        self._alive = []
+        self._lengths = []
+        self._postings = {}      # termo -> ([slots], [frequências])
+        self._arrays = {}        # termo -> (slots, frequências) em numpy, recalculado sob demanda
+        self._norms = None       # normalização de tamanho por slot e slots ativos, idem
+        self._df = Counter()
+        self._total_length = 0
+        self._removed = 0
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._slots
+
+    def __getstate__(self):
+        # Um índice aberto de pickle e não alterado só tem os arrays (ver __setstate__)
+        terms = list(self._arrays if self._postings is None else self._postings)
+        arrays = [self._term_arrays(term) for term in terms]
+        bounds = np.cumsum([0] + [len(slots) for slots, _ in arrays])
+        return {
+            "k1": self.k1, "b": self.b, "keys": self.keys,
+            "alive": np.asarray(self._alive, dtype=bool), "lengths": np.asarray(self._lengths, dtype=np.int64),
+            "terms": terms, "bounds": bounds,
+            "slots": np.concatenate([slots for slots, _ in arrays]) if arrays else np.empty(0, dtype=np.int64),
+            "freqs": np.concatenate([freqs for _, freqs in arrays]) if arrays else np.empty(0, dtype=np.float32),
+            "df": dict(self._df), "total_length": self._total_length, "removed": self._removed
+        }
+
+    def __setstate__(self, state):
+        self.__init__(state["k1"], state["b"])
+        self.keys = state["keys"]
+        self._slots = {key: slot for slot, key in enumerate(self.keys) if key is not None}
+        self._alive = state["alive"].tolist()
+        self._lengths = state["lengths"].tolist()
+        bounds, slots, freqs = state["bounds"], state["slots"], state["freqs"]
+        for i, term in enumerate(state["terms"]):
+            self._arrays[term] = (slots[bounds[i]:bounds[i + 1]], freqs[bounds[i]:bounds[i + 1]])
+        self._df = Counter(state["df"])
+        self._total_length = state["total_length"]
+        self._removed = state["removed"]
+        # Listas de ocorrências e termos por slot só voltam a existir se o índice for alterado
+        self._postings = None
+        self._terms = None
+
+    def _thaw(self):
+        """Refaz, a partir dos arrays, as estruturas usadas por inserção e remoção"""
+        if self._postings is not None:
+            return
+        self._postings = {}
+        self._terms = [Counter() for _ in self.keys]
+        for term, (slots, freqs) in self._arrays.items():
+            self._postings[term] = (slots.tolist(), freqs.astype(np.int64).tolist())
+            for slot, freq in zip(self._postings[term][0], self._postings[term][1]):
+                self._terms[slot][term] = freq
+
+    def add(self, key: Hashable, text: str):
+        """Indexa (ou reindexa) um documento"""
+        self._thaw()
+        if key in self._slots:
+            self.remove(key)
+        self._add_terms(key, Counter(tokenize(text)))
+
+    def remove(self, key: Hashable) -> bool:
+        """Remove um documento (retorna False se não existir)"""
+        self._thaw()
+        slot = self._slots.pop(key, None)
+        if slot is None:
+            return False
+        self.keys[slot] = None
+        self._alive[slot] = False
+        self._norms = None
+        self._total_length -= self._lengths[slot]
+        for term in self._terms[slot]:
+            self._df[term] -= 1
+        self._terms[slot] = Counter()
+        self._removed += 1
+        if self._removed * 2 > len(self.keys):
+            self._compact()
+        return True
+
+    def _compact(self):
+        """Reconstrói o índice só com os documentos ativos"""
+        documents = [(key, terms) for key, terms in zip(self.keys, self._terms) if key is not None]
+        self.__init__(self.k1, self.b)
+        for key, terms in documents:
+            self._add_terms(key, terms)
+
+    def _add_terms(self, key: Hashable, terms: Counter):
+        slot = len(self.keys)
+        self.keys.append(key)
+        self._slots[key] = slot
+        self._terms.append(terms)
+        self._alive.append(True)
+        self._norms = None
+        length = sum(terms.values())
+        self._lengths.append(length)
+        self._total_length += length
+        for term, freq in terms.items():
+            postings = self._postings.setdefault(term, ([], []))
+            postings[0].append(slot)
+            postings[1].append(freq)
+            self._arrays.pop(term, None)
+            self._df[term] += 1
+
+    def _term_arrays(self, term: str):
+        arrays = self._arrays.get(term)
+        if arrays is None:
+            slots, freqs = self._postings[term]
+            arrays = self._arrays[term] = (np.array(slots, dtype=np.int64), np.array(freqs, dtype=np.float32))
+        return arrays
+
+    def _indexed(self, term: str) -> bool:
+        return term in (self._arrays if self._postings is None else self._postings)
+
+    def _contains(self, slot: int, term: str) -> bool:
+        """Se o termo ocorre no slot (as listas de ocorrências estão em ordem de slot)"""
+        if not self._indexed(term):
+            return False
+        slots, _ = self._term_arrays(term)
+        position = np.searchsorted(slots, slot)
+        return position < len(slots) and slots[position] == slot
+
+    def _slot_norms(self):
+        """Termo `k1 * (1 - b + b * tamanho / tamanho médio)` de cada slot e a máscara de ativos"""
+        if self._norms is None:
+            lengths = np.asarray(self._lengths, dtype=np.float32)
+            avg_length = self._total_length / len(self._slots) or 1.0
+            self._norms = (self.k1 * (1 - self.b + self.b * lengths / avg_length), np.asarray(self._alive))
+        return self._norms
+
+    def _idf(self, term: str) -> float:
+        n_docs = len(self._slots)
+        df = self._df.get(term, 0)
+        return math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+
+    def search(self, query: str, k: int = 5,
+               allowed: Optional[np.ndarray] = None) -> Tuple[List[Hashable], float]:
+        """Retorna as chaves dos `k` melhores documentos e a confiança da busca lexical.
+
+        `allowed` (booleano por slot, alinhado com `keys`) restringe os documentos considerados.
+        A confiança é `c1 * (c1 - c2)`, onde c1 e c2 são as frações (ponderadas
+        por idf) dos termos da consulta presentes no primeiro e no segundo
+        colocados: alta quando um documento explica a consulta inteira e os
+        demais não.
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or not self._slots:
+            return [], 0.0
+
+        norms, alive = self._slot_norms()
+        scores = np.zeros(len(self.keys), dtype=np.float32)
+        idfs = {term: self._idf(term) for term in terms}
+        for term in terms:
+            if not self._indexed(term):
+                continue
+            slots, freqs = self._term_arrays(term)
+            scores[slots] += idfs[term] * freqs * (self.k1 + 1) / (freqs + norms[slots])
+
+        scores[~(alive if allowed is None else alive & allowed)] = 0
+        candidates = np.flatnonzero(scores)
+        if len(candidates) == 0:
+            return [], 0.0
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k)[:k]]
+        ranked = candidates[np.argsort(-scores[candidates], kind="stable")]
+
+        total_idf = sum(idfs.values())
+        coverage = [
+            sum(idf for term, idf in idfs.items() if self._contains(slot, term)) / total_idf
+            for slot in ranked[:2]
+        ]
+        best = coverage[0]
+        runner_up = coverage[1] if len(coverage) > 1 else 0.0
+        return [self.keys[slot] for slot in ranked], best * (best - runner_up)
+
+
+def reciprocal_rank_fusion(rankings: List[List[Hashable]], k: int, constant: int = 60) -> List[Hashable]:
+    """Combina listas ordenadas pela soma de 1 / (constant + posição)"""
+    scores: Dict[Hashable, float] = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (constant + rank + 1)
+    return sorted(scores, key=lambda key: -scores[key])[:k]
+
+
+def complete_ranking(ranking: List[Hashable], fallback: Iterable[Hashable], k: int) -> List[Hashable]:
+    """`ranking` na ordem, completado com os itens de `fallback` que ainda não estão nele, até `k`"""
+    result = list(ranking[:k])
+    seen = set(result)
+    for key in fallback:
+        if len(result) >= k:
+            break
+        if key not in seen:
+            seen.add(key)
+            result.append(key)
+    return result
@@ -0,0 +1,250 @@
+"""
+Cliente resiliente da OpenAI (chat e embeddings): conexões compartilhadas, prazo por
+chamada, novas tentativas com jitter, requisições duplicadas (hedge) e circuit breaker
+Desenvolvido por Pedro Favoretti - Drope Dev
+"""
+
+import time
+import random
+import asyncio
+import logging
+import threading
+from typing import Any, Callable, Awaitable, Dict, Tuple
+
+import httpx
+from openai import OpenAI, AsyncOpenAI
+
+from index_builder import RETRYABLE_ERRORS
+from config import LLM_POOL_SIZE, LLM_CONNECT_TIMEOUT, LLM_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+_http_clients = None
+_http_lock = threading.Lock()
+
+
+def http_clients() -> Tuple[httpx.Client, httpx.AsyncClient]:
+    """Pool de conexões HTTP do processo, compartilhado pelos clientes de chat e de embeddings"""
+    global _http_clients
+    with _http_lock:
+        if _http_clients is None:
+            limits = httpx.Limits(max_connections=LLM_POOL_SIZE, max_keepalive_connections=LLM_POOL_SIZE)
+            timeout = httpx.Timeout(LLM_TIMEOUT, connect=LLM_CONNECT_TIMEOUT)
+            _http_clients = (
+                httpx.Client(limits=limits, timeout=timeout),
+                httpx.AsyncClient(limits=limits, timeout=timeout)
+            )
+        return _http_clients
+
+
+def create_openai_clients(api_key: str, base_url: str = None) -> Tuple[OpenAI, AsyncOpenAI]:
+    """Clientes síncrono e assíncrono da OpenAI sobre o pool compartilhado.
+
+    As novas tentativas do SDK ficam desligadas: quem repete é o ResilientClient,
+    dentro do prazo da chamada.
+    """
+    sync_http, async_http = http_clients()
+    return (
+        OpenAI(api_key=api_key, base_url=base_url, http_client=sync_http, max_retries=0),
+        AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=async_http, max_retries=0)
+    )
+
+
+class CircuitOpenError(RuntimeError):
+    """Chamada recusada sem ir à rede: o circuito está aberto"""
+
+
+class CircuitBreaker:
+    """Abre após `failure_threshold` chamadas seguidas com falha.
+
+    Aberto, recusa tudo por `reset_seconds`; depois deixa passar uma chamada
+    de teste por vez (meio aberto), que fecha o circuito se der certo e o
+    reabre se falhar.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_seconds: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_started = None
+        self._lock = threading.Lock()
+        self._stats = {"opened": 0, "rejected": 0}
+
+    def allow(self) -> bool:
+        """Indica se a chamada pode ir à rede (no meio aberto, reserva a chamada de teste)"""
+        with self._lock:
+            if self.state == "closed":
+                return True
+            now = time.monotonic()
+            if self.state == "open" and now - self.opened_at >= self.reset_seconds:
+                self.state = "half_open"
+                self._probe_started = None
+            # Um teste que não voltou (ex.: cancelado) libera a vaga depois de reset_seconds
+            if self.state == "half_open" and (
+                self._probe_started is None or now - self._probe_started >= self.reset_seconds
+            ):
+                self._probe_started = now
+                return True
+            self._stats["rejected"] += 1
+            return False
+
+    @property
+    def is_open(self) -> bool:
+        return self.state == "open"
+
+    def record_success(self):
+        with self._lock:
+            if self.state != "closed":
+                logger.info("Circuit breaker: circuito fechado")
+            self.state = "closed"
+            self.failures = 0
+            self._probe_started = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or (self.state == "closed" and self.failures >= self.failure_threshold):
+                logger.warning("Circuit breaker: circuito aberto por %.0fs após %d falhas",
+                               self.reset_seconds, self.failures)
+                self.state = "open"
+                self.opened_at = time.monotonic()
+                self._probe_started = None
+                self._stats["opened"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"state": self.state, "open": int(self.state != "closed"), "failures": self.failures,
+                    **self._stats}
+
+
+class ResilientClient:
+    """Executa chamadas ao provedor com prazo, novas tentativas, hedge e circuit breaker.
+
+    `fn` recebe o tempo restante do prazo (segundos) para repassar como
+    `timeout` da requisição. Erros transitórios (RETRYABLE_ERRORS) são
+    repetidos com backoff exponencial e jitter enquanto couberem no prazo;
+    os demais (ex.: requisição inválida) sobem na hora e não contam como
+    falha do provedor. Com `hedge_after` > 0, uma chamada assíncrona que
+    passar desse tempo sem resposta ganha uma duplicata, e vale a primeira
+    que responder (só para chamadas idempotentes; o modo síncrono não duplica).
+    """
+
+    def __init__(self, name: str, breaker: CircuitBreaker = None, timeout: float = LLM_TIMEOUT,
+                 max_retries: int = 2, hedge_after: float = 0, base_delay: float = 0.2, max_delay: float = 2.0):
+        self.name = name
+        self.breaker = breaker or CircuitBreaker()
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.hedge_after = hedge_after
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0, "failures": 0, "retries": 0, "hedged": 0, "hedge_wins": 0}
+
+    def _count(self, name: str):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _start(self) -> float:
+        """Reserva a chamada no circuito e devolve o prazo (time.monotonic)"""
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"{self.name}: circuito aberto, chamada recusada")
+        self._count("calls")
+        return time.monotonic() + self.timeout
+
+    def _retry_delay(self, attempt: int, error: Exception, deadline: float) -> float:
+        """Espera até a próxima tentativa, ou None se não houver nova tentativa"""
+        delay = min(self.max_delay, self.base_delay * 2 ** attempt) * random.uniform(0.5, 1.0)
+        if attempt >= self.max_retries or self.breaker.is_open or time.monotonic() + delay >= deadline:
+            return None
+        self._count("retries")
+        logger.warning("%s: falha transitória (%s); nova tentativa em %.2fs", self.name, type(error).__name__, delay)
+        return delay
+
+    def _failed(self):
+        self._count("failures")
+        self.breaker.record_failure()
+
+    def call(self, fn: Callable[[float], Any]) -> Any:
+        """Versão síncrona (sem hedge)"""
+        deadline = self._start()
+        attempt = 0
+        while True:
+            try:
+                result = fn(max(deadline - time.monotonic(), 0.001))
+            except RETRYABLE_ERRORS as e:
+                delay = self._retry_delay(attempt, e, deadline)
+                if delay is None:
+                    self._failed()
+                    raise
+                time.sleep(delay)
+                attempt += 1
+                continue
+            except Exception:
+                # O provedor respondeu; o erro é da requisição
+                self.breaker.record_success()
+                raise
+            self.breaker.record_success()
+            return result
+
+    async def acall(self, fn: Callable[[float], Awaitable[Any]], hedge: bool = True) -> Any:
+        """Versão assíncrona; `hedge=False` para chamadas que não podem ser duplicadas (ex.: streaming)"""
+        deadline = self._start()
+        attempt = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    raise TimeoutError(f"{self.name}: prazo de {self.timeout:g}s esgotado")
+                result = await asyncio.wait_for(self._attempt(fn, remaining, hedge), remaining)
+            except RETRYABLE_ERRORS as e:
+                delay = self._retry_delay(attempt, e, deadline)
+                if delay is None:
+                    self._failed()
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            except Exception:
+                self.breaker.record_success()
+                raise
+            self.breaker.record_success()
+            return result
+
+    async def _attempt(self, fn: Callable[[float], Awaitable[Any]], remaining: float, hedge: bool) -> Any:
+        """Uma tentativa; com hedge, dispara a duplicata se a primeira demorar"""
+        if not hedge or not self.hedge_after or self.hedge_after >= remaining:
+            return await fn(remaining)
+
+        first = asyncio.ensure_future(fn(remaining))
+        done, _ = await asyncio.wait({first}, timeout=self.hedge_after)
+        if done:
+            return first.result()
+
+        self._count("hedged")
+        second = asyncio.ensure_future(fn(remaining - self.hedge_after))
+        pending = {first, second}
+        try:
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is second:
+                            self._count("hedge_wins")
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in (first, second):
+                if not task.done():
+                    task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        """Contadores das chamadas e o estado do circuito"""
+        with self._lock:
+            stats = dict(self._stats)
+        stats["circuit"] = self.breaker.stats()
+        return stats
@@ -0,0 +1,137 @@
+"""
+Montagem do contexto dos prompts dentro de um orçamento de tokens por intenção
+Desenvolvido por Pedro Favoretti - Drope Dev
+"""
+
+import logging
+from typing import Dict, List
+
+from config import MODEL_NAME, PROMPT_TOKEN_BUDGET, PROMPT_TOKEN_BUDGETS, CHUNK_OVERLAP
+
+logger = logging.getLogger(__name__)
+
+# Abaixo disso um item truncado não diz nada útil: melhor deixá-lo de fora
+MIN_ITEM_TOKENS = 24
+
+# Sobreposição mínima (caracteres) entre trechos para ser tratada como repetição
+MIN_OVERLAP_CHARS = 20
+
+ELLIPSIS = " …"
+
+
+class TokenCounter:
+    """Conta tokens com o tiktoken do modelo.
+
+    Sem o tiktoken (ou sem o arquivo do encoding, que ele baixa na primeira
+    vez) usa a mesma estimativa do pipeline de embeddings: ~4 caracteres por token.
+    """
+
+    def __init__(self, model: str = MODEL_NAME):
+        self.encoding = None
+        try:
+            import tiktoken
+            self.encoding = tiktoken.encoding_for_model(model)
+        except Exception as e:
+            logger.info("Contagem de tokens estimada (~4 caracteres/token): tiktoken indisponível (%s)", e)
+
+    def count(self, text: str) -> int:
+        if self.encoding is not None:
+            return len(self.encoding.encode(text))
+        return len(text) // 4 + 1
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Corta o texto em até `max_tokens` (contando a reticência), de preferência num espaço"""
+        if self.count(text) <= max_tokens:
+            return text
+        keep = max(max_tokens - self.count(ELLIPSIS), 0)
+        if self.encoding is not None:
+            cut = self.encoding.decode(self.encoding.encode(text)[:keep])
+        else:
+            cut = text[:max(keep - 1, 0) * 4]
+        space = cut.rfind(" ")
+        if space > len(cut) // 2:
+            cut = cut[:space]
+        return cut.rstrip(" ,;:.\n") + ELLIPSIS
+
+
+def _overlap(before: str, after: str, max_chars: int) -> int:
+    """Tamanho do maior fim de `before` que é também o começo de `after`"""
+    tail = before[-max_chars:]
+    # Só as posições onde começa o início de `after` são candidatas
+    start = tail.find(after[:MIN_OVERLAP_CHARS])
+    while start != -1:
+        if after.startswith(tail[start:]):
+            return len(tail) - start
+        start = tail.find(after[:MIN_OVERLAP_CHARS], start + 1)
+    return 0
+
+
+class PromptBuilder:
+    """Encaixa o contexto recuperado no orçamento de tokens da intenção.
+
+    Os itens chegam em ordem de relevância. Se não couberem inteiros, o
+    orçamento é dividido entre eles (os curtos ficam inteiros, os longos
+    são truncados) e os que ficariam com menos de MIN_ITEM_TOKENS saem,
+    começando pelos menos relevantes.
+    """
+
+    def __init__(self, model: str = MODEL_NAME, budgets: Dict[str, int] = None,
+                 default_budget: int = PROMPT_TOKEN_BUDGET, max_overlap: int = CHUNK_OVERLAP):
+        self.counter = TokenCounter(model)
+        self.budgets = dict(PROMPT_TOKEN_BUDGETS if budgets is None else budgets)
+        self.default_budget = default_budget
+        self.max_overlap = max_overlap
+
+    def budget(self, intent: str) -> int:
+        return self.budgets.get(intent, self.default_budget)
+
+    def count(self, text: str) -> int:
+        return self.counter.count(text)
+
+    def fit(self, intent: str, items: List[str], separator: str = "\n\n", header: str = "") -> str:
+        """Junta `header` e os itens que cabem no orçamento da intenção"""
+        budget = self.budget(intent) - (self.count(header) if header else 0)
+        items = [item for item in items if item]
+        if not items or budget < MIN_ITEM_TOKENS:
+            return header.rstrip()
+
+        sizes = [self.count(item) for item in items]
+        separator_tokens = self.count(separator) if len(items) > 1 else 0
+        if sum(sizes) + separator_tokens * (len(items) - 1) > budget:
+            items = items[:max(1, budget // (MIN_ITEM_TOKENS + separator_tokens))]
+            caps = self._allocate(sizes[:len(items)], budget - separator_tokens * (len(items) - 1))
+            items = [
+                item if size <= cap else self.counter.truncate(item, cap)
+                for item, size, cap in zip(items, sizes, caps)
+            ]
+        return header + separator.join(items)
+
+    def fit_chunks(self, intent: str, chunks: List[str]) -> str:
+        """Como `fit`, removendo antes trechos repetidos e a sobreposição entre trechos vizinhos"""
+        return self.fit(intent, self.dedupe(chunks))
+
+    def dedupe(self, chunks: List[str]) -> List[str]:
+        """Tira trechos contidos em outros já escolhidos e a sobreposição (CHUNK_OVERLAP) entre eles"""
+        kept = []
+        for chunk in chunks:
+            chunk = chunk.strip()
+            if not chunk or any(chunk in other for other in kept):
+                continue
+            for other in kept:
+                # O trecho pode vir antes ou depois do vizinho no documento
+                start = _overlap(other, chunk, self.max_overlap)
+                end = _overlap(chunk, other, self.max_overlap)
+                chunk = chunk[start:len(chunk) - end].strip()
+            if chunk:
+                kept.append(chunk)
+        return kept
+
+    @staticmethod
+    def _allocate(sizes: List[int], budget: int) -> List[int]:
+        """Divide o orçamento: itens menores que a parte igual ficam inteiros, a sobra vai para os maiores"""
+        caps = [0] * len(sizes)
+        remaining = budget
+        for rank, index in enumerate(sorted(range(len(sizes)), key=sizes.__getitem__)):
+            caps[index] = min(sizes[index], remaining // (len(sizes) - rank))
+            remaining -= caps[index]
+        return caps
@@ -104,3 +104,66 @@ Responda de forma amigável e natural, sempre direcionando para como você pode
 Mantenha o tom conversacional mas profissional.
 """
 
+
+# Respostas montadas só com os dados recuperados, sem o LLM: modo de resposta "template" da
+# intenção ou falha do serviço (fora do ar, prazo esgotado, circuito aberto)
+TEMPLATE_PRODUCT_LINE = "- **{nome}** ({categoria}): R$ {preco:.2f}{indisponivel}"
+
+TEMPLATE_PRODUCTS = """Encontrei estes produtos para você:
+
+{products}
+
+Quer mais detalhes de algum deles?"""
+
+TEMPLATE_RECOMMENDATIONS = """Algumas sugestões do nosso catálogo:
+
+{products}
+
+Quer mais detalhes de algum deles?"""
+
+TEMPLATE_NO_PRODUCTS = "Não encontrei produtos com esses critérios. Pode me contar um pouco mais sobre o que procura?"
+
+TEMPLATE_PRODUCT = """**{nome}** ({categoria})
+Preço: R$ {preco:.2f}
+{descricao}
+{especificacoes}Disponível: {disponivel}
+Código: {id}"""
+
+TEMPLATE_SPECIFICATIONS = """Especificações:
+{items}
+"""
+
+TEMPLATE_PRODUCT_NOT_FOUND = "Não encontrei esse produto. Confira o código (ex.: PROD001) ou o nome do produto."
+
+TEMPLATE_ORDER = """Pedido #{pedido_id}: {status}. {status_message}
+Data da compra: {data_compra}
+Previsão de entrega: {previsao_entrega}
+Produtos: {produtos}"""
+
+# Valor dos campos que o pedido não tem (ex.: previsão de entrega de um pedido cancelado)
+ORDER_FIELD_DEFAULTS = {"status": "—", "data_compra": "—", "previsao_entrega": "—"}
+
+TEMPLATE_ORDER_TRACKING = "\nCódigo de rastreamento: {codigo_rastreamento}"
+
+# Frase de cada status de pedido (chave em minúsculas); status desconhecidos ficam sem frase
+ORDER_STATUS_MESSAGES = {
+    "aguardando pagamento": "Estamos aguardando a confirmação do pagamento para dar andamento ao pedido.",
+    "preparando": "Seu pedido está sendo preparado para envio.",
+    "preparando para envio": "Seu pedido está sendo preparado para envio.",
+    "em trânsito": "Seu pedido já saiu e está a caminho.",
+    "entregue": "Seu pedido já foi entregue.",
+    "cancelado": "Este pedido foi cancelado."
+}
+
+TEMPLATE_ORDER_NOT_FOUND = "Não encontrei o pedido #{order_id}. Confira o número no e-mail de confirmação da compra."
+
+TEMPLATE_ORDER_WITHOUT_ID = "Para consultar o seu pedido, me informe o número dele (ex.: pedido #12345)."
+
+TEMPLATE_POLICIES = """Veja o que dizem as nossas políticas sobre o assunto:
+
+{policy_info}"""
+
+TEMPLATE_GENERAL = (
+    "Olá! Posso ajudar você a encontrar produtos, acompanhar pedidos, tirar dúvidas sobre trocas, "
+    "devoluções, frete e pagamentos ou sugerir presentes. Como posso ajudar?"
+)
@@ -5,235 +5,1255 @@ Desenvolvido por Pedro Favoretti - Drope Dev
 
 import os
 import json
+import shutil
+import pickle
+import heapq
+import asyncio
+import itertools
+import bisect
+import hashlib
+import logging
+import threading
 import faiss
 import numpy as np
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple
+from collections import defaultdict
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_openai import OpenAIEmbeddings
 from langchain_community.vectorstores import FAISS
+from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain.docstore.document import Document
+from config import (
+    VECTOR_DB_PATH, VECTOR_DB_TYPE, VECTOR_DB_MIN_VECTORS, VECTOR_DB_NLIST, VECTOR_DB_NPROBE,
+    VECTOR_DB_HNSW_M, VECTOR_DB_EF_CONSTRUCTION, VECTOR_DB_EF_SEARCH, VECTOR_DB_PQ_M, VECTOR_DB_READ_ONLY,
+    EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_SIZE, EMBEDDING_CACHE_TTL, EMBEDDING_CACHE_DISK_SIZE, EMBEDDING_CACHE_DISK_TTL,
+    EMBEDDING_BATCH_WINDOW_MS, EMBEDDING_QUERY_BATCH_SIZE,
+    EMBEDDING_BATCH_SIZE, EMBEDDING_MAX_WORKERS, EMBEDDING_MAX_RETRIES, EMBEDDING_TOKENS_PER_MINUTE,
+    INTENT_RULES_PATH, LEXICAL_SEARCH, LEXICAL_CONFIDENCE_THRESHOLD,
+    EMBEDDING_TIMEOUT, EMBEDDING_HEDGE_AFTER_MS, LLM_MAX_RETRIES, LLM_BREAKER_FAILURES, LLM_BREAKER_RESET_SECONDS,
+    PRODUCT_CHANGELOG_MAX, CHUNK_SIZE, CHUNK_OVERLAP, TOP_K_RESULTS
+)
+from embedding_cache import EmbeddingCache, CachedEmbeddings
+from lexical_index import BM25Index, reciprocal_rank_fusion, complete_ranking
+from vector_index import VectorIndexFactory
+from index_builder import EmbeddingPipeline
+from llm_client import http_clients, CircuitBreaker, ResilientClient
+from catalog import ProductCatalog
+from ingest import ingest, find_data_file, write_records
+from intent_rules import load_rules
+from metrics import span
+from readiness import Readiness
+from rwlock import ReadWriteLock
+
+logger = logging.getLogger(__name__)
+
+# Versão do formato dos documentos indexados; alterar invalida os índices salvos
+INDEX_FORMAT_VERSION = 3
+
+# Diretório (dentro de VECTOR_DB_PATH) do catálogo compacto e dos índices BM25 para o modo somente leitura
+SNAPSHOT_DIR = "catalogo"
+SNAPSHOT_FORMAT_VERSION = 2
+
+STALE_BUILD_MESSAGE = (
+    "Índice '{name}' ausente ou desatualizado em {path} no modo somente leitura; "
+    "rode `python src/build_index.py` antes de iniciar os workers"
+)
+
+READ_ONLY_MESSAGE = (
+    "Catálogo aberto somente leitura (VECTOR_DB_READ_ONLY); altere os arquivos de dados "
+    "e rode `python src/build_index.py`"
+)
+
+# Candidatos de cada lista (vetorial e lexical) combinados na busca híbrida
+FUSION_CANDIDATES = 20
+
+# Sufixo do log de alterações de produtos, gravado ao lado do arquivo do catálogo
+CHANGELOG_SUFFIX = ".changes.jsonl"
+
+# Fração de posições descartadas (lápides) a partir da qual o índice de produtos (e o catálogo) é reconstruído
+MAX_TOMBSTONE_FRACTION = 0.25
+
+
+def file_sha256(path: str) -> str:
+    """Calcula o hash SHA-256 do conteúdo de um arquivo"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def changelog_path(products_file: str) -> str:
+    """Log de alterações de um arquivo de produtos (`produtos.json` -> `produtos.changes.jsonl`)"""
+    return os.path.splitext(products_file)[0] + CHANGELOG_SUFFIX
+
+
+def normalize_name(name: str) -> str:
+    """Normaliza nomes para comparação (minúsculas e espaços simples)"""
+    return " ".join(name.lower().split())
+
+
+class ReadOnlyIndexError(PermissionError):
+    """Tentativa de alterar dados com os índices abertos somente leitura.
+    
+    Deriva de PermissionError para a API responder 409 sem importar este módulo.
+    """
 
 
 class RAGSystem:
-    def __init__(self, openai_api_key: str):
-        self.embeddings = OpenAIEmbeddings(openai_api_key=openai_api_key)
+    def __init__(self, openai_api_key: str, vector_db_path: str = VECTOR_DB_PATH,
+                 embedding_cache_path: str = EMBEDDING_CACHE_PATH, lexical_search: bool = LEXICAL_SEARCH,
+                 lexical_threshold: float = LEXICAL_CONFIDENCE_THRESHOLD, read_only: bool = VECTOR_DB_READ_ONLY,
+                 readiness: Readiness = None, changelog_max: int = PRODUCT_CHANGELOG_MAX):
+        self.embedding_cache = EmbeddingCache(
+            embedding_cache_path,
+            max_entries=EMBEDDING_CACHE_SIZE,
+            ttl_seconds=EMBEDDING_CACHE_TTL,
+            max_disk_entries=EMBEDDING_CACHE_DISK_SIZE,
+            disk_ttl_seconds=EMBEDDING_CACHE_DISK_TTL
+        )
+        # Pool de conexões compartilhado com o chat; quem repete as consultas é o embedding_client
+        sync_http, async_http = http_clients()
+        self.embeddings = CachedEmbeddings(
+            OpenAIEmbeddings(
+                openai_api_key=openai_api_key, http_client=sync_http, http_async_client=async_http, max_retries=0
+            ),
+            self.embedding_cache,
+            batch_window_ms=EMBEDDING_BATCH_WINDOW_MS,
+            max_batch_size=EMBEDDING_QUERY_BATCH_SIZE
+        )
+        # Prazo, novas tentativas, hedge e circuit breaker do embedding das consultas
+        self.embedding_client = ResilientClient(
+            "embeddings",
+            CircuitBreaker(LLM_BREAKER_FAILURES, LLM_BREAKER_RESET_SECONDS),
+            timeout=EMBEDDING_TIMEOUT,
+            max_retries=LLM_MAX_RETRIES,
+            hedge_after=EMBEDDING_HEDGE_AFTER_MS / 1000
+        )
+        self.embedding_pipeline = EmbeddingPipeline(
+            batch_size=EMBEDDING_BATCH_SIZE,
+            max_workers=EMBEDDING_MAX_WORKERS,
+            max_retries=EMBEDDING_MAX_RETRIES,
+            tokens_per_minute=EMBEDDING_TOKENS_PER_MINUTE
+        )
         self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200
+            chunk_size=CHUNK_SIZE,
+            chunk_overlap=CHUNK_OVERLAP
+        )
+        self.vector_db_path = vector_db_path
+        # Somente leitura: índices e catálogo vêm prontos do build, mapeados em memória
+        self.read_only = read_only
+        self.vector_index = VectorIndexFactory(
+            VECTOR_DB_TYPE,
+            nlist=VECTOR_DB_NLIST,
+            nprobe=VECTOR_DB_NPROBE,
+            hnsw_m=VECTOR_DB_HNSW_M,
+            ef_construction=VECTOR_DB_EF_CONSTRUCTION,
+            ef_search=VECTOR_DB_EF_SEARCH,
+            pq_m=VECTOR_DB_PQ_M,
+            min_vectors=VECTOR_DB_MIN_VECTORS
         )
+        self.rules = load_rules(INTENT_RULES_PATH)
         self.vector_stores = {}
-        self.products_data = []
+        self.products_data = ProductCatalog()
         self.orders_data = []
         self.policies_data = ""
+        self.source_files = {}
+        self.ingest_stats = {}
+        # Escritores em fila; a rede e o disco de uma alteração ficam fora da trava exclusiva,
+        # que só cobre a troca em memória do catálogo e dos índices de produtos lidos pelas buscas
+        self._write_lock = threading.Lock()
+        self._data_lock = ReadWriteLock()
+        
+        # Alterações de produtos registradas no log e ainda não consolidadas no arquivo do catálogo
+        self.changelog_max = changelog_max
+        self._pending_changes = 0
+        self._changed_products = set()
+        
+        # Versão de cada conjunto de dados; muda a cada carga ou alteração
+        self.data_versions = {'produtos': 0, 'pedidos': 0, 'politicas': 0}
+        
+        # Índices de busca direta (nome -> id de produto, id -> pedido, status -> pedidos).
+        # O id -> linha dos produtos fica no próprio catálogo.
+        self._products_by_name = {}
+        self._name_tokens = {}
+        # Palavras dos nomes em ordem, para a busca por prefixo (montada na primeira busca parcial)
+        self._name_vocabulary = None
+        self._orders_by_id = {}
+        self._orders_by_status = {}
+        
+        # Linha do catálogo de cada posição do índice de produtos (recalculada sob demanda)
+        self._catalog_rows = None
+        
+        # Busca lexical (BM25) ao lado dos índices vetoriais: produtos por id, políticas por trecho.
+        # Com confiança acima do limiar a consulta é respondida sem embedding.
+        self.lexical_search = lexical_search
+        self.lexical_threshold = lexical_threshold
+        self.lexical_indexes = {'produtos': BM25Index(), 'politicas': BM25Index()}
+        self._policy_chunks = []
+        self._lexical_rows = None
+        self._stats_lock = threading.Lock()
+        self.retrieval_stats = {
+            "searches": 0, "lexical": 0, "embedding_cache": 0, "embedding_network": 0, "embedding_unavailable": 0
+        }
+        
+        # Catálogo e índices ficam prontos em etapas (a API atende cada intenção assim que os seus estão)
+        self.readiness = readiness if readiness is not None else Readiness()
         
     def load_data(self, data_dir: str):
-        """Carrega todos os dados necessários"""
+        """Carrega todos os dados necessários.
+        
+        Produtos e pedidos (JSON ou JSONL) são lidos registro a registro direto
+        para o catálogo e os índices, sem manter o arquivo inteiro em memória.
+        """
         # Carregar produtos
-        products_file = os.path.join(data_dir, "produtos.json")
-        if os.path.exists(products_file):
-            with open(products_file, 'r', encoding='utf-8') as f:
-                self.products_data = json.load(f)
+        products_file = find_data_file(data_dir, "produtos")
+        self.source_files['produtos'] = products_file
+        self.products_data = ProductCatalog()
+        self._products_by_name = {}
+        self._name_tokens = {}
+        self._name_vocabulary = None
+        if self.read_only:
+            self._load_snapshot_catalog(data_dir)
+        elif os.path.exists(products_file):
+            def add_product(product):
+                self.products_data.append(product)
+                self._index_product_name(product['id'], product.get('nome', ''))
+            self.ingest_stats['produtos'] = ingest(products_file, add_product)
+        if not self.read_only:
+            self._changed_products = self._replay_product_changes()
+        self.data_versions['produtos'] += 1
         
         # Carregar pedidos
-        orders_file = os.path.join(data_dir, "pedidos.json")
+        orders_file = find_data_file(data_dir, "pedidos")
+        self.orders_data = []
+        self._orders_by_id = {}
+        self._orders_by_status = {}
         if os.path.exists(orders_file):
-            with open(orders_file, 'r', encoding='utf-8') as f:
-                self.orders_data = json.load(f)
+            self.ingest_stats['pedidos'] = ingest(orders_file, self._add_order)
+        self.data_versions['pedidos'] += 1
         
         # Carregar políticas
         policies_file = os.path.join(data_dir, "politicas.md")
         if os.path.exists(policies_file):
             with open(policies_file, 'r', encoding='utf-8') as f:
                 self.policies_data = f.read()
+            self.source_files['politicas'] = policies_file
+        self.data_versions['politicas'] += 1
+        self.readiness.ready("catalogo")
     
-    def create_vector_stores(self):
-        """Cria os índices vetoriais para busca semântica"""
+    def _snapshot_manifest(self, data_dir: str) -> Dict[str, Any]:
+        """Manifesto do catálogo compacto e dos índices BM25 (dependem de produtos e políticas)"""
+        manifest = {
+            "format_version": SNAPSHOT_FORMAT_VERSION,
+            "sources": {},
+            "chunk_size": self.text_splitter._chunk_size,
+            "chunk_overlap": self.text_splitter._chunk_overlap
+        }
+        products_file = find_data_file(data_dir, "produtos")
+        for source_file in (products_file, changelog_path(products_file), os.path.join(data_dir, "politicas.md")):
+            if os.path.exists(source_file):
+                manifest["sources"][os.path.basename(source_file)] = file_sha256(source_file)
+        return manifest
+    
+    def _snapshot_dir(self) -> str:
+        return os.path.join(self.vector_db_path, SNAPSHOT_DIR) if self.vector_db_path else None
+    
+    def _load_snapshot_catalog(self, data_dir: str):
+        """Abre o catálogo compacto gravado pelo build (mapeado em memória)"""
+        snapshot_dir = self._snapshot_dir()
+        if snapshot_dir is None or self._read_manifest(snapshot_dir) != self._snapshot_manifest(data_dir):
+            raise RuntimeError(STALE_BUILD_MESSAGE.format(name=SNAPSHOT_DIR, path=self.vector_db_path))
+        self.products_data = ProductCatalog.load(snapshot_dir)
+        for product_id, name in zip(self.products_data.ids.tolist(), self.products_data.names.tolist()):
+            self._index_product_name(product_id, name)
+    
+    def save_snapshot(self, data_dir: str):
+        """Grava o catálogo compacto e os índices BM25 que os processos somente leitura abrem"""
+        snapshot_dir = self._snapshot_dir()
+        tmp_dir = snapshot_dir + ".tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        self.products_data.save(tmp_dir)
+        with open(os.path.join(tmp_dir, "lexical_produtos.pkl"), 'wb') as f:
+            pickle.dump(self.lexical_indexes['produtos'], f, protocol=pickle.HIGHEST_PROTOCOL)
+        with open(os.path.join(tmp_dir, "lexical_politicas.pkl"), 'wb') as f:
+            pickle.dump((self.lexical_indexes['politicas'], self._policy_chunks), f, protocol=pickle.HIGHEST_PROTOCOL)
+        self._commit_dir(tmp_dir, snapshot_dir, self._snapshot_manifest(data_dir))
+    
+    def _add_order(self, order: Dict):
+        """Adiciona um pedido à lista e aos índices de busca direta"""
+        position = len(self.orders_data)
+        self.orders_data.append(order)
+        self._orders_by_id.setdefault(order.get('pedido_id'), order)
+        status = order.get('status', '').lower()
+        self._orders_by_status.setdefault(status, []).append(position)
+    
+    def _index_product_name(self, product_id: str, name: str):
+        """Adiciona o nome de um produto aos índices de busca direta"""
+        name = normalize_name(name)
+        current = self._products_by_name.get(name)
+        if current is None or self.products_data.row_of(current) > self.products_data.row_of(product_id):
+            self._products_by_name[name] = product_id
+        for token in set(name.split()):
+            ids = self._name_tokens.get(token)
+            if ids is None:
+                ids = self._name_tokens[token] = set()
+                if self._name_vocabulary is not None:
+                    bisect.insort(self._name_vocabulary, token)
+            ids.add(product_id)
+    
+    def _unindex_product_name(self, product_id: str, name: str):
+        """Remove o nome de um produto dos índices de busca direta"""
+        name = normalize_name(name)
+        for token in set(name.split()):
+            ids = self._name_tokens.get(token)
+            if ids is not None:
+                ids.discard(product_id)
+                if not ids:
+                    del self._name_tokens[token]
+                    if self._name_vocabulary is not None:
+                        del self._name_vocabulary[bisect.bisect_left(self._name_vocabulary, token)]
+        
+        if self._products_by_name.get(name) == product_id:
+            del self._products_by_name[name]
+            # Outro produto com o mesmo nome assume a entrada
+            same_name = [
+                other_id for other_id in self._name_candidates(name)
+                if normalize_name(self._product_name(other_id)) == name
+            ]
+            if same_name:
+                self._products_by_name[name] = min(same_name, key=self.products_data.row_of)
+    
+    def _product_name(self, product_id: str) -> str:
+        """Nome de um produto lido da coluna do catálogo"""
+        return self.products_data.names[self.products_data.row_of(product_id)]
+    
+    def _name_candidates(self, name: str) -> set:
+        """Produtos cujo nome contém todas as palavras de `name`"""
+        postings = [self._name_tokens.get(token) for token in name.split()]
+        if not postings or not all(postings):
+            return set()
+        postings.sort(key=len)
+        return set.intersection(*postings)
+    
+    def _name_prefix_candidates(self, name: str) -> set:
+        """Produtos cujo nome pode conter `name`: as palavras inteiras e uma que começa com a última.
         
-        # Criar índice para produtos
+        Os candidatos ainda precisam ser conferidos pelo trecho completo.
+        """
+        *words, last = name.split()
+        postings = [self._name_tokens.get(token) for token in words]
+        if not all(postings):
+            return set()
+        if self._name_vocabulary is None:
+            self._name_vocabulary = sorted(self._name_tokens)
+        start = bisect.bisect_left(self._name_vocabulary, last)
+        end = bisect.bisect_left(self._name_vocabulary, last + "\U0010ffff", start)
+        if start == end:
+            return set()
+        # A união dos prefixos só vale a pena se tiver menos palavras que o menor conjunto das inteiras
+        if not postings or end - start < min(map(len, postings)):
+            postings.append(set().union(*(self._name_tokens[token] for token in self._name_vocabulary[start:end])))
+        postings.sort(key=len)
+        return set.intersection(*postings)
+    
+    def create_vector_stores(self):
+        """Carrega os índices vetoriais salvos ou cria os que estiverem desatualizados"""
+        self.create_product_index()
+        self.create_policy_index()
+    
+    def create_product_index(self):
+        """Índice vetorial (salvo ou reconstruído) e BM25 dos produtos"""
         if self.products_data:
-            product_docs = []
+            self._load_or_build_store('produtos', self._build_product_store)
+            self._catalog_rows = None
+            if not self.read_only:
+                # Alterações do log posteriores ao índice salvo (no índice recém-construído não mudam nada)
+                self._writable_product_store()
+                for product_id in self._changed_products:
+                    row = self.products_data.row_of(product_id)
+                    if row is None:
+                        self._vector_delete(product_id)
+                    else:
+                        doc = self._product_document(self.products_data[row])
+                        self._vector_upsert(doc, self._product_vector(doc))
+                self._compact_product_store()
+        
+        if self.read_only:
+            # Manifesto já conferido ao abrir o catálogo em load_data
+            with open(os.path.join(self._snapshot_dir(), "lexical_produtos.pkl"), 'rb') as f:
+                self.lexical_indexes['produtos'] = pickle.load(f)
+        else:
+            products = BM25Index()
             for product in self.products_data:
-                content = f"""
-                Nome: {product['nome']}
-                Categoria: {product['categoria']}
-                Preço: R$ {product['preco']}
-                Descrição: {product['descricao']}
-                Especificações: {json.dumps(product.get('especificacoes', {}), ensure_ascii=False)}
-                Disponível: {'Sim' if product.get('disponivel', True) else 'Não'}
-                """
-                doc = Document(
-                    page_content=content,
-                    metadata={
-                        "id": product['id'],
-                        "tipo": "produto",
-                        "categoria": product['categoria'],
-                        "preco": product['preco']
-                    }
-                )
-                product_docs.append(doc)
-            
-            self.vector_stores['produtos'] = FAISS.from_documents(
-                product_docs, self.embeddings
+                products.add(product['id'], self._product_lexical_text(product))
+            self.lexical_indexes['produtos'] = products
+        self._lexical_rows = None
+        self.readiness.ready("indice_produtos")
+    
+    def create_policy_index(self):
+        """Índice vetorial (salvo ou reconstruído) e BM25 das políticas"""
+        if self.policies_data:
+            self._load_or_build_store('politicas', self._build_policy_store)
+        
+        if self.read_only:
+            with open(os.path.join(self._snapshot_dir(), "lexical_politicas.pkl"), 'rb') as f:
+                self.lexical_indexes['politicas'], self._policy_chunks = pickle.load(f)
+        else:
+            policies = BM25Index()
+            self._policy_chunks = self.text_splitter.split_text(self.policies_data) if self.policies_data else []
+            for position, chunk in enumerate(self._policy_chunks):
+                policies.add(position, chunk)
+            self.lexical_indexes['politicas'] = policies
+        self.readiness.ready("indice_politicas")
+    
+    @staticmethod
+    def _product_lexical_text(product: Dict) -> str:
+        """Texto do produto no índice BM25; o nome entra duas vezes para pesar mais"""
+        specs = product.get('especificacoes') or {}
+        if isinstance(specs, dict):
+            specs = " ".join(f"{key} {value}" for key, value in specs.items())
+        return " ".join([
+            product['nome'], product['nome'], product.get('categoria', ''),
+            product.get('descricao', ''), str(specs)
+        ])
+    
+    def _store_manifest(self, name: str) -> Dict[str, Any]:
+        """Monta o manifesto que identifica a versão dos dados de um índice"""
+        manifest = {
+            "format_version": INDEX_FORMAT_VERSION,
+            "embedding_model": self.embeddings.model,
+            "index": self.vector_index.describe(),
+            "sources": {}
+        }
+        source_file = self.source_files.get(name)
+        if source_file and os.path.exists(source_file):
+            manifest["sources"][os.path.basename(source_file)] = file_sha256(source_file)
+        if name == 'politicas':
+            manifest["chunk_size"] = self.text_splitter._chunk_size
+            manifest["chunk_overlap"] = self.text_splitter._chunk_overlap
+        return manifest
+    
+    def _load_or_build_store(self, name: str, build_fn):
+        """Reaproveita o índice salvo se o manifesto bater, senão reconstrói e salva"""
+        manifest = self._store_manifest(name)
+        store_dir = os.path.join(self.vector_db_path, name) if self.vector_db_path else None
+        
+        if store_dir and self._read_manifest(store_dir) == manifest:
+            try:
+                self.vector_stores[name] = self._load_store(store_dir, with_docstore=name != 'produtos')
+                return
+            except Exception:
+                if self.read_only:
+                    raise
+                # Índice corrompido ou incompatível: reconstruir
+                pass
+        
+        if self.read_only:
+            raise RuntimeError(STALE_BUILD_MESSAGE.format(name=name, path=self.vector_db_path))
+        self.vector_stores[name] = build_fn()
+        if store_dir:
+            self._save_store(self.vector_stores[name], store_dir, manifest)
+    
+    def _read_manifest(self, store_dir: str) -> Dict[str, Any]:
+        """Lê o manifesto de um índice salvo"""
+        manifest_file = os.path.join(store_dir, "manifest.json")
+        if not os.path.exists(manifest_file):
+            return None
+        try:
+            with open(manifest_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+    
+    def _load_store(self, store_dir: str, with_docstore: bool = True) -> FAISS:
+        """Carrega um índice salvo (o Flat sempre mapeado em memória, os demais no modo somente leitura).
+        
+        No modo somente leitura o índice de produtos dispensa o docstore: a
+        busca só usa o id de cada posição e o registro vem do catálogo.
+        """
+        index = self.vector_index.read(os.path.join(store_dir, "index.faiss"), read_only=self.read_only)
+        if self.read_only and not with_docstore:
+            with open(os.path.join(store_dir, "ids.json"), 'r', encoding='utf-8') as f:
+                return FAISS(self.embeddings, index, InMemoryDocstore(), dict(enumerate(json.load(f))))
+        with open(os.path.join(store_dir, "index.pkl"), 'rb') as f:
+            docstore, index_to_docstore_id = pickle.load(f)
+        return FAISS(self.embeddings, index, docstore, index_to_docstore_id)
+    
+    def _save_store(self, store: FAISS, store_dir: str, manifest: Dict[str, Any]):
+        """Salva o índice e o manifesto, substituindo a versão anterior de forma atômica"""
+        tmp_dir = store_dir + ".tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        store.save_local(tmp_dir)
+        # Ids por posição, lidos sem o docstore no modo somente leitura
+        with open(os.path.join(tmp_dir, "ids.json"), 'w', encoding='utf-8') as f:
+            json.dump([store.index_to_docstore_id.get(position) for position in range(store.index.ntotal)], f)
+        self._commit_dir(tmp_dir, store_dir, manifest)
+    
+    @staticmethod
+    def _commit_dir(tmp_dir: str, target_dir: str, manifest: Dict[str, Any]):
+        """Grava o manifesto e troca o diretório anterior pelo novo.
+        
+        Processos que mapearam os arquivos antigos continuam lendo a versão
+        deles até reabrirem o índice.
+        """
+        # O manifesto é gravado por último: sem ele o índice é considerado inválido
+        with open(os.path.join(tmp_dir, "manifest.json"), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        
+        shutil.rmtree(target_dir, ignore_errors=True)
+        os.replace(tmp_dir, target_dir)
+    
+    def _product_document(self, product: Dict) -> Document:
+        """Monta o documento indexado de um produto.
+        
+        Preço e disponibilidade ficam apenas nos metadados para que mudanças
+        nesses campos não exijam um novo embedding.
+        """
+        content = f"""
+            Nome: {product['nome']}
+            Categoria: {product['categoria']}
+            Descrição: {product['descricao']}
+            Especificações: {json.dumps(product.get('especificacoes', {}), ensure_ascii=False)}
+            """
+        return Document(
+            id=product['id'],
+            page_content=content,
+            metadata={
+                "id": product['id'],
+                "tipo": "produto",
+                "categoria": product['categoria'],
+                "preco": product['preco'],
+                "disponivel": product.get('disponivel', True)
+            }
+        )
+    
+    def _build_store(self, docs: List[Document], store: FAISS = None, expected_total: int = None) -> FAISS:
+        """Embute os documentos com o pipeline em lotes e os adiciona ao índice.
+        
+        Sem `store`, cria o índice do tipo configurado para `expected_total`
+        vetores, treinado (se o tipo exigir) com os vetores deste lote.
+        """
+        texts = [doc.page_content for doc in docs]
+        vectors = self.embeddings.embed_documents_batched(texts, self.embedding_pipeline)
+        ids = [doc.id for doc in docs] if all(doc.id for doc in docs) else None
+        metadatas = [doc.metadata for doc in docs]
+        if store is None:
+            index = self.vector_index.create(np.array(vectors, dtype=np.float32), expected_total or len(docs))
+            store = FAISS(self.embeddings, index, InMemoryDocstore(), {})
+        store.add_embeddings(list(zip(texts, vectors)), metadatas=metadatas, ids=ids)
+        return store
+    
+    def _build_product_store(self, chunk_size: int = 10000) -> FAISS:
+        """Cria o índice vetorial de produtos, percorrendo o catálogo em blocos"""
+        store = None
+        products = iter(self.products_data)
+        for chunk in iter(lambda: list(itertools.islice(products, chunk_size)), []):
+            product_docs = [self._product_document(product) for product in chunk]
+            store = self._build_store(product_docs, store, expected_total=len(self.products_data))
+        return store
+    
+    def _build_policy_store(self) -> FAISS:
+        """Cria o índice vetorial de políticas"""
+        policy_chunks = self.text_splitter.split_text(self.policies_data)
+        policy_docs = [
+            Document(
+                page_content=chunk,
+                metadata={"tipo": "politica"}
+            ) for chunk in policy_chunks
+        ]
+        
+        return self._build_store(policy_docs)
+    
+    def upsert_product(self, product: Dict) -> str:
+        """Insere ou atualiza um produto no catálogo e no índice vetorial.
+        
+        Retorna "criado", "atualizado" ou "metadados_atualizados" (quando só
+        campos fora do texto indexado mudaram e o embedding foi reaproveitado).
+        """
+        if self.read_only:
+            raise ReadOnlyIndexError(READ_ONLY_MESSAGE)
+        missing = [field for field in ("id", "nome", "categoria", "preco", "descricao") if field not in product]
+        if missing:
+            raise ValueError(f"Campos obrigatórios ausentes: {', '.join(missing)}")
+        
+        with self._write_lock:
+            # Embedding (rede) e cópia do índice mapeado antes da trava exclusiva: as buscas seguem
+            self._writable_product_store()
+            doc = self._product_document(product)
+            vector = self._product_vector(doc)
+            with self._data_lock.write():
+                self._vector_upsert(doc, vector)
+                row = self._catalog_upsert(product)
+                if vector is not None:
+                    lexical = self.lexical_indexes['produtos']
+                    slots = len(lexical.keys)
+                    lexical.add(product['id'], self._product_lexical_text(product))
+                    self._lexical_slot_added(slots, self.products_data.row_of(product['id']))
+                elif row is None:
+                    self._lexical_rows = None
+                self.data_versions['produtos'] += 1
+            self._compact_product_store()
+            self._log_product_change({"op": "upsert", "product": product})
+        
+        if vector is None:
+            return "metadados_atualizados"
+        return "atualizado" if row is not None else "criado"
+    
+    def delete_product(self, product_id: str) -> bool:
+        """Remove um produto do catálogo e do índice vetorial"""
+        if self.read_only:
+            raise ReadOnlyIndexError(READ_ONLY_MESSAGE)
+        with self._write_lock:
+            self._writable_product_store()
+            with self._data_lock.write():
+                if not self._catalog_delete(product_id):
+                    return False
+                self._vector_delete(product_id)
+                lexical = self.lexical_indexes['produtos']
+                slots = len(lexical.keys)
+                lexical.remove(product_id)
+                if len(lexical.keys) != slots:
+                    # O BM25 compactou e renumerou os slots
+                    self._lexical_rows = None
+                self.data_versions['produtos'] += 1
+            self._compact_product_store()
+            self._log_product_change({"op": "delete", "id": product_id})
+        return True
+    
+    def _catalog_upsert(self, product: Dict) -> int:
+        """Insere ou atualiza o produto no catálogo e na busca por nome; retorna a linha anterior (ou None)"""
+        product_id = product['id']
+        row = self.products_data.row_of(product_id)
+        if row is None:
+            self.products_data.append(product)
+        else:
+            # Atualiza a linha no lugar para manter a posição no catálogo
+            self._unindex_product_name(product_id, self.products_data.names[row])
+            self.products_data.update(row, product)
+        self._index_product_name(product_id, product['nome'])
+        return row
+    
+    def _catalog_delete(self, product_id: str) -> bool:
+        """Remove o produto do catálogo e da busca por nome.
+        
+        A linha vira lápide e as demais não mudam, então os mapas de posições
+        e slots para linhas continuam válidos (a lápide não passa em nenhum
+        filtro); só a compactação do catálogo, quando as lápides passam do
+        limite, renumera as linhas e os descarta.
+        """
+        row = self.products_data.row_of(product_id)
+        if row is None:
+            return False
+        self._unindex_product_name(product_id, self.products_data.names[row])
+        catalog = self.products_data
+        catalog.delete(row)
+        if catalog.removed > MAX_TOMBSTONE_FRACTION * (len(catalog) + catalog.removed):
+            catalog.compact()
+            self._catalog_rows = None
+            self._lexical_rows = None
+        return True
+    
+    def _product_vector(self, doc: Document) -> List[float]:
+        """Embedding do documento do produto, ou None se o texto indexado não mudou"""
+        store = self.vector_stores.get('produtos')
+        current = store.docstore.search(doc.id) if store is not None else None
+        if isinstance(current, Document) and current.page_content == doc.page_content:
+            return None
+        return self.embeddings.embed_documents([doc.page_content])[0]
+    
+    def _vector_upsert(self, doc: Document, vector: List[float]):
+        """Indexa o produto no índice vetorial com o embedding já calculado.
+        
+        Com `vector` None (texto indexado igual) só os metadados são trocados.
+        """
+        product_id = doc.id
+        store = self.vector_stores.get('produtos')
+        if store is None:
+            self.vector_stores['produtos'] = FAISS.from_embeddings(
+                [(doc.page_content, vector)], self.embeddings, metadatas=[doc.metadata], ids=[product_id]
             )
+        elif vector is None:
+            store.docstore.delete([product_id])
+            store.docstore.add({product_id: doc})
+            return
+        else:
+            if isinstance(store.docstore.search(product_id), Document):
+                self._remove_vectors(store, [product_id])
+            store.add_embeddings([(doc.page_content, vector)], metadatas=[doc.metadata], ids=[product_id])
+        self._catalog_rows = None
+    
+    def _writable_product_store(self) -> FAISS:
+        """Índice de produtos pronto para alteração (o lido do disco fica mapeado até a primeira).
         
-        # Criar índice para políticas
-        if self.policies_data:
-            policy_chunks = self.text_splitter.split_text(self.policies_data)
-            policy_docs = [
-                Document(
-                    page_content=chunk,
-                    metadata={"tipo": "politica"}
-                ) for chunk in policy_chunks
-            ]
-            
-            self.vector_stores['politicas'] = FAISS.from_documents(
-                policy_docs, self.embeddings
+        A cópia tem o mesmo conteúdo, então pode ser trocada sem a trava exclusiva.
+        """
+        store = self.vector_stores.get('produtos')
+        if store is not None:
+            store.index = self.vector_index.writable(store.index)
+        return store
+    
+    def _vector_delete(self, product_id: str):
+        """Remove o produto do índice vetorial, se estiver indexado"""
+        store = self.vector_stores.get('produtos')
+        if store is not None and isinstance(store.docstore.search(product_id), Document):
+            self._remove_vectors(store, [product_id])
+            if self.vector_index.supports_removal(store.index):
+                # Só o Flat renumera as posições; nos demais a posição aponta para a lápide do catálogo
+                self._catalog_rows = None
+    
+    def _remove_vectors(self, store: FAISS, doc_ids: List[str]):
+        """Remove documentos do índice vetorial.
+        
+        Só o Flat renumera as posições ao remover; nos demais tipos (o HNSW nem
+        permite remoção) a posição vira uma lápide sem documento, que a busca
+        ignora por não ter linha no catálogo.
+        """
+        if self.vector_index.supports_removal(store.index):
+            store.delete(doc_ids)
+            return
+        removed = set(doc_ids)
+        for position, doc_id in store.index_to_docstore_id.items():
+            if doc_id in removed:
+                store.index_to_docstore_id[position] = None
+        store.docstore.delete(doc_ids)
+    
+    def _compact_product_store(self):
+        """Reconstrói o índice de produtos quando as lápides passam do limite.
+        
+        Os vetores vêm do cache de embeddings, então só o índice é refeito; o
+        novo é montado ao lado do atual (as buscas seguem) e trocado no fim.
+        """
+        store = self.vector_stores.get('produtos')
+        if store is None or self.vector_index.supports_removal(store.index):
+            return
+        tombstones = sum(1 for doc_id in store.index_to_docstore_id.values() if doc_id is None)
+        if tombstones > MAX_TOMBSTONE_FRACTION * max(store.index.ntotal, 1):
+            rebuilt = self._build_product_store()
+            with self._data_lock.write():
+                self.vector_stores['produtos'] = rebuilt
+                self._catalog_rows = None
+    
+    def _log_product_change(self, change: Dict):
+        """Acrescenta a alteração ao log; o catálogo e o índice só são regravados a cada `changelog_max`"""
+        products_file = self.source_files.get('produtos')
+        if not products_file:
+            return
+        with open(changelog_path(products_file), 'ab') as f:
+            f.write(json.dumps(change, ensure_ascii=False).encode('utf-8') + b"\n")
+        self._pending_changes += 1
+        if self._pending_changes >= self.changelog_max:
+            self._compact_products()
+    
+    def _replay_product_changes(self) -> set:
+        """Aplica ao catálogo recém-carregado o log de alterações; retorna os ids alterados.
+        
+        Cada entrada traz o registro completo (ou a remoção), então reaplicar
+        um log já consolidado no arquivo não muda nada.
+        """
+        changed = set()
+        self._pending_changes = 0
+        products_file = self.source_files.get('produtos')
+        if not products_file or not os.path.exists(changelog_path(products_file)):
+            return changed
+        with open(changelog_path(products_file), 'rb') as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    # Última linha cortada por uma queda no meio da gravação
+                    logger.warning("Entrada incompleta ignorada no fim de %s", changelog_path(products_file))
+                    break
+                change = json.loads(line)
+                if change["op"] == "upsert":
+                    self._catalog_upsert(change["product"])
+                    changed.add(change["product"]["id"])
+                else:
+                    self._catalog_delete(change["id"])
+                    changed.add(change["id"])
+                self._pending_changes += 1
+        return changed
+    
+    def compact_products(self):
+        """Consolida o log de alterações no arquivo do catálogo e no índice de produtos salvo"""
+        if self.read_only:
+            return
+        with self._write_lock:
+            if self._pending_changes:
+                self._compact_products()
+    
+    def _compact_products(self):
+        """Regrava o catálogo e o índice de produtos com um novo manifesto e descarta o log.
+        
+        O log só é apagado depois das duas gravações; numa queda antes disso
+        ele é reaplicado por cima do arquivo novo na próxima carga.
+        """
+        products_file = self.source_files.get('produtos')
+        if products_file:
+            write_records(products_file, self.products_data.raw_records())
+        
+        store = self.vector_stores.get('produtos')
+        if store is not None and self.vector_db_path:
+            self._save_store(
+                store, os.path.join(self.vector_db_path, 'produtos'), self._store_manifest('produtos')
             )
+        if products_file and os.path.exists(changelog_path(products_file)):
+            os.remove(changelog_path(products_file))
+        self._pending_changes = 0
+        self._changed_products = set()
+    
+    def reading(self):
+        """Trava de leitura do catálogo e dos índices de produtos, para quem os lê direto (ex.: a API)"""
+        return self._data_lock.read()
     
-    def search_products(self, query: str, max_price: float = None, category: str = None, k: int = 5) -> List[Dict]:
-        """Busca produtos usando similaridade semântica"""
+    def search_products(self, query: str, max_price: float = None, category: str = None, k: int = TOP_K_RESULTS,
+                        min_price: float = None, query_vector: List[float] = None,
+                        vector_hits: List[str] = None, lexical_hits: Tuple[List[str], float] = None) -> List[Dict]:
+        """Busca produtos combinando similaridade semântica e BM25.
+        
+        Os filtros de preço, categoria e disponibilidade são aplicados dentro
+        das duas buscas. Se a busca lexical for conclusiva (ex.: nome exato do
+        produto), o embedding da consulta nem é calculado; um `query_vector`
+        vazio (embedding indisponível) restringe a busca ao BM25. `vector_hits`
+        é o resultado da busca vetorial já feita em lote (`product_vector_hits`)
+        e `lexical_hits` o da busca lexical já feita (`product_lexical_hits`).
+        """
         if 'produtos' not in self.vector_stores:
             return []
         
-        # Busca semântica
-        docs = self.vector_stores['produtos'].similarity_search(query, k=k*2)
+        filters = {"max_price": max_price, "min_price": min_price, "category": category}
+        return self._hybrid_product_search(query, filters, k, query_vector, vector_hits, lexical_hits)
+    
+    def get_recommendations(self, query: str, k: int = TOP_K_RESULTS, query_vector: List[float] = None,
+                            vector_hits: List[str] = None, lexical_hits: Tuple[List[str], float] = None) -> List[Dict]:
+        """Gera recomendações baseadas na consulta"""
+        # Para recomendações, usamos busca semântica mais ampla
+        if 'produtos' not in self.vector_stores:
+            return []
         
-        # Filtrar resultados
-        results = []
-        for doc in docs:
-            product_id = doc.metadata['id']
-            product = next((p for p in self.products_data if p['id'] == product_id), None)
-            
-            if product:
-                # Aplicar filtros
-                if max_price and product['preco'] > max_price:
-                    continue
-                if category and product['categoria'].lower() != category.lower():
-                    continue
-                if not product.get('disponivel', True):
-                    continue
-                
-                results.append(product)
-                
-                if len(results) >= k:
-                    break
+        return self._hybrid_product_search(query, {}, k, query_vector, vector_hits, lexical_hits)
+    
+    def _hybrid_product_search(self, query: str, filters: Dict[str, Any], k: int,
+                               query_vector: List[float] = None, vector_hits: List[str] = None,
+                               lexical_hits: Tuple[List[str], float] = None) -> List[Dict]:
+        """Busca lexical primeiro; se não for conclusiva, funde com a vetorial (RRF).
+        
+        Uma busca lexical confiante com menos de `k` produtos é completada
+        com os da busca vetorial, depois dos encontrados pelo BM25. A trava de
+        leitura não fica presa durante o embedding da consulta: a busca
+        vetorial e a fusão são uma segunda etapa, que converte de novo os ids
+        em linhas (uma alteração no meio pode ter deslocado ou removido linhas).
+        """
+        self._count("searches")
+        with self._data_lock.read():
+            version = self.data_versions['produtos']
+            row_mask = self._product_row_mask(**filters)
+            if lexical_hits is None:
+                lexical_hits = self._product_lexical_hits(query, row_mask)
+            ids, confidence = lexical_hits
+            lexical_rows = self._rows_of(ids)
+            if self._lexical_conclusive(lexical_rows, confidence, k):
+                self._count("lexical")
+                return self.products_data.records(lexical_rows[:k])
+        
+        if vector_hits is None:
+            vector = query_vector if query_vector is not None else self._embed_query(query)
         
+        with self._data_lock.read():
+            if self.data_versions['produtos'] != version:
+                row_mask = self._product_row_mask(**filters)
+                lexical_rows = self._rows_of(ids)
+            if vector_hits is not None:
+                vector_rows = self._rows_of(vector_hits)
+            elif len(vector) == 0:
+                # Embedding indisponível: fica só a busca lexical
+                return self.products_data.records(lexical_rows[:k])
+            else:
+                mask = np.append(row_mask, False)[self._positions_to_rows()]
+                vector_rows = self._vector_rows(vector, mask, FUSION_CANDIDATES if lexical_rows else k).tolist()
+            if not lexical_rows:
+                return self.products_data.records(vector_rows[:k])
+            if confidence >= self.lexical_threshold:
+                return self.products_data.records(complete_ranking(lexical_rows, vector_rows, k))
+            return self.products_data.records(reciprocal_rank_fusion([vector_rows, lexical_rows], k))
+    
+    def _rows_of(self, product_ids: List[str]) -> List[int]:
+        """Linhas atuais dos produtos, na ordem dada, sem os que foram removidos"""
+        return [row for row in map(self.products_data.row_of, product_ids) if row is not None]
+    
+    def _lexical_conclusive(self, hits: List, confidence: float, k: int) -> bool:
+        """A busca lexical basta sozinha: confiança acima do limiar e ao menos `k` resultados"""
+        return confidence >= self.lexical_threshold and len(hits) >= k
+    
+    def product_lexical_hits(self, query: str, max_price: float = None, category: str = None,
+                             min_price: float = None) -> Tuple[List[str], float]:
+        """Ids encontrados pelo BM25 (já filtrados) e a confiança, para repassar a `search_products`"""
+        with self._data_lock.read():
+            row_mask = self._product_row_mask(max_price=max_price, min_price=min_price, category=category)
+            return self._product_lexical_hits(query, row_mask)
+    
+    def _product_lexical_hits(self, query: str, row_mask: np.ndarray) -> Tuple[List[str], float]:
+        if not self.lexical_search:
+            return [], 0.0
+        with span("busca_lexical"):
+            return self.lexical_indexes['produtos'].search(
+                query, FUSION_CANDIDATES, allowed=np.append(row_mask, False)[self._lexical_slot_rows()]
+            )
+    
+    def policy_lexical_hits(self, query: str) -> Tuple[List[str], float]:
+        """Trechos das políticas encontrados pelo BM25 e a confiança, para repassar a `search_policy_chunks`"""
+        if not self.lexical_search:
+            return [], 0.0
+        with span("busca_lexical"):
+            positions, confidence = self.lexical_indexes['politicas'].search(query, FUSION_CANDIDATES)
+        return [self._policy_chunks[position] for position in positions], confidence
+    
+    def products_need_vector(self, lexical_hits: Tuple[List[str], float], k: int = TOP_K_RESULTS) -> bool:
+        """Indica se a busca de produtos com esse resultado lexical vai precisar do embedding da consulta"""
+        return 'produtos' in self.vector_stores and not self._lexical_conclusive(*lexical_hits, k)
+    
+    def policies_need_vector(self, lexical_hits: Tuple[List[str], float], k: int = 3) -> bool:
+        """Indica se a busca de políticas com esse resultado lexical vai precisar do embedding da consulta"""
+        return 'politicas' in self.vector_stores and not self._lexical_conclusive(*lexical_hits, k)
+    
+    def _embed_query(self, query: str) -> List[float]:
+        """Embedding da consulta, contabilizando se veio do cache ou do provedor.
+        
+        Com o provedor indisponível (falha, prazo esgotado ou circuito aberto)
+        devolve um vetor vazio e as buscas seguem só com o BM25.
+        """
+        vector = self.embeddings.cached_query(query)
+        if vector is not None:
+            self._count("embedding_cache")
+            return vector
+        self._count("embedding_network")
+        try:
+            with span("embedding"):
+                return self.embedding_client.call(lambda timeout: self.embeddings.embed_query(query, timeout=timeout))
+        except Exception as e:
+            return self._embedding_unavailable(e)
+    
+    async def aembed_query(self, query: str) -> List[float]:
+        """Versão assíncrona de `_embed_query` (usa o agrupamento de consultas e o hedge)"""
+        vector = (await self.embeddings.acached_queries([query]))[0]
+        if vector is not None:
+            self._count("embedding_cache")
+            return vector
+        self._count("embedding_network")
+        try:
+            with span("embedding"):
+                return await self.embedding_client.acall(lambda timeout: self.embeddings.aembed_query(query))
+        except Exception as e:
+            return self._embedding_unavailable(e)
+    
+    def _pending_queries(self, vectors: List[List[float]]) -> List[List[int]]:
+        """Lotes (posições) das consultas sem embedding em cache (`vectors` None), que vão ao provedor"""
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        for _ in range(len(vectors) - len(missing)):
+            self._count("embedding_cache")
+        for _ in missing:
+            self._count("embedding_network")
+        return [missing[start:start + EMBEDDING_BATCH_SIZE] for start in range(0, len(missing), EMBEDDING_BATCH_SIZE)]
+    
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """Embeddings de várias consultas: as ausentes do cache vão ao provedor em lotes.
+        
+        Um lote que falha fica com vetores vazios (busca só lexical), como em `_embed_query`.
+        """
+        vectors = self.embeddings.cached_queries(queries)
+        for batch in self._pending_queries(vectors):
+            texts = [queries[i] for i in batch]
+            try:
+                with span("embedding"):
+                    computed = self.embedding_client.call(
+                        lambda timeout: self.embeddings.embed_documents(texts, timeout=timeout)
+                    )
+            except Exception as e:
+                computed = [self._embedding_unavailable(e)] * len(batch)
+            for i, vector in zip(batch, computed):
+                vectors[i] = vector
+        return vectors
+    
+    async def aembed_queries(self, queries: List[str]) -> List[List[float]]:
+        """Versão assíncrona de `embed_queries` (lotes em paralelo, com hedge)"""
+        vectors = await self.embeddings.acached_queries(queries)
+        
+        async def embed(batch: List[int]):
+            texts = [queries[i] for i in batch]
+            try:
+                with span("embedding"):
+                    computed = await self.embedding_client.acall(lambda timeout: self.embeddings.aembed_documents(texts))
+            except Exception as e:
+                computed = [self._embedding_unavailable(e)] * len(batch)
+            for i, vector in zip(batch, computed):
+                vectors[i] = vector
+        
+        await asyncio.gather(*(embed(batch) for batch in self._pending_queries(vectors)))
+        return vectors
+    
+    def _embedding_unavailable(self, error: Exception) -> List[float]:
+        self._count("embedding_unavailable")
+        logger.warning("Embedding da consulta indisponível (%s: %s); busca só lexical", type(error).__name__, error)
+        return []
+    
+    def _count(self, name: str):
+        with self._stats_lock:
+            self.retrieval_stats[name] += 1
+    
+    def retrieval_stats_snapshot(self) -> Dict[str, Any]:
+        """Contadores da recuperação e a fração de buscas atendidas sem chamada de rede"""
+        with self._stats_lock:
+            stats = dict(self.retrieval_stats)
+        searches = stats["searches"]
+        stats["offline_fraction"] = round(1 - stats["embedding_network"] / searches, 4) if searches else 0.0
+        return stats
+    
+    def _positions_to_rows(self) -> np.ndarray:
+        """Linha do catálogo de cada posição do índice FAISS (-1 se não estiver no catálogo)"""
+        if self._catalog_rows is None:
+            store = self.vector_stores['produtos']
+            rows = [
+                self.products_data.row_of(store.index_to_docstore_id[position])
+                for position in range(store.index.ntotal)
+            ]
+            self._catalog_rows = np.array([-1 if row is None else row for row in rows], dtype=np.int64)
+        return self._catalog_rows
+    
+    def _lexical_slot_added(self, slots: int, row: int):
+        """Acompanha no slot -> linha o slot que o BM25 acabou de acrescentar (tinha `slots` antes).
+        
+        O slot antigo de um produto reindexado fica inativo no BM25 e não
+        precisa ser corrigido; se o BM25 compactou, o mapa é refeito na próxima busca.
+        """
+        lexical_rows = self._lexical_rows
+        if lexical_rows is None:
+            return
+        if len(lexical_rows) == slots and len(self.lexical_indexes['produtos'].keys) == slots + 1:
+            self._lexical_rows = np.append(lexical_rows, row)
+        else:
+            self._lexical_rows = None
+    
+    def _lexical_slot_rows(self) -> np.ndarray:
+        """Linha do catálogo de cada slot do índice BM25 de produtos (-1 se removido)"""
+        if self._lexical_rows is None:
+            rows = [
+                None if product_id is None else self.products_data.row_of(product_id)
+                for product_id in self.lexical_indexes['produtos'].keys
+            ]
+            self._lexical_rows = np.array([-1 if row is None else row for row in rows], dtype=np.int64)
+        return self._lexical_rows
+    
+    def _product_row_mask(self, max_price: float = None, min_price: float = None,
+                          category: str = None) -> np.ndarray:
+        """Máscara booleana dos produtos que passam nos filtros (por linha do catálogo)"""
+        return self.products_data.filter_mask(
+            max_price=max_price or None, min_price=min_price or None, category=category
+        )
+    
+    def _product_filter_mask(self, max_price: float = None, min_price: float = None,
+                             category: str = None) -> np.ndarray:
+        """Máscara booleana dos produtos que passam nos filtros (por posição no índice)"""
+        row_mask = self._product_row_mask(max_price=max_price, min_price=min_price, category=category)
+        # A posição extra (False) atende as posições sem linha no catálogo (-1)
+        return np.append(row_mask, False)[self._positions_to_rows()]
+    
+    def _vector_rows(self, vector: List[float], mask: np.ndarray, k: int) -> np.ndarray:
+        """Linhas do catálogo dos `k` vizinhos mais próximos restritos às posições da máscara"""
+        return self._vector_rows_batch([vector], mask, k)[0]
+    
+    def _vector_rows_batch(self, vectors: List[List[float]], mask: np.ndarray, k: int) -> List[np.ndarray]:
+        """Como `_vector_rows`, para várias consultas com a mesma máscara numa só busca do FAISS"""
+        store = self.vector_stores['produtos']
+        allowed = int(mask.sum())
+        if allowed == 0:
+            return [np.empty(0, dtype=np.int64) for _ in vectors]
+        
+        bitmap = np.packbits(mask, bitorder='little')
+        selector = faiss.IDSelectorBitmap(len(bitmap), faiss.swig_ptr(bitmap))
+        with span("busca_vetorial"):
+            _, positions = self.vector_index.search(
+                store.index, np.array(vectors, dtype=np.float32), min(k, allowed), selector
+            )
+        positions_to_rows = self._positions_to_rows()
+        results = []
+        for found in positions:
+            rows = positions_to_rows[found[found != -1]]
+            results.append(rows[rows != -1])
         return results
     
-    def search_policies(self, query: str, k: int = 3) -> str:
-        """Busca informações sobre políticas da loja"""
+    def product_vector_hits(self, vectors: List[List[float]],
+                            filters: List[Tuple[float, str]]) -> List[List[str]]:
+        """Busca vetorial de produtos de várias consultas (filtros `(max_price, category)` de cada uma).
+        
+        Uma busca do FAISS por combinação de filtros; os ids encontrados para
+        cada consulta vão como `vector_hits` para `search_products`/`get_recommendations`.
+        Consultas com embedding vazio ficam com None (busca só lexical).
+        """
+        hits = [None] * len(vectors)
+        if 'produtos' not in self.vector_stores:
+            return hits
+        groups = defaultdict(list)
+        for i, (vector, key) in enumerate(zip(vectors, filters)):
+            if len(vector):
+                groups[key].append(i)
+        with self._data_lock.read():
+            for (max_price, category), positions in groups.items():
+                mask = self._product_filter_mask(max_price=max_price, category=category)
+                found = self._vector_rows_batch([vectors[i] for i in positions], mask, FUSION_CANDIDATES)
+                for i, rows in zip(positions, found):
+                    hits[i] = self.products_data.ids[rows].tolist()
+        return hits
+    
+    def _search_products_by_mask(self, vector: List[float], mask: np.ndarray, k: int) -> List[Dict]:
+        """Busca os `k` vizinhos mais próximos restritos às posições da máscara"""
+        # Só os k produtos finais são materializados a partir do catálogo
+        return self.products_data.records(self._vector_rows(vector, mask, k))
+    
+    def search_policies(self, query: str, k: int = 3, query_vector: List[float] = None) -> str:
+        """Busca informações sobre políticas da loja (BM25 e similaridade semântica)"""
         if 'politicas' not in self.vector_stores:
             return "Informações sobre políticas não disponíveis."
         
-        docs = self.vector_stores['politicas'].similarity_search(query, k=k)
-        return "\n\n".join([doc.page_content for doc in docs])
-    
-    def find_order(self, order_id: str) -> Dict:
-        """Encontra um pedido pelo ID"""
-        for order in self.orders_data:
-            if order.get('pedido_id') == order_id:
-                return order
-        return None
+        chunks = self.search_policy_chunks(query, k, query_vector)
+        return "\n\n".join(chunks) or "Informações sobre políticas não disponíveis no momento."
     
-    def get_recommendations(self, query: str, k: int = 5) -> List[Dict]:
-        """Gera recomendações baseadas na consulta"""
-        # Para recomendações, usamos busca semântica mais ampla
-        if 'produtos' not in self.vector_stores:
+    def search_policy_chunks(self, query: str, k: int = 3, query_vector: List[float] = None,
+                             vector_hits: List[str] = None, lexical_hits: Tuple[List[str], float] = None) -> List[str]:
+        """Trechos das políticas mais relevantes para a consulta, em ordem de relevância.
+        
+        `vector_hits` é o resultado da busca vetorial já feita em lote (`policy_vector_hits`)
+        e `lexical_hits` o da busca lexical já feita (`policy_lexical_hits`).
+        """
+        if 'politicas' not in self.vector_stores:
             return []
         
-        docs = self.vector_stores['produtos'].similarity_search(query, k=k)
+        self._count("searches")
+        lexical_chunks, confidence = lexical_hits if lexical_hits is not None else self.policy_lexical_hits(query)
+        if self._lexical_conclusive(lexical_chunks, confidence, k):
+            self._count("lexical")
+            return lexical_chunks[:k]
         
-        recommendations = []
-        for doc in docs:
-            product_id = doc.metadata['id']
-            product = next((p for p in self.products_data if p['id'] == product_id), None)
-            
-            if product and product.get('disponivel', True):
-                recommendations.append(product)
+        if vector_hits is not None:
+            vector_chunks = vector_hits
+        else:
+            vector = query_vector if query_vector is not None else self._embed_query(query)
+            if len(vector) == 0:
+                return lexical_chunks[:k]
+            with span("busca_vetorial"):
+                docs = self.vector_stores['politicas'].similarity_search_by_vector(
+                    vector, k=FUSION_CANDIDATES if lexical_chunks else k
+                )
+            vector_chunks = [doc.page_content for doc in docs]
+        if lexical_chunks and confidence >= self.lexical_threshold:
+            return complete_ranking(lexical_chunks, vector_chunks, k)
+        if lexical_chunks:
+            vector_chunks = reciprocal_rank_fusion([vector_chunks, lexical_chunks], k)
+        return vector_chunks[:k]
+    
+    def policy_vector_hits(self, vectors: List[List[float]]) -> List[List[str]]:
+        """Busca vetorial de políticas de várias consultas numa só busca do FAISS.
         
-        return recommendations
+        Consultas com embedding vazio ficam com None (busca só lexical).
+        """
+        hits = [None] * len(vectors)
+        positions = [i for i, vector in enumerate(vectors) if len(vector)]
+        if 'politicas' not in self.vector_stores or not positions:
+            return hits
+        store = self.vector_stores['politicas']
+        with span("busca_vetorial"):
+            _, found = store.index.search(
+                np.array([vectors[i] for i in positions], dtype=np.float32),
+                min(FUSION_CANDIDATES, store.index.ntotal)
+            )
+        for i, row in zip(positions, found):
+            hits[i] = [
+                store.docstore.search(store.index_to_docstore_id[position]).page_content
+                for position in row if position != -1
+            ]
+        return hits
+    
+    def find_order(self, order_id: str) -> Dict:
+        """Encontra um pedido pelo ID"""
+        return self._orders_by_id.get(order_id)
     
     def extract_price_from_query(self, query: str) -> float:
         """Extrai valor máximo de preço da consulta"""
-        import re
-        
-        # Procurar por padrões como "até R$ 1000", "máximo 500", etc.
-        patterns = [
-            r'até\s*R?\$?\s*(\d+(?:\.\d{3})*(?:,\d{2})?)',
-            r'máximo\s*R?\$?\s*(\d+(?:\.\d{3})*(?:,\d{2})?)',
-            r'no\s*máximo\s*R?\$?\s*(\d+(?:\.\d{3})*(?:,\d{2})?)',
-            r'R?\$?\s*(\d+(?:\.\d{3})*(?:,\d{2})?)?\s*reais?'
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, query, re.IGNORECASE)
-            if match:
-                price_str = match.group(1)
-                # Converter para float (remover pontos de milhares e trocar vírgula por ponto)
-                price_str = price_str.replace('.', '').replace(',', '.')
-                try:
-                    return float(price_str)
-                except ValueError:
-                    continue
-        
-        return None
+        return self.rules.analyze(query)["max_price"]
     
     def extract_category_from_query(self, query: str) -> str:
         """Extrai categoria da consulta"""
-        categories = {
-            'eletrônicos': ['notebook', 'smartphone', 'celular', 'computador', 'tablet'],
-            'roupas': ['camisa', 'calça', 'vestido', 'roupa', 'blusa'],
-            'casa': ['móvel', 'decoração', 'cozinha', 'quarto', 'sala'],
-            'esportes': ['tênis', 'bicicleta', 'academia', 'corrida', 'futebol']
-        }
-        
-        query_lower = query.lower()
-        for category, keywords in categories.items():
-            if any(keyword in query_lower for keyword in keywords):
-                return category
-        
-        return None
+        return self.rules.analyze(query)["category"]
 
     def find_product_by_id(self, product_id: str) -> Dict:
         """Encontra um produto pelo ID exato"""
-        for product in self.products_data:
-            if product.get('id') == product_id:
-                return product
-        return None
+        with self._data_lock.read():
+            return self._product_by_id(product_id)
+
+    def _product_by_id(self, product_id: str) -> Dict:
+        row = self.products_data.row_of(product_id)
+        return self.products_data.get(row) if row is not None else None
 
     def find_product_by_name(self, product_name: str) -> Dict:
-        """Encontra um produto pelo nome (busca parcial)"""
-        product_name_lower = product_name.lower().strip()
+        """Encontra um produto pelo nome (busca parcial).
         
-        # Primeiro, busca exata
-        for product in self.products_data:
-            if product.get('nome', '').lower() == product_name_lower:
-                return product
+        Nome exato ou, senão, o primeiro produto cujo nome contém o trecho
+        buscado. Só a última palavra do trecho pode estar incompleta: um trecho
+        que começa no meio de uma palavra (ex.: "book" em "notebook") não é
+        encontrado, pois nenhuma etapa percorre o catálogo.
+        """
+        product_name_lower = normalize_name(product_name)
         
-        # Depois, busca parcial
-        for product in self.products_data:
-            if product_name_lower in product.get('nome', '').lower():
-                return product
+        with self._data_lock.read():
+            # Primeiro, busca exata
+            product_id = self._products_by_name.get(product_name_lower)
+            if product_id is not None:
+                return self._product_by_id(product_id)
+            
+            if not product_name_lower:
+                return None
+            
+            # Depois, busca parcial (ex.: "fone blue") entre os produtos com as palavras inteiras e a última
+            # como prefixo, sem varrer o catálogo
+            matches = [
+                product_id for product_id in self._name_prefix_candidates(product_name_lower)
+                if product_name_lower in normalize_name(self._product_name(product_id))
+            ]
+            if matches:
+                return self._product_by_id(min(matches, key=self.products_data.row_of))
         
         return None
 
-    def search_orders_by_status(self, status: str) -> List[Dict]:
-        """Busca pedidos por status"""
+    def search_orders_by_status(self, status: str, limit: int = None) -> List[Dict]:
+        """Busca pedidos por status (os `limit` primeiros, se informado)"""
+        # Poucos status distintos: percorre os grupos e preserva a ordem original
+        positions = heapq.merge(*self._status_groups(status))
+        return [self.orders_data[position] for position in itertools.islice(positions, limit)]
+
+    def count_orders_by_status(self, status: str) -> int:
+        """Total de pedidos cujo status contém `status`"""
+        return sum(len(group) for group in self._status_groups(status))
+
+    def _status_groups(self, status: str) -> List[List[int]]:
         status_lower = status.lower()
-        matching_orders = []
-        
-        for order in self.orders_data:
-            if status_lower in order.get('status', '').lower():
-                matching_orders.append(order)
-        
-        return matching_orders
+        return [
+            group for order_status, group in self._orders_by_status.items()
+            if status_lower in order_status
+        ]
+
+    def order_positions(self, status: str = None, after: int = -1, limit: int = 100) -> List[int]:
+        """Posições dos pedidos (com o status exato, se informado) depois da posição `after`"""
+        if status is None:
+            return list(range(after + 1, min(after + 1 + limit, len(self.orders_data))))
+        positions = self._orders_by_status.get(status.lower(), [])
+        start = bisect.bisect_right(positions, after)
+        return positions[start:start + limit]
 
-    def search_orders_by_product(self, product_name: str) -> List[Dict]:
-        """Busca pedidos que contêm um produto específico"""
+    def search_orders_by_product(self, product_name: str, limit: int = None) -> List[Dict]:
+        """Busca pedidos que contêm um produto específico (os `limit` primeiros, se informado)"""
         product_name_lower = product_name.lower()
         matching_orders = []
         
         for order in self.orders_data:
+            if limit is not None and len(matching_orders) >= limit:
+                break
             for product in order.get('produtos', []):
                 if product_name_lower in product.get('nome', '').lower():
                     matching_orders.append(order)
@@ -0,0 +1,58 @@
+"""
+Prontidão dos componentes carregados em segundo plano (catálogo e índices)
+Desenvolvido por Pedro Favoretti - Drope Dev
+"""
+
+import time
+import threading
+from typing import Dict, Any, Iterable, List
+
+# Componentes carregados no início, na ordem em que ficam prontos
+COMPONENTS = ("catalogo", "indice_produtos", "indice_politicas")
+
+
+class NotReadyError(RuntimeError):
+    """Consulta de uma intenção cujos dados ainda não terminaram de carregar"""
+
+    def __init__(self, intent: str, components: List[str]):
+        super().__init__(f"Ainda carregando os dados de '{intent}': {', '.join(components)}")
+        self.intent = intent
+        self.components = components
+
+
+class Readiness:
+    """Estado de cada componente (`pending`, `ready` ou `failed`) e quando ficou pronto"""
+
+    def __init__(self, components: Iterable[str] = COMPONENTS):
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+        self._components = {name: {"status": "pending", "seconds": None, "error": None} for name in components}
+
+    def ready(self, name: str):
+        """Marca o componente como pronto, registrando o tempo desde o início"""
+        with self._lock:
+            self._components[name] = {
+                "status": "ready", "seconds": round(time.perf_counter() - self.started, 3), "error": None
+            }
+
+    def fail_pending(self, error: str):
+        """Marca como falhos os componentes que ainda não ficaram prontos"""
+        with self._lock:
+            for state in self._components.values():
+                if state["status"] != "ready":
+                    state.update(status="failed", error=error)
+
+    def missing(self, components: Iterable[str] = None) -> List[str]:
+        """Componentes (todos, se None) que ainda não estão prontos"""
+        with self._lock:
+            names = self._components if components is None else components
+            return [name for name in names if self._components[name]["status"] != "ready"]
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            components = {name: dict(state) for name, state in self._components.items()}
+        return {
+            "ready": all(state["status"] == "ready" for state in components.values()),
+            "uptime_s": round(time.perf_counter() - self.started, 3),
+            "components": components
+        }
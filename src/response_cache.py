@@ -0,0 +1,80 @@
+"""
+Cache de respostas do LLM chaveado pelo contexto da busca
+Desenvolvido por Pedro Favoretti - Drope Dev
+"""
+
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from embedding_cache import normalize_text
+
+# Pontuação nas pontas não muda o sentido da consulta ("Qual a política de troca?")
+_EDGE_PUNCTUATION = " ?!.,;:¿¡"
+
+
+def normalize_query(query: str) -> str:
+    """Normaliza a consulta para a chave do cache (espaços, caixa e pontuação nas pontas)"""
+    return normalize_text(query).casefold().strip(_EDGE_PUNCTUATION)
+
+
+class ResponseCache:
+    """LRU com TTL para respostas já geradas.
+
+    A chave combina a intenção, a consulta normalizada, o hash do contexto
+    exato entregue ao prompt e as versões dos dados usados pela intenção.
+    Quando produtos, pedidos ou políticas mudam, a versão muda e as entradas
+    antigas deixam de ser encontradas, saindo do cache pelo LRU ou pelo TTL.
+    """
+
+    def __init__(self, max_entries: int = 1000, ttl_seconds: float = 300):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+
+    @staticmethod
+    def make_key(intent: str, query: str, context: Dict[str, str], versions: Dict[str, int]) -> str:
+        """Gera a chave de uma resposta"""
+        context_hash = hashlib.sha256(
+            json.dumps(context, ensure_ascii=False, sort_keys=True).encode('utf-8')
+        ).hexdigest()
+        payload = json.dumps(
+            [intent, normalize_query(query), context_hash, versions], ensure_ascii=False, sort_keys=True
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Resposta em cache para a chave (None se ausente ou expirada)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                response, stored_at = entry
+                if time.monotonic() - stored_at <= self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return response
+                del self._entries[key]
+                self._stats["expirations"] += 1
+            self._stats["misses"] += 1
+            return None
+
+    def put(self, key: str, response: str):
+        """Guarda uma resposta, removendo as entradas mais antigas se necessário"""
+        with self._lock:
+            self._entries[key] = (response, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def stats(self) -> Dict[str, int]:
+        """Retorna os contadores do cache"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._entries)
+        return stats
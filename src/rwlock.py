@@ -0,0 +1,54 @@
+"""
+Trava de leitura e escrita para os dados consultados pelas buscas e alterados pela API
+Desenvolvido por Pedro Favoretti - Drope Dev
+"""
+
+import threading
+from contextlib import contextmanager
+from typing import Iterator
+
+
+class ReadWriteLock:
+    """Vários leitores ao mesmo tempo ou um único escritor.
+
+    Um escritor esperando barra os novos leitores, para que um fluxo contínuo
+    de buscas não adie as alterações indefinidamente. Não é reentrante: quem
+    já tem a trava não deve pedi-la de novo.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+
+    @contextmanager
+    def read(self) -> Iterator[None]:
+        with self._condition:
+            while self._writer or self._waiting_writers:
+                self._condition.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._readers -= 1
+                if not self._readers:
+                    self._condition.notify_all()
+
+    @contextmanager
+    def write(self) -> Iterator[None]:
+        with self._condition:
+            self._waiting_writers += 1
+            try:
+                while self._writer or self._readers:
+                    self._condition.wait()
+            finally:
+                self._waiting_writers -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._writer = False
+                self._condition.notify_all()
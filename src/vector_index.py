@@ -0,0 +1,185 @@
+"""
+Tipos de índice FAISS configuráveis (Flat, IVF-Flat, HNSW e IVF-PQ)
+Desenvolvido por Pedro Favoretti - Drope Dev
+"""
+
+import math
+from typing import Dict, Any
+
+import faiss
+import numpy as np
+
+INDEX_TYPES = ("flat", "ivf_flat", "hnsw", "ivf_pq")
+
+# Nomes aceitos em VECTOR_DB_TYPE além dos tipos acima
+INDEX_TYPE_ALIASES = {"faiss": "flat", "ivf": "ivf_flat", "ivfpq": "ivf_pq"}
+
+# Vetores de treino por centróide (listas do IVF e códigos de 8 bits do PQ), como o k-means do FAISS
+TRAINING_POINTS_PER_CENTROID = 256
+
+
+class VectorIndexFactory:
+    """Cria, treina e ajusta os índices FAISS dos vetores de produtos e políticas.
+
+    `flat` é a busca exata (o índice padrão do LangChain). Os demais tipos
+    são aproximados: `ivf_flat` e `ivf_pq` agrupam os vetores em `nlist`
+    listas e visitam `nprobe` delas por busca (o PQ também comprime os
+    vetores em `pq_m` bytes), e `hnsw` percorre um grafo com `ef_search`
+    candidatos. Coleções com menos de `min_vectors` vetores usam sempre
+    `flat`, pois nelas a busca exata já é rápida.
+    """
+
+    def __init__(self, index_type: str = "flat", nlist: int = 0, nprobe: int = 16, hnsw_m: int = 32,
+                 ef_construction: int = 200, ef_search: int = 64, pq_m: int = 16, min_vectors: int = 10000):
+        index_type = INDEX_TYPE_ALIASES.get(index_type.lower(), index_type.lower())
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Tipo de índice desconhecido: {index_type} (use {', '.join(INDEX_TYPES)})")
+        self.index_type = index_type
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.hnsw_m = hnsw_m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.pq_m = pq_m
+        self.min_vectors = min_vectors
+
+    def describe(self) -> Dict[str, Any]:
+        """Parâmetros que definem a estrutura do índice (entram no manifesto do índice salvo).
+
+        `nprobe` e `ef_search` ficam de fora: valem só na busca e são
+        aplicados também a índices já salvos.
+        """
+        return {
+            "type": self.index_type, "nlist": self.nlist, "hnsw_m": self.hnsw_m,
+            "ef_construction": self.ef_construction, "pq_m": self.pq_m, "min_vectors": self.min_vectors
+        }
+
+    def create(self, training_vectors: np.ndarray, expected_total: int = None) -> faiss.Index:
+        """Cria um índice vazio para `expected_total` vetores, treinado quando o tipo exige.
+
+        O treino usa `training_vectors` (a primeira leva de vetores a indexar),
+        reduzida a uma amostra de TRAINING_POINTS_PER_CENTROID vetores por
+        centróide; o número de listas do IVF é limitado pelo tamanho dela.
+        """
+        n_train, dim = training_vectors.shape
+        expected_total = max(expected_total or 0, n_train)
+        index_type = self.index_type if expected_total >= self.min_vectors else "flat"
+
+        if index_type == "flat":
+            index = faiss.IndexFlatL2(dim)
+        elif index_type == "hnsw":
+            index = faiss.IndexHNSWFlat(dim, self.hnsw_m)
+            index.hnsw.efConstruction = self.ef_construction
+        else:
+            # ~4·√n listas, com ao menos 39 vetores de treino por lista (recomendação do FAISS)
+            nlist = self.nlist or int(4 * math.sqrt(expected_total))
+            nlist = max(1, min(nlist, n_train // 39))
+            if index_type == "ivf_flat":
+                spec = f"IVF{nlist},Flat"
+            else:
+                spec = f"IVF{nlist},PQ{self._pq_subquantizers(dim)}x8"
+            index = faiss.index_factory(dim, spec, faiss.METRIC_L2)
+            if index_type == "ivf_pq":
+                # O treino polissêmico (só usado com polysemous_ht na busca) custa ~1 min e não serve aqui
+                index.do_polysemous_training = False
+            index.train(self._training_sample(training_vectors, max(nlist, 256)))
+        self.configure(index)
+        return index
+
+    @staticmethod
+    def _training_sample(vectors: np.ndarray, centroids: int) -> np.ndarray:
+        """Amostra aleatória (fixa) de até TRAINING_POINTS_PER_CENTROID vetores por centróide"""
+        limit = TRAINING_POINTS_PER_CENTROID * centroids
+        if len(vectors) > limit:
+            vectors = vectors[np.sort(np.random.default_rng(0).choice(len(vectors), limit, replace=False))]
+        return np.ascontiguousarray(vectors, dtype=np.float32)
+
+    def _pq_subquantizers(self, dim: int) -> int:
+        """Maior divisor da dimensão que não passa de `pq_m`"""
+        return next(m for m in range(min(self.pq_m, dim), 0, -1) if dim % m == 0)
+
+    def configure(self, index: faiss.Index):
+        """Aplica os parâmetros de busca (nprobe / efSearch) a um índice novo ou carregado"""
+        if isinstance(index, faiss.IndexIVF):
+            index.nprobe = self.nprobe
+        elif isinstance(index, faiss.IndexHNSW):
+            index.hnsw.efSearch = self.ef_search
+
+    def search_parameters(self, index: faiss.Index, selector: faiss.IDSelector) -> faiss.SearchParameters:
+        """Parâmetros de busca com o seletor, no tipo que cada índice exige"""
+        if isinstance(index, faiss.IndexIVF):
+            params = faiss.SearchParametersIVF()
+            params.nprobe = self.nprobe
+        elif isinstance(index, faiss.IndexHNSW):
+            params = faiss.SearchParametersHNSW()
+            params.efSearch = self.ef_search
+        else:
+            params = faiss.SearchParameters()
+        params.sel = selector
+        return params
+
+    def search(self, index: faiss.Index, vectors: np.ndarray, k: int, selector: faiss.IDSelector):
+        """Busca restrita ao seletor.
+
+        Com filtros muito restritivos a busca aproximada pode não achar `k`
+        permitidos nas listas/vizinhos visitados; nesse caso ela é repetida
+        de forma exaustiva (todas as listas do IVF, ou os vetores do HNSW).
+        """
+        distances, positions = index.search(vectors, k, params=self.search_parameters(index, selector))
+        if not (positions == -1).any():
+            return distances, positions
+
+        if isinstance(index, faiss.IndexIVF):
+            params = faiss.SearchParametersIVF()
+            params.nprobe = index.nlist
+            params.sel = selector
+            return index.search(vectors, k, params=params)
+        if isinstance(index, faiss.IndexHNSW):
+            params = faiss.SearchParameters()
+            params.sel = selector
+            return faiss.downcast_index(index.storage).search(vectors, k, params=params)
+        return distances, positions
+
+    def read(self, path: str, read_only: bool = False) -> faiss.Index:
+        """Lê um índice salvo.
+
+        Os vetores do Flat ficam sempre mapeados do arquivo (IO_FLAG_MMAP_IFC):
+        a carga não copia nada e os processos que abrem o mesmo índice
+        compartilham o page cache. Com `read_only` os demais tipos também são
+        mapeados (listas invertidas do IVF com IO_FLAG_MMAP, códigos do HNSW
+        com IO_FLAG_MMAP_IFC). Um índice mapeado aborta o processo na primeira
+        inserção ou remoção: antes de alterá-lo, use `writable`.
+        """
+        # O tipo vem dos 4 primeiros bytes do arquivo ("IxF." são os Flat, "Iw.." os IVF)
+        with open(path, 'rb') as f:
+            fourcc = f.read(4)
+        if fourcc[:3] == b"IxF":
+            index = faiss.read_index(path, faiss.IO_FLAG_MMAP_IFC)
+        elif not read_only:
+            index = faiss.read_index(path)
+        else:
+            index = faiss.read_index(path, faiss.IO_FLAG_MMAP if fourcc[:2] == b"Iw" else faiss.IO_FLAG_MMAP_IFC)
+        self.configure(index)
+        return index
+
+    @staticmethod
+    def is_mapped(index: faiss.Index) -> bool:
+        """Se os vetores do Flat estão mapeados do arquivo (só leitura)"""
+        return isinstance(index, faiss.IndexFlatCodes) and not index.codes.is_owned
+
+    def writable(self, index: faiss.Index) -> faiss.Index:
+        """O índice com os vetores na memória do processo, que aceita inserção e remoção.
+
+        Um Flat mapeado é copiado (uma vez, na primeira alteração); os demais
+        são devolvidos como estão.
+        """
+        if not self.is_mapped(index):
+            return index
+        copy = faiss.IndexFlat(index.d, index.metric_type)
+        copy.add(index.reconstruct_n(0, index.ntotal))
+        return copy
+
+    @staticmethod
+    def supports_removal(index: faiss.Index) -> bool:
+        """Se `remove_ids` renumera as posições como o LangChain espera (só no Flat)"""
+        return isinstance(index, faiss.IndexFlat)
@@ -0,0 +1,23 @@
+"""
+Fixtures dos testes (executar da raiz: python -m pytest)
+"""
+
+import os
+import sys
+
+import pytest
+
+# Os módulos do backend são importados pelo nome, como em src/api.py
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (ROOT_DIR, os.path.join(ROOT_DIR, "src")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+from benchmarks.fake_openai_server import FakeOpenAIServer  # noqa: E402
+
+
+@pytest.fixture
+def server():
+    """Servidor falso da OpenAI em uma porta livre"""
+    with FakeOpenAIServer(dim=8) as fake:
+        yield fake
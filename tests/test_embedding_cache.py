@@ -0,0 +1,101 @@
+"""
+Cache de embeddings: disco fora da trava da memória e do event loop, gravação em lote e limites do disco
+"""
+
+import time
+import sqlite3
+import asyncio
+import threading
+
+import numpy as np
+
+from benchmarks.fakes import FakeEmbeddings
+from embedding_cache import CachedEmbeddings, EmbeddingCache
+
+
+def disk_rows(path) -> int:
+    with sqlite3.connect(path) as db:
+        return db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+
+def test_memory_hits_do_not_wait_for_the_disk(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite"))
+    cache.put_many({"a": [1.0, 2.0]})
+    results = []
+    # Uma leitura em disco em andamento em outra thread
+    with cache._db_lock:
+        reader = threading.Thread(target=lambda: results.append(cache.get_many(["a"])))
+        reader.start()
+        reader.join(timeout=2)
+        assert not reader.is_alive()
+    assert results == [{"a": [1.0, 2.0]}]
+    cache.close()
+
+
+def test_writes_are_committed_in_batches(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = EmbeddingCache(path, commit_every=10, commit_interval=60)
+    for i in range(5):
+        cache.put_many({f"k{i}": [float(i)]})
+    assert disk_rows(path) == 0
+    assert cache.stats()["disk_pending"] == 5
+
+    # O lote cheio é gravado numa thread à parte
+    cache.put_many({f"k{i}": [float(i)] for i in range(5, 10)})
+    deadline = time.monotonic() + 2
+    while disk_rows(path) < 10 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert disk_rows(path) == 10
+
+    cache.put_many({"k10": [10.0]})
+    cache.close()
+    assert disk_rows(path) == 11
+    assert EmbeddingCache(path).get_many(["k10"]) == {"k10": [10.0]}
+
+
+def test_disk_entries_expire_and_are_capped(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = EmbeddingCache(path, disk_ttl_seconds=0.2)
+    cache.put_many({"old": [1.0]})
+    cache.close()
+    time.sleep(0.3)
+    reopened = EmbeddingCache(path, disk_ttl_seconds=0.2)
+    assert reopened.get_many(["old"]) == {}
+    assert reopened.stats()["disk_expirations"] == 1
+
+    reopened.put_many({f"k{i}": [float(i)] for i in range(10)})
+    reopened.close()
+    capped = EmbeddingCache(path, max_disk_entries=4)
+    assert disk_rows(path) == 4
+    assert capped.stats()["disk_evictions"] == 6
+    capped.close()
+
+
+def test_cache_without_stored_at_is_migrated(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    with sqlite3.connect(path) as db:
+        db.execute("CREATE TABLE embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+        db.execute("INSERT INTO embeddings VALUES (?, ?)", ("a", np.array([1.0], dtype=np.float32).tobytes()))
+    cache = EmbeddingCache(path)
+    assert cache.get_many(["a"]) == {"a": [1.0]}
+    cache.close()
+
+
+def test_async_lookups_read_the_disk_off_the_event_loop(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    embeddings = CachedEmbeddings(FakeEmbeddings(dim=8), EmbeddingCache(path))
+    vector = embeddings.embed_query("fone bluetooth")
+    embeddings.cache.close()
+
+    embeddings = CachedEmbeddings(FakeEmbeddings(dim=8), EmbeddingCache(path))
+    threads = []
+    get_disk = embeddings.cache.get_disk
+    embeddings.cache.get_disk = lambda keys: threads.append(threading.current_thread()) or get_disk(keys)
+
+    async def lookup():
+        return await embeddings.acached_queries(["fone bluetooth"]), threading.current_thread()
+
+    found, loop_thread = asyncio.run(lookup())
+    np.testing.assert_allclose(found[0], vector)
+    assert threads and threads[0] is not loop_thread
+    embeddings.cache.close()
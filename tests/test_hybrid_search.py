@@ -0,0 +1,60 @@
+"""
+Busca híbrida: o atalho lexical só responde sozinho com ao menos k resultados
+"""
+
+import os
+import logging
+
+import pytest
+
+from benchmarks.fakes import FakeEmbeddings
+from rag_system import RAGSystem
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+
+
+@pytest.fixture(scope="module")
+def rag():
+    """RAGSystem sobre os dados do repositório, sem índices em disco nem rede"""
+    logging.getLogger("ingest").setLevel(logging.WARNING)
+    rag = RAGSystem("fake", vector_db_path=None, embedding_cache_path=None)
+    rag.embeddings.underlying = FakeEmbeddings(dim=16)
+    rag.load_data(DATA_DIR)
+    rag.create_vector_stores()
+    return rag
+
+
+def test_confident_lexical_hit_is_completed_to_k(rag):
+    # "notebook" só aparece no PROD001: confiança alta, mas um único resultado
+    products = rag.search_products("notebook", k=3)
+    assert [p["id"] for p in products][:1] == ["PROD001"]
+    assert len(products) == 3
+    assert len({p["id"] for p in products}) == 3
+    assert rag.products_need_vector(rag.product_lexical_hits("notebook"), k=3)
+
+
+def test_lexical_answers_alone_with_k_hits(rag):
+    lexical = rag.retrieval_stats_snapshot()["lexical"]
+    products = rag.search_products("notebook", k=1)
+    assert [p["id"] for p in products] == ["PROD001"]
+    assert rag.retrieval_stats_snapshot()["lexical"] == lexical + 1
+    assert not rag.products_need_vector(rag.product_lexical_hits("notebook"), k=1)
+
+
+def test_policy_chunks_are_completed_to_k(rag):
+    chunks = rag.search_policy_chunks("prazo de troca", k=3)
+    assert len(chunks) == 3
+    assert len(set(chunks)) == 3
+
+
+def test_lexical_hits_are_not_searched_again(rag, monkeypatch):
+    index = rag.lexical_indexes["produtos"]
+    calls = []
+    search = index.search
+    monkeypatch.setattr(index, "search", lambda *args, **kwargs: calls.append(args) or search(*args, **kwargs))
+
+    hits = rag.product_lexical_hits("fone bluetooth", max_price=1000)
+    products = rag.search_products("fone bluetooth", max_price=1000, lexical_hits=hits)
+
+    assert len(calls) == 1
+    assert products == rag.search_products("fone bluetooth", max_price=1000)
@@ -0,0 +1,104 @@
+"""
+Pipeline de embeddings em lotes contra o servidor falso: ordem, novas tentativas e retomada
+"""
+
+import numpy as np
+import openai
+import pytest
+from langchain_openai import OpenAIEmbeddings
+
+import index_builder
+from embedding_cache import CachedEmbeddings, EmbeddingCache, normalize_text
+from index_builder import EmbeddingPipeline
+
+
+def openai_embeddings(server) -> OpenAIEmbeddings:
+    # Sem tiktoken (evita download) e sem retries do cliente: quem repete é o pipeline
+    return OpenAIEmbeddings(base_url=server.base_url, api_key="fake", check_embedding_ctx_length=False, max_retries=0)
+
+
+def assert_vectors(server, texts, vectors):
+    assert len(vectors) == len(texts)
+    for text, vector in zip(texts, vectors):
+        np.testing.assert_allclose(vector, server.vector(text), rtol=1e-6)
+
+
+def test_batches_keep_input_order(server):
+    # Lotes em paralelo terminam fora de ordem; o resultado segue a ordem de entrada
+    server.slow_rate, server.slow_latency_ms = 0.5, 30
+    texts = [f"produto {i}" for i in range(23)]
+    pipeline = EmbeddingPipeline(batch_size=3, max_workers=4)
+    completed = []
+
+    vectors = pipeline.run(openai_embeddings(server).embed_documents, texts,
+                           on_batch=lambda start, batch: completed.append(start))
+
+    assert_vectors(server, texts, vectors)
+    assert sorted(completed) == list(range(0, 23, 3))
+    assert server.stats["requests"] == 8
+    assert server.stats["inputs"] == 23
+
+
+@pytest.mark.parametrize("fault, error", [
+    ("rate_limit_rate", openai.RateLimitError),
+    ("error_rate", openai.InternalServerError),
+])
+def test_transient_errors_are_retried_with_backoff(server, monkeypatch, fault, error):
+    delays = []
+
+    def sleep(delay):
+        delays.append(delay)
+        if len(delays) == 2:
+            setattr(server, fault, 0)
+
+    monkeypatch.setattr(index_builder.time, "sleep", sleep)
+    setattr(server, fault, 1)
+    texts = ["a", "b", "c"]
+    pipeline = EmbeddingPipeline(batch_size=8, max_workers=1, max_retries=5, base_delay=0.1)
+
+    vectors = pipeline.run(openai_embeddings(server).embed_documents, texts)
+
+    assert_vectors(server, texts, vectors)
+    assert server.stats["requests"] == 3
+    assert server.stats["errors"] == 2
+    # Backoff exponencial com jitter: tentativa n espera entre metade e o total de base·2ⁿ
+    assert 0.05 <= delays[0] <= 0.1
+    assert 0.1 <= delays[1] <= 0.2
+
+
+def test_retries_give_up_after_max_retries(server, monkeypatch):
+    delays = []
+    monkeypatch.setattr(index_builder.time, "sleep", delays.append)
+    server.rate_limit_rate = 1
+    pipeline = EmbeddingPipeline(batch_size=8, max_workers=1, max_retries=3, base_delay=1, max_delay=3)
+
+    with pytest.raises(openai.RateLimitError):
+        pipeline.run(openai_embeddings(server).embed_documents, ["a"])
+
+    assert server.stats["requests"] == 4
+    assert len(delays) == 3
+    # O último intervalo fica limitado a max_delay
+    assert 1.5 <= delays[2] <= 3
+
+
+def test_interrupted_build_resumes_with_missing_batches(server, tmp_path):
+    texts = [f"Produto {i}" for i in range(20)]
+    cache_path = str(tmp_path / "cache.sqlite")
+    pipeline = EmbeddingPipeline(batch_size=5, max_workers=1, max_retries=0)
+
+    # O provedor cai depois de dois lotes
+    server.fail_after = 2
+    embeddings = CachedEmbeddings(openai_embeddings(server), EmbeddingCache(cache_path))
+    with pytest.raises(openai.InternalServerError):
+        embeddings.embed_documents_batched(texts, pipeline)
+    assert server.stats["inputs"] == 10
+
+    # Novo processo, mesmo cache em disco: só os dois lotes que faltavam vão ao provedor
+    server.fail_after = None
+    requests, inputs = server.stats["requests"], server.stats["inputs"]
+    embeddings = CachedEmbeddings(openai_embeddings(server), EmbeddingCache(cache_path))
+    vectors = embeddings.embed_documents_batched(texts, pipeline)
+
+    assert server.stats["requests"] - requests == 2
+    assert server.stats["inputs"] - inputs == 10
+    assert_vectors(server, [normalize_text(text) for text in texts], vectors)
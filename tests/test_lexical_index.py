@@ -0,0 +1,52 @@
+"""
+Índice BM25: serialização (inclusive de um índice aberto de pickle e não alterado) e alterações depois dela
+"""
+
+import pickle
+
+from lexical_index import BM25Index
+
+DOCUMENTS = {
+    "PROD001": "Notebook Dell Inspiron 15 com SSD",
+    "PROD002": "Smartphone Samsung Galaxy A54",
+    "PROD003": "Fone de ouvido Bluetooth JBL",
+    "PROD004": "Notebook gamer Acer Nitro",
+}
+QUERIES = ["notebook", "samsung galaxy", "fone bluetooth", "acer nitro gamer", "cadeira"]
+
+
+def build() -> BM25Index:
+    index = BM25Index()
+    for key, text in DOCUMENTS.items():
+        index.add(key, text)
+    return index
+
+
+def test_pickle_round_trip_keeps_results():
+    index = build()
+    loaded = pickle.loads(pickle.dumps(index))
+    assert [loaded.search(query) for query in QUERIES] == [index.search(query) for query in QUERIES]
+
+
+def test_loaded_index_can_be_pickled_again():
+    # Ex.: build_index.py regrava o snapshot com o índice BM25 reaproveitado
+    index = build()
+    loaded = pickle.loads(pickle.dumps(index))
+    again = pickle.loads(pickle.dumps(loaded))
+    assert [again.search(query) for query in QUERIES] == [index.search(query) for query in QUERIES]
+    assert len(again) == len(index)
+
+
+def test_loaded_index_accepts_changes():
+    index = build()
+    index.remove("PROD002")
+    loaded = pickle.loads(pickle.dumps(pickle.loads(pickle.dumps(index))))
+
+    loaded.add("PROD005", "Cadeira gamer ergonômica")
+    assert loaded.remove("PROD003")
+    assert not loaded.remove("PROD002")
+
+    assert loaded.search("cadeira", 1)[0] == ["PROD005"]
+    assert loaded.search("samsung")[0] == []
+    assert loaded.search("fone bluetooth")[0] == []
+    assert set(loaded.search("notebook")[0]) == {"PROD001", "PROD004"}
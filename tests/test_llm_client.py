@@ -0,0 +1,231 @@
+"""
+Circuit breaker, hedge e prazo do ResilientClient, e o prazo repassado aos embeddings das consultas
+"""
+
+import asyncio
+import time
+
+import openai
+import pytest
+from langchain_openai import OpenAIEmbeddings
+
+import llm_client
+from llm_client import CircuitBreaker, CircuitOpenError, ResilientClient
+from rag_system import RAGSystem
+
+
+class Clock:
+    """Relógio controlado pelo teste no lugar do time.monotonic"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = Clock()
+    monkeypatch.setattr(llm_client.time, "monotonic", fake)
+    return fake
+
+
+def test_breaker_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_seconds=30)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+    assert breaker.stats()["rejected"] == 1
+
+    clock.now += 29
+    assert not breaker.allow()
+
+
+def test_breaker_half_open_probe(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=30)
+    breaker.record_failure()
+
+    # Depois de reset_seconds passa uma única chamada de teste
+    clock.now += 30
+    assert breaker.allow()
+    assert breaker.state == "half_open"
+    assert not breaker.allow()
+
+    # Teste com falha reabre o circuito
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert breaker.stats()["opened"] == 2
+    assert not breaker.allow()
+
+    # Teste com sucesso fecha
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.failures == 0
+    assert breaker.allow()
+
+
+def test_breaker_releases_probe_that_never_returned(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=30)
+    breaker.record_failure()
+    clock.now += 30
+    assert breaker.allow()
+    clock.now += 30
+    assert breaker.allow()
+
+
+def test_client_opens_circuit_and_rejects_without_calling():
+    calls = []
+
+    def fail(timeout):
+        calls.append(timeout)
+        raise ConnectionError("provedor fora do ar")
+
+    client = ResilientClient("teste", CircuitBreaker(failure_threshold=2), max_retries=0)
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            client.call(fail)
+    with pytest.raises(CircuitOpenError):
+        client.call(fail)
+
+    assert len(calls) == 2
+    assert client.stats()["circuit"]["state"] == "open"
+
+
+def test_request_errors_do_not_open_circuit():
+    def invalid(timeout):
+        raise ValueError("requisição inválida")
+
+    client = ResilientClient("teste", CircuitBreaker(failure_threshold=1), max_retries=2)
+    for _ in range(3):
+        with pytest.raises(ValueError):
+            client.call(invalid)
+    assert client.breaker.state == "closed"
+    assert client.stats()["retries"] == 0
+
+
+def test_hedge_returns_the_faster_duplicate():
+    started = []
+
+    async def request(timeout):
+        started.append(timeout)
+        # A primeira requisição fica presa na cauda lenta; a duplicata responde na hora
+        if len(started) == 1:
+            await asyncio.sleep(5)
+            return "primeira"
+        return "duplicata"
+
+    client = ResilientClient("teste", timeout=2, hedge_after=0.05)
+    start = time.perf_counter()
+    result = asyncio.run(client.acall(request))
+
+    assert result == "duplicata"
+    assert time.perf_counter() - start < 1
+    assert client.stats()["hedged"] == 1
+    assert client.stats()["hedge_wins"] == 1
+    # A duplicata recebe o que sobrou do prazo
+    assert started[1] == pytest.approx(started[0] - 0.05)
+
+
+def test_no_hedge_when_first_answers_in_time():
+    calls = []
+
+    async def request(timeout):
+        calls.append(timeout)
+        return "primeira"
+
+    client = ResilientClient("teste", timeout=2, hedge_after=0.05)
+    assert asyncio.run(client.acall(request)) == "primeira"
+    assert len(calls) == 1
+    assert client.stats()["hedged"] == 0
+
+
+def test_hedge_disabled_for_streaming():
+    calls = []
+
+    async def request(timeout):
+        calls.append(timeout)
+        await asyncio.sleep(0.1)
+        return "stream"
+
+    client = ResilientClient("teste", timeout=2, hedge_after=0.01)
+    assert asyncio.run(client.acall(request, hedge=False)) == "stream"
+    assert len(calls) == 1
+
+
+def test_sync_deadline_bounds_retries():
+    timeouts = []
+
+    def slow(timeout):
+        timeouts.append(timeout)
+        time.sleep(timeout)
+        raise TimeoutError("sem resposta")
+
+    client = ResilientClient("teste", timeout=0.3, max_retries=10, base_delay=0.01, max_delay=0.02)
+    start = time.perf_counter()
+    with pytest.raises(TimeoutError):
+        client.call(slow)
+
+    # Cada tentativa recebe só o que resta do prazo, então o total não passa dele
+    assert time.perf_counter() - start < 0.45
+    assert timeouts[0] <= 0.3
+    assert all(later < earlier for earlier, later in zip(timeouts, timeouts[1:]))
+    assert client.stats()["failures"] == 1
+
+
+def test_async_deadline_expires():
+    async def hang(timeout):
+        await asyncio.sleep(10)
+
+    client = ResilientClient("teste", timeout=0.1, max_retries=3, base_delay=0.01)
+    start = time.perf_counter()
+    with pytest.raises(TimeoutError):
+        asyncio.run(client.acall(hang))
+    assert time.perf_counter() - start < 0.5
+
+
+@pytest.fixture
+def rag(server):
+    """RAGSystem sem dados com os embeddings apontados para o servidor falso"""
+    rag = RAGSystem("fake", vector_db_path=None, embedding_cache_path=None)
+    rag.embeddings.underlying = OpenAIEmbeddings(
+        base_url=server.base_url, api_key="fake", check_embedding_ctx_length=False, max_retries=0
+    )
+    rag.embedding_client = ResilientClient("embeddings", CircuitBreaker(), timeout=0.2, max_retries=0)
+    return rag
+
+
+def test_query_embedding_respects_timeout(server, rag):
+    server.latency_ms = 2000
+    start = time.perf_counter()
+
+    assert rag._embed_query("notebook para estudos") == []
+    assert rag.embed_queries(["fone bluetooth", "cadeira gamer"]) == [[], []]
+
+    # Sem o prazo na requisição, cada chamada esperaria os 2 s do servidor
+    assert time.perf_counter() - start < 1.5
+    # Uma chamada da consulta e uma do lote
+    assert rag.retrieval_stats_snapshot()["embedding_unavailable"] == 2
+    assert rag.embedding_client.stats()["failures"] == 2
+
+
+def test_query_embedding_within_timeout(server, rag):
+    server.latency_ms = 10
+    vector = rag._embed_query("notebook para estudos")
+    assert len(vector) == server.dim
+    assert rag.embedding_client.stats()["failures"] == 0
+
+
+def test_timeout_reaches_the_request(server, rag):
+    server.latency_ms = 2000
+    with pytest.raises(openai.APITimeoutError):
+        rag.embeddings.embed_query("monitor 4k", timeout=0.1)
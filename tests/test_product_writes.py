@@ -0,0 +1,134 @@
+"""
+Alterações de produtos concorrentes com buscas e manutenção incremental das linhas do catálogo
+"""
+
+import json
+import random
+import threading
+
+import numpy as np
+import pytest
+
+from benchmarks.fakes import FakeEmbeddings
+from catalog import ProductCatalog
+from rag_system import RAGSystem
+
+CATEGORIES = ("Eletrônicos", "Casa", "Esporte", "Livros")
+
+
+def make_product(i: int, **fields):
+    return {
+        "id": f"P{i:04d}", "nome": f"Produto {i} modelo {i % 7}", "categoria": CATEGORIES[i % len(CATEGORIES)],
+        "preco": float(10 + i), "descricao": f"descrição do produto {i} linha {i % 5}", "disponivel": True,
+        **fields
+    }
+
+
+@pytest.fixture
+def rag(tmp_path):
+    """RAGSystem sobre um catálogo sintético em um diretório temporário, sem rede"""
+    with open(tmp_path / "produtos.jsonl", 'w', encoding='utf-8') as f:
+        for i in range(300):
+            f.write(json.dumps(make_product(i), ensure_ascii=False) + "\n")
+    rag = RAGSystem("fake", vector_db_path=None, embedding_cache_path=None)
+    rag.embeddings.underlying = FakeEmbeddings(dim=16)
+    rag.load_data(str(tmp_path))
+    rag.create_vector_stores()
+    return rag
+
+
+def test_searches_run_safely_alongside_writes(rag):
+    errors = []
+    stop = threading.Event()
+    vector = rag.embeddings.embed_query("produto modelo")
+
+    def search():
+        while not stop.is_set():
+            try:
+                for product in rag.search_products("produto modelo 3", max_price=200, query_vector=vector):
+                    assert product["preco"] <= 200
+                rag.get_recommendations("linha 2", query_vector=vector)
+                hits = rag.product_vector_hits([vector], [(None, "Casa")])[0]
+                rag.search_products("casa", category="Casa", vector_hits=hits,
+                                    lexical_hits=rag.product_lexical_hits("casa", category="Casa"))
+                rag.find_product_by_name("modelo 4")
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=search) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    rng = random.Random(0)
+    try:
+        for step in range(400):
+            i = rng.randrange(400)
+            if step % 3 == 0:
+                rag.delete_product(f"P{i:04d}")
+            elif step % 3 == 1:
+                rag.upsert_product(make_product(i, preco=float(rng.randrange(5, 500))))
+            else:
+                rag.upsert_product(make_product(i, descricao=f"nova descrição {step}"))
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+    assert errors == []
+
+
+def test_price_update_keeps_lexical_rows(rag):
+    rag.search_products("produto modelo 3")
+    rows = rag._lexical_rows
+    assert rag.upsert_product(make_product(5, preco=1.0)) == "metadados_atualizados"
+    assert rag._lexical_rows is rows
+
+
+def test_row_maps_follow_writes(rag):
+    rag.search_products("produto modelo 3")
+    rows = rag._lexical_rows
+    rag.delete_product("P0010")
+    assert rag._lexical_rows is rows
+    rag.upsert_product(make_product(500))
+    rag.upsert_product(make_product(20, descricao="texto novo"))
+    assert rag._lexical_rows is not None
+
+    catalog, lexical = rag.products_data, rag.lexical_indexes["produtos"]
+    slot_rows = rag._lexical_slot_rows()
+    # Slots inativos (produto removido ou reindexado) nunca pontuam no BM25
+    for slot, key in enumerate(lexical.keys):
+        if key is not None:
+            assert slot_rows[slot] == catalog.row_of(key)
+    assert [p["id"] for p in rag.search_products("texto novo", k=1)] == ["P0020"]
+    assert "P0010" not in {p["id"] for p in rag.search_products("produto 10 modelo 3", k=20)}
+
+
+def test_catalog_delete_leaves_a_tombstone():
+    catalog = ProductCatalog(make_product(i) for i in range(10))
+    catalog.append(make_product(3, nome="duplicado"))
+    catalog.delete(3)
+
+    assert len(catalog) == 10 and catalog.removed == 1
+    assert catalog.row_of("P0003") == 10
+    assert catalog.row_of("P0004") == 4
+    assert not catalog.filter_mask(available_only=False)[3]
+    assert [p["id"] for p in catalog][3:5] == ["P0004", "P0005"]
+
+    catalog.compact()
+    assert catalog.removed == 0
+    assert [catalog.row_of(f"P{i:04d}") for i in (0, 2, 4, 9, 3)] == [0, 2, 3, 8, 9]
+    assert catalog.get(9)["nome"] == "duplicado"
+    assert np.array_equal(catalog.prices, [10, 11, 12, 14, 15, 16, 17, 18, 19, 13])
+
+
+def test_name_lookups_without_scanning(rag):
+    assert rag.find_product_by_name("produto 12 modelo 5")["id"] == "P0012"
+    assert rag.find_product_by_name("12 modelo 5")["id"] == "P0012"
+    assert rag.find_product_by_name("Produto 12 mod")["id"] == "P0012"
+    assert rag.find_product_by_name("produto 12 modelo 6") is None
+    assert rag.find_product_by_name("rodu") is None
+
+    rag.upsert_product(make_product(12, nome="Fone Bluetooth"))
+    assert rag.find_product_by_name("fone blue")["id"] == "P0012"
+    assert rag.find_product_by_name("produto 12 mod") is None
+    rag.delete_product("P0012")
+    assert rag.find_product_by_name("fone blue") is None
@@ -0,0 +1,77 @@
+"""
+Índices salvos (Flat mapeado do arquivo, cópia em memória antes de alterar) e treino dos IVF
+"""
+
+import faiss
+import numpy as np
+
+from vector_index import VectorIndexFactory
+
+
+def write_flat(path, vectors):
+    index = faiss.IndexFlatL2(vectors.shape[1])
+    index.add(vectors)
+    faiss.write_index(index, path)
+
+
+def test_flat_is_mapped_in_default_mode(tmp_path):
+    vectors = np.random.default_rng(0).standard_normal((200, 8)).astype(np.float32)
+    path = str(tmp_path / "index.faiss")
+    write_flat(path, vectors)
+    factory = VectorIndexFactory("flat")
+
+    index = factory.read(path)
+    assert factory.is_mapped(index)
+    _, positions = index.search(vectors[:3], 1)
+    assert positions.ravel().tolist() == [0, 1, 2]
+
+
+def test_writable_copy_accepts_changes(tmp_path):
+    vectors = np.random.default_rng(1).standard_normal((200, 8)).astype(np.float32)
+    path = str(tmp_path / "index.faiss")
+    write_flat(path, vectors)
+    factory = VectorIndexFactory("flat")
+    mapped = factory.read(path)
+
+    index = factory.writable(mapped)
+    assert not factory.is_mapped(index)
+    assert factory.supports_removal(index)
+    index.add(vectors[:5])
+    index.remove_ids(np.array([0], dtype=np.int64))
+    assert index.ntotal == 204
+    # O original continua mapeado e intacto
+    assert mapped.ntotal == 200
+    assert factory.writable(index) is index
+
+
+def test_approximate_index_is_copied_unless_read_only(tmp_path):
+    vectors = np.random.default_rng(2).standard_normal((2000, 8)).astype(np.float32)
+    factory = VectorIndexFactory("ivf_flat", nlist=8, min_vectors=100)
+    index = factory.create(vectors, len(vectors))
+    index.add(vectors)
+    path = str(tmp_path / "index.faiss")
+    faiss.write_index(index, path)
+
+    loaded = factory.read(path)
+    assert isinstance(loaded, faiss.IndexIVFFlat)
+    loaded.add(vectors[:1])
+    assert loaded.ntotal == 2001
+
+
+def test_ivf_pq_trains_on_a_sample_without_polysemous_training():
+    vectors = np.random.default_rng(3).standard_normal((10000, 64)).astype(np.float32)
+    factory = VectorIndexFactory("ivf_pq", nlist=16, min_vectors=100)
+
+    index = factory.create(vectors, len(vectors))
+    assert index.is_trained
+    assert not index.do_polysemous_training
+    index.add(vectors)
+    _, positions = index.search(vectors[:5], 1)
+    assert positions.ravel().tolist() == [0, 1, 2, 3, 4]
+
+
+def test_training_sample_is_capped_per_centroid():
+    vectors = np.random.default_rng(4).standard_normal((3000, 4)).astype(np.float32)
+    sample = VectorIndexFactory._training_sample(vectors, 8)
+    assert sample.shape == (8 * 256, 4)
+    assert VectorIndexFactory._training_sample(vectors[:100], 8).shape == (100, 4)